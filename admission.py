@@ -0,0 +1,231 @@
+# Admission control and load shedding for the prediction path
+# This file will be imported by app.py
+
+from __future__ import annotations
+
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import ExitStack, contextmanager
+from functools import wraps
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, Optional, Tuple
+
+from flask import jsonify, request
+
+import metrics
+
+
+class AdmissionRejected(Exception):
+    """Raised instead of queueing; the caller answers 503 with ``Retry-After``."""
+
+    def __init__(self, reason: str, retry_after: int) -> None:
+        super().__init__(f"request shed ({reason})")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _HeldStream:
+    """Iterates a response body and releases its admission slot when exhausted or closed."""
+
+    def __init__(self, body: Iterable[Any], slot: ExitStack) -> None:
+        self._body = iter(body)
+        self._slot: Optional[ExitStack] = slot
+
+    def __iter__(self) -> "_HeldStream":
+        return self
+
+    def __next__(self) -> Any:
+        try:
+            return next(self._body)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self) -> None:
+        # Werkzeug closes the body when the client disconnects, even before the first chunk.
+        slot, self._slot = self._slot, None
+        if slot is None:
+            return
+        try:
+            close = getattr(self._body, "close", None)
+            if close is not None:
+                close()
+        finally:
+            slot.close()
+
+
+class _Ticket:
+    __slots__ = ("user", "granted", "event")
+
+    def __init__(self, user: str) -> None:
+        self.user = user
+        self.granted = False
+        self.event = threading.Event()
+
+
+class AdmissionController:
+    """Bounded concurrency with a short, per-user fair queue.
+
+    At most ``max_concurrent`` requests run at once and at most ``max_queue``
+    wait, each for no longer than ``queue_timeout`` seconds. No user may hold
+    more than ``per_user_limit`` running-plus-queued slots, and a freed slot
+    goes to the waiting user with the fewest requests already running, so a
+    bulk script queues behind itself rather than in front of everyone else.
+    Limits are per process: with gunicorn, size them per worker.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int,
+        max_queue: int = 16,
+        queue_timeout: float = 1.0,
+        per_user_limit: int = 4,
+        min_retry_after: int = 1,
+    ) -> None:
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.per_user_limit = max(1, per_user_limit)
+        self.min_retry_after = max(1, min_retry_after)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._queued = 0
+        self._active: Dict[str, int] = {}
+        self._waiting: "OrderedDict[str, Deque[_Ticket]]" = OrderedDict()
+        self._avg_hold = 0.0
+
+    @classmethod
+    def from_env(cls) -> "AdmissionController":
+        max_concurrent = int(os.environ.get("PREDICT_MAX_CONCURRENT", "0"))
+        return cls(
+            max_concurrent=max_concurrent,
+            max_queue=int(os.environ.get("PREDICT_MAX_QUEUE", str(max(1, 2 * max_concurrent)))),
+            queue_timeout=float(os.environ.get("PREDICT_QUEUE_TIMEOUT_MS", "1000")) / 1000,
+            per_user_limit=int(os.environ.get("PREDICT_MAX_PER_USER", str(max(1, max_concurrent // 2)))),
+            min_retry_after=int(os.environ.get("PREDICT_RETRY_AFTER", "1")),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_concurrent > 0
+
+    def _retry_after(self) -> int:
+        # Roughly how long the current backlog takes to drain at the observed service time.
+        backlog = self._queued + 1
+        estimate = self._avg_hold * backlog / max(1, self.max_concurrent)
+        return max(self.min_retry_after, math.ceil(estimate))
+
+    def _publish(self) -> None:
+        metrics.registry.set_gauge("agro_admission_in_flight", self._in_flight)
+        metrics.registry.set_gauge("agro_admission_queue_depth", self._queued)
+
+    def _shed(self, reason: str) -> AdmissionRejected:
+        metrics.registry.inc("agro_admission_shed_total", reason=reason)
+        return AdmissionRejected(reason, self._retry_after())
+
+    def _grant(self, user: str) -> None:
+        self._in_flight += 1
+        self._active[user] = self._active.get(user, 0) + 1
+
+    @contextmanager
+    def admit(self, user: str) -> Iterator[None]:
+        """Holds a slot for the duration of the block, or raises ``AdmissionRejected``."""
+        if not self.enabled:
+            yield
+            return
+
+        arrived = time.perf_counter()
+        ticket: Optional[_Ticket] = None
+        with self._lock:
+            held = self._active.get(user, 0) + len(self._waiting.get(user, ()))
+            if held >= self.per_user_limit:
+                raise self._shed("user_limit")
+            if self._in_flight < self.max_concurrent and not self._queued:
+                self._grant(user)
+            elif self._queued >= self.max_queue:
+                raise self._shed("queue_full")
+            else:
+                ticket = _Ticket(user)
+                self._waiting.setdefault(user, deque()).append(ticket)
+                self._queued += 1
+            self._publish()
+
+        if ticket is not None:
+            ticket.event.wait(self.queue_timeout)
+            with self._lock:
+                if not ticket.granted:
+                    self._remove(ticket)
+                    self._publish()
+                    raise self._shed("timeout")
+        metrics.registry.observe("agro_admission_wait_seconds", time.perf_counter() - arrived)
+
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._release(user, time.perf_counter() - started)
+
+    def _remove(self, ticket: _Ticket) -> None:
+        queue = self._waiting[ticket.user]
+        queue.remove(ticket)
+        if not queue:
+            del self._waiting[ticket.user]
+        self._queued -= 1
+
+    def _release(self, user: str, held_for: float) -> None:
+        with self._lock:
+            self._avg_hold = held_for if not self._avg_hold else 0.9 * self._avg_hold + 0.1 * held_for
+            self._in_flight -= 1
+            self._active[user] -= 1
+            if not self._active[user]:
+                del self._active[user]
+            if self._waiting and self._in_flight < self.max_concurrent:
+                # Fewest running requests wins; ties go to whoever has waited longest in rotation order.
+                next_user = min(self._waiting, key=lambda name: self._active.get(name, 0))
+                ticket = self._waiting[next_user][0]
+                self._remove(ticket)
+                if next_user in self._waiting:
+                    self._waiting.move_to_end(next_user)
+                ticket.granted = True
+                self._grant(next_user)
+                ticket.event.set()
+            self._publish()
+
+    def hold_stream(self, user: str, body: Iterable[Any]) -> Iterable[Any]:
+        """Admits now and keeps the slot until ``body`` is consumed or closed.
+
+        For streamed responses, whose work runs after the view has returned.
+        Raises ``AdmissionRejected`` before anything is sent.
+        """
+        if not self.enabled:
+            return body
+        slot = ExitStack()
+        slot.enter_context(self.admit(user))
+        return _HeldStream(body, slot)
+
+    @staticmethod
+    def busy_response(exc: AdmissionRejected) -> Any:
+        response = jsonify({"error": "The service is busy. Please retry shortly.", "reason": exc.reason})
+        response.status_code = 503
+        response.headers["Retry-After"] = str(exc.retry_after)
+        return response
+
+    def limit(self, key_func: Callable[[], str], methods: Tuple[str, ...] = ("POST",)) -> Callable:
+        """View decorator: admits ``methods`` requests keyed by ``key_func()``, else answers 503."""
+
+        def decorator(view: Callable[..., Any]) -> Callable[..., Any]:
+            @wraps(view)
+            def wrapped(*args: Any, **kwargs: Any) -> Any:
+                if not self.enabled or request.method not in methods:
+                    return view(*args, **kwargs)
+                try:
+                    with self.admit(key_func()):
+                        return view(*args, **kwargs)
+                except AdmissionRejected as exc:
+                    return self.busy_response(exc)
+
+            return wrapped
+
+        return decorator
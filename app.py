@@ -1,24 +1,48 @@
 from __future__ import annotations
 
+import csv
+import hashlib
+import heapq
+import io
 import json
+import math
 import os
+import re
+import threading
+import time
+from collections import Counter
 from pathlib import Path
-from typing import Any, Dict, List, Optional
-from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from datetime import datetime, timedelta
 
 import numpy as np
 import pandas as pd
 import requests
-from flask import Flask, jsonify, render_template, request, redirect, url_for, flash
+from flask import Flask, Response, jsonify, render_template, request, redirect, url_for, flash, stream_with_context
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from sklearn.impute import KNNImputer
 
 from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.utils import secure_filename
 
 # Import models
-from models import db, User, Prediction, ContactMessage
+from models import db, User, Prediction, ContactMessage, ensure_indexes
 from sqlalchemy import desc
 
+import metrics
+from admission import AdmissionController, AdmissionRejected
+from batching import MicroBatcher
+from bulk_upload import BulkUploadError, read_chunks, stream_results
+from compression import ResponseCompressor, StaticAssets
+from json_cache import JsonResponseCache
+from memory_report import MemoryAccountant
+from metrics import span
+from model_server import ModelServerClient, ModelServerTimeout, ModelServerUnavailable
+from profiling import RequestProfiler
+from serving import InferencePool, green_mode
+from shared_cache import CacheBackend, NullCache, cache_from_env
+from what_if import build_grid, parse_grid, top_k_classes
+
 # Initialize Flask App (MUST BE AT TOP)
 app = Flask(__name__)
 
@@ -39,9 +63,24 @@ print(f"✅ Database Configured: {app.config['SQLALCHEMY_DATABASE_URI'].split(':
 
 # Initialize extensions
 db.init_app(app)
+with app.app_context():
+    try:
+        for index_name in ensure_indexes():
+            print(f"✅ Created missing database index {index_name}")
+    except Exception:
+        # Another worker may have won the race, or the database is not reachable yet.
+        app.logger.exception("Could not create missing database indexes")
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
+# Registered before metrics so its after_request hook sees the Server-Timing header
+RequestProfiler.from_env(Path(__file__).resolve().parent / "profiles").init_app(app)
+metrics.init_app(app, token=os.environ.get('METRICS_TOKEN'))
+memory_accountant = MemoryAccountant.from_env()
+memory_accountant.init_app(app, token=os.environ.get('DIAGNOSTICS_TOKEN'))
+ResponseCompressor.from_env().init_app(app)
+StaticAssets(Path(app.static_folder) / "dist").init_app(app)
+predict_admission = AdmissionController.from_env()
 
 @login_manager.user_loader
 def load_user(user_id):
@@ -51,6 +90,27 @@ BASE_DIR = Path(__file__).resolve().parent
 DATASET_PATH = BASE_DIR / "apcrop_dataset_realistic.csv"
 MODEL_PATH = BASE_DIR / "croprecommender_mlp.h5"
 META_PATH = BASE_DIR / "croprecommender_mlp.npz"
+# Compact memory-mapped export (see model_artifacts.py); preferred over the .h5 when present
+MODEL_ARTIFACT_DIR = Path(os.environ.get("MODEL_ARTIFACT_DIR", BASE_DIR / "croprecommender_mlp.weights"))
+# Distilled student (see distill_model.py); MODEL_TIER picks the default, requests may override it
+STUDENT_ARTIFACT_DIR = Path(os.environ.get("STUDENT_ARTIFACT_DIR", BASE_DIR / "croprecommender_student.weights"))
+MODEL_TIER = os.environ.get("MODEL_TIER", "teacher").lower()
+MODEL_TIERS = ("teacher", "student")
+# Seconds between checks for a new artifact version (0 disables hot reload)
+MODEL_RELOAD_INTERVAL = float(os.environ.get("MODEL_RELOAD_INTERVAL", "30"))
+# Reject a new version whose top-1 picks agree with the serving one on fewer sample rows than this
+MODEL_RELOAD_MIN_AGREEMENT = float(os.environ.get("MODEL_RELOAD_MIN_AGREEMENT", "0"))
+# Seconds between checks of DATASET_PATH for new rows (0, the default, disables the watcher)
+DATASET_RELOAD_INTERVAL = float(os.environ.get("DATASET_RELOAD_INTERVAL", "0"))
+OPEN_METEO_URL = os.environ.get("OPEN_METEO_URL", "https://api.open-meteo.com/v1/forecast")
+# Seconds a cached forecast / recommendation stays fresh; 0 turns that cache off
+WEATHER_CACHE_TTL = float(os.environ.get("WEATHER_CACHE_TTL", "600"))
+RECOMMENDATION_CACHE_TTL = float(os.environ.get("RECOMMENDATION_CACHE_TTL", "3600"))
+# Rows parsed, preprocessed and scored together by POST /predict/bulk
+BULK_CHUNK_ROWS = int(os.environ.get("BULK_CHUNK_ROWS", "1000"))
+CHATBOT_KNOWLEDGE_PATH = Path(
+    os.environ.get("CHATBOT_KNOWLEDGE_PATH", BASE_DIR / "chatbot_knowledge.json")
+)
 
 EXCLUDE_COLUMNS = [
     "Year",
@@ -148,32 +208,220 @@ def safe_mean(series: pd.Series) -> Optional[float]:
         return None
     return round(value, 2)
 
+TOKEN_PATTERN = re.compile(r"[\w\u0C00-\u0C7F]+")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it my of on or "
+    "should the to what when where which who why will with you your".split()
+)
+
+def normalize_token(token: str) -> str:
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+def tokenize(text: str) -> List[str]:
+    return [
+        normalize_token(token)
+        for token in TOKEN_PATTERN.findall((text or "").lower())
+        if token not in STOPWORDS
+    ]
+
+def load_knowledge_base(path: Path) -> List[Dict[str, Any]]:
+    """Reads extra chatbot entries from a JSON list or JSON Lines file."""
+    if not path.exists():
+        return []
+    with path.open(encoding="utf-8") as handle:
+        if path.suffix == ".jsonl":
+            entries = [json.loads(line) for line in handle if line.strip()]
+        else:
+            entries = json.load(handle)
+    return [entry for entry in entries if entry.get("answer")]
+
+def dataset_fingerprint(row_hashes: pd.Series) -> str:
+    """Content hash of a dataset from its per-row hashes in file order, identical across workers and restarts."""
+    return hashlib.sha1(row_hashes.to_numpy().tobytes()).hexdigest()
+
+
+def group_hashes(frame: pd.DataFrame, row_hashes: np.ndarray, keys: List[str]) -> Dict[str, str]:
+    """One digest per group over its rows in file order, keyed like the summaries ("district::season")."""
+    hashes: Dict[str, str] = {}
+    for key, positions in frame.groupby(keys).indices.items():
+        name = "::".join(map(str, key)) if isinstance(key, tuple) else key
+        hashes[name] = hashlib.sha1(row_hashes[positions].tobytes()).hexdigest()
+    return hashes
+
+
+class DistrictSnapshot:
+    """Everything the district service derives from one version of the dataset.
+
+    The service swaps whole snapshots, so a reader never mixes summaries
+    from one version with mandals or guidance from another.
+    """
+
+    def __init__(
+        self,
+        fingerprint: str,
+        district_hashes: Dict[str, str],
+        season_hashes: Dict[str, str],
+        summaries: Dict[str, Any],
+    ) -> None:
+        self.fingerprint = fingerprint
+        self.district_hashes = district_hashes
+        self.season_hashes = season_hashes
+        self.district_summary: Dict[str, Dict[str, Any]] = summaries["district"]
+        self.seasonal_summary: Dict[str, Dict[str, Any]] = summaries["seasonal"]
+        self.mandal_lookup: Dict[str, List[str]] = summaries["mandals"]
+        self.guidance: Dict[str, Dict[str, Any]] = summaries["guidance"]
+        self.crop_guidance: Dict[str, Dict[str, Any]] = summaries["crop_guidance"]
+
+
 class DistrictDataService:
-    def __init__(self, dataset: pd.DataFrame) -> None:
-        self.dataset = dataset.copy()
-        self.district_summary = self._build_district_summary()
-        self.seasonal_summary = self._build_seasonal_summary()
-        self.mandal_lookup = self._build_mandal_lookup()
+    def __init__(self, dataset: pd.DataFrame, cache: Optional[CacheBackend] = None) -> None:
+        self.cache = cache or NullCache()
+        self._snapshot = self._load(dataset, None)
+
+    @property
+    def fingerprint(self) -> str:
+        return self._snapshot.fingerprint
+
+    @property
+    def district_summary(self) -> Dict[str, Dict[str, Any]]:
+        return self._snapshot.district_summary
+
+    @property
+    def seasonal_summary(self) -> Dict[str, Dict[str, Any]]:
+        return self._snapshot.seasonal_summary
+
+    @property
+    def mandal_lookup(self) -> Dict[str, List[str]]:
+        return self._snapshot.mandal_lookup
+
+    def _load(self, dataset: pd.DataFrame, previous: Optional[DistrictSnapshot]) -> DistrictSnapshot:
+        row_hashes = pd.util.hash_pandas_object(dataset, index=False)
+        fingerprint = dataset_fingerprint(row_hashes)
+        if previous is not None and previous.fingerprint == fingerprint:
+            return previous
+        district_hashes = group_hashes(dataset, row_hashes.to_numpy(), ["District"])
+        season_hashes = group_hashes(dataset, row_hashes.to_numpy(), ["District", "Season"])
+        # Keyed by content, so workers and restarts on the same dataset reuse one computation.
+        summaries = self.cache.get_or_compute(
+            f"district_summaries:v2:{fingerprint}",
+            lambda: self._build_summaries(dataset, district_hashes, season_hashes, previous),
+        )
+        return DistrictSnapshot(fingerprint, district_hashes, season_hashes, summaries)
+
+    def refresh(self, dataset: pd.DataFrame) -> Dict[str, Any]:
+        """Swaps in ``dataset``, recomputing only the districts and seasons whose rows changed.
 
-    def _build_district_summary(self) -> Dict[str, Dict[str, Any]]:
+        Requests keep reading the previous snapshot until the new one is
+        complete. Returns which "district::season" groups and districts changed.
+        """
+        started = time.perf_counter()
+        previous = self._snapshot
+        snapshot = self._load(dataset, previous)
+        self._snapshot = snapshot
+
+        def diff(old: Dict[str, str], new: Dict[str, str]) -> Dict[str, List[str]]:
+            return {
+                "added": sorted(new.keys() - old.keys()),
+                "removed": sorted(old.keys() - new.keys()),
+                "changed": sorted(key for key in new.keys() & old.keys() if new[key] != old[key]),
+            }
+
+        return {
+            "fingerprint": snapshot.fingerprint,
+            "previous_fingerprint": previous.fingerprint,
+            "seasons": diff(previous.season_hashes, snapshot.season_hashes),
+            "districts": diff(previous.district_hashes, snapshot.district_hashes),
+            "seconds": round(time.perf_counter() - started, 3),
+        }
+
+    def _build_summaries(
+        self,
+        dataset: pd.DataFrame,
+        district_hashes: Dict[str, str],
+        season_hashes: Dict[str, str],
+        previous: Optional[DistrictSnapshot],
+    ) -> Dict[str, Any]:
+        """Summaries for ``dataset``, reusing each entry of ``previous`` whose rows are unchanged.
+
+        A district's digest covers all its rows in order, so any changed
+        season also marks its district, and only that district's rows are
+        regrouped. The crop-wide guidance fallback depends on the first row
+        of each crop anywhere in the file and is always rebuilt.
+        """
+        old_districts = previous.district_hashes if previous else {}
+        old_seasons = previous.season_hashes if previous else {}
+        changed_districts = {key for key, digest in district_hashes.items() if old_districts.get(key) != digest}
+        changed_seasons = {key for key, digest in season_hashes.items() if old_seasons.get(key) != digest}
+        rows = dataset[dataset["District"].isin(changed_districts)]
+
+        def merge(old: Dict[str, Any], fresh: Dict[str, Any], keep: Callable[[str], bool]) -> Dict[str, Any]:
+            merged = {key: value for key, value in old.items() if keep(key)}
+            merged.update(fresh)
+            return dict(sorted(merged.items()))
+
+        def unchanged_district(key: str) -> bool:
+            return key in district_hashes and key not in changed_districts
+
+        seasonal = {
+            key: summary for key, summary in self._build_seasonal_summary(rows).items() if key in changed_seasons
+        }
+        return {
+            "district": merge(
+                previous.district_summary if previous else {}, self._build_district_summary(rows), unchanged_district
+            ),
+            "seasonal": merge(
+                previous.seasonal_summary if previous else {},
+                seasonal,
+                lambda key: key in season_hashes and key not in changed_seasons,
+            ),
+            "mandals": merge(
+                previous.mandal_lookup if previous else {}, self._build_mandal_lookup(rows), unchanged_district
+            ),
+            "guidance": merge(
+                previous.guidance if previous else {},
+                self._build_guidance(rows, ["District", "Primary_Crop"]),
+                lambda key: unchanged_district(key.split("::", 1)[0]),
+            ),
+            "crop_guidance": self._build_guidance(dataset, ["Primary_Crop"]),
+        }
+
+    def _build_district_summary(self, dataset: pd.DataFrame) -> Dict[str, Dict[str, Any]]:
         summary: Dict[str, Dict[str, Any]] = {}
-        for district, group in self.dataset.groupby("District"):
+        for district, group in dataset.groupby("District"):
             summary[district] = self._summarize_group(group)
         return summary
 
-    def _build_seasonal_summary(self) -> Dict[str, Dict[str, Any]]:
+    def _build_seasonal_summary(self, dataset: pd.DataFrame) -> Dict[str, Dict[str, Any]]:
         seasonal: Dict[str, Dict[str, Any]] = {}
-        for (district, season), group in self.dataset.groupby(["District", "Season"]):
+        for (district, season), group in dataset.groupby(["District", "Season"]):
             seasonal_key = f"{district}::{season}"
             seasonal[seasonal_key] = self._summarize_group(group)
         return seasonal
 
-    def _build_mandal_lookup(self) -> Dict[str, List[str]]:
+    def _build_mandal_lookup(self, dataset: pd.DataFrame) -> Dict[str, List[str]]:
         lookup: Dict[str, List[str]] = {}
-        for district, group in self.dataset.groupby("District"):
+        for district, group in dataset.groupby("District"):
             lookup[district] = sorted(group["Mandal"].dropna().unique())
         return lookup
 
+    def _build_guidance(self, dataset: pd.DataFrame, keys: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Plans from the first row of each ``keys`` group, as ``fetch_guidance`` returns them."""
+        guidance: Dict[str, Dict[str, Any]] = {}
+        first_rows = dataset.dropna(subset=keys).drop_duplicates(subset=keys)
+        for _, row in first_rows.iterrows():
+            key = "::".join(str(row[column]) for column in keys)
+            guidance[key] = {
+                "fertilizer_plan": self._safe_json(row.get("Fertilizer_Plan")),
+                "irrigation_plan": self._safe_json(row.get("Irrigation_Plan")),
+                "market_index": row.get("Market_Price_Index"),
+            }
+        return guidance
+
     def _summarize_group(self, group: pd.DataFrame) -> Dict[str, Any]:
         summary = {
             "district": group["District"].iloc[0],
@@ -198,19 +446,36 @@ class DistrictDataService:
         return sorted(self.district_summary.keys())
 
     def get_district_data(self, district: str) -> Dict[str, Any]:
-        data = self.district_summary.get(district)
+        snapshot = self._snapshot
+        data = snapshot.district_summary.get(district)
         if not data:
             raise ValueError(f"District '{district}' is not in the dataset.")
-        return {**data, "mandals": self.mandal_lookup.get(district, [])}
+        return {**data, "mandals": snapshot.mandal_lookup.get(district, [])}
+
+    def bootstrap_bundle(self, fields: List[str]) -> Dict[str, Any]:
+        """Every district's mandals and district/seasonal defaults, as value lists in ``fields`` order."""
+        snapshot = self._snapshot
+        districts: Dict[str, Any] = {}
+        for district, summary in snapshot.district_summary.items():
+            districts[district] = {
+                "defaults": [summary.get(field) for field in fields],
+                "mandals": snapshot.mandal_lookup.get(district, []),
+                "seasons": {},
+            }
+        for key, summary in snapshot.seasonal_summary.items():
+            district, season = key.split("::", 1)
+            districts[district]["seasons"][season] = [summary.get(field) for field in fields]
+        return districts
 
     def get_auto_defaults(self, district: str, season: Optional[str]) -> Dict[str, Any]:
-        if district not in self.district_summary:
+        snapshot = self._snapshot
+        if district not in snapshot.district_summary:
             raise ValueError(f"District '{district}' is not in the dataset.")
         if season:
             seasonal_key = f"{district}::{season}"
-            if seasonal_key in self.seasonal_summary:
-                return self.seasonal_summary[seasonal_key]
-        return self.district_summary[district]
+            if seasonal_key in snapshot.seasonal_summary:
+                return snapshot.seasonal_summary[seasonal_key]
+        return snapshot.district_summary[district]
 
     def build_model_payload(
         self,
@@ -255,22 +520,9 @@ class DistrictDataService:
         }
 
     def fetch_guidance(self, district: str, crop: str) -> Dict[str, Any]:
-        filtered = self.dataset[
-            (self.dataset["District"] == district) & (self.dataset["Primary_Crop"] == crop)
-        ]
-        if filtered.empty:
-            filtered = self.dataset[self.dataset["Primary_Crop"] == crop]
-        if filtered.empty:
-            return {}
-        row = filtered.iloc[0]
-        fertilizer_plan = self._safe_json(row.get("Fertilizer_Plan"))
-        irrigation_plan = self._safe_json(row.get("Irrigation_Plan"))
-        market_index = row.get("Market_Price_Index")
-        return {
-            "fertilizer_plan": fertilizer_plan,
-            "irrigation_plan": irrigation_plan,
-            "market_index": market_index,
-        }
+        snapshot = self._snapshot
+        entry = snapshot.guidance.get(f"{district}::{crop}") or snapshot.crop_guidance.get(crop)
+        return dict(entry) if entry else {}
 
     @staticmethod
     def _safe_json(value: Any) -> Optional[Dict[str, Any]]:
@@ -282,13 +534,34 @@ class DistrictDataService:
             return None
 
 class WeatherService:
-    def __init__(self, coordinates: Dict[str, Dict[str, float]]) -> None:
+    def __init__(
+        self,
+        coordinates: Dict[str, Dict[str, float]],
+        base_url: str = OPEN_METEO_URL,
+        timeout: float = 8.0,
+        pool_size: int = 20,
+        cache: Optional[CacheBackend] = None,
+        cache_ttl: float = WEATHER_CACHE_TTL,
+    ) -> None:
         self.coordinates = coordinates
+        self.base_url = base_url
+        self.timeout = timeout
+        self.cache = cache if cache is not None and cache_ttl > 0 else NullCache()
+        self.cache_ttl = cache_ttl
+        # One pooled keep-alive session per worker; under gevent its sockets yield to other requests.
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
 
     def get_weather(self, district: str) -> Optional[Dict[str, Any]]:
         coords = self.coordinates.get(district)
         if not coords:
             return None
+        # Failures return None and are not cached, so the next request retries.
+        return self.cache.get_or_compute(f"weather:{district}", lambda: self._fetch(coords), self.cache_ttl)
+
+    def _fetch(self, coords: Dict[str, float]) -> Optional[Dict[str, Any]]:
         params = {
             "latitude": coords["lat"],
             "longitude": coords["lon"],
@@ -296,10 +569,10 @@ class WeatherService:
             "hourly": "temperature_2m,relativehumidity_2m,precipitation",
         }
         try:
-            response = requests.get(
-                "https://api.open-meteo.com/v1/forecast",
+            response = self.session.get(
+                self.base_url,
                 params=params,
-                timeout=8,
+                timeout=self.timeout,
             )
             response.raise_for_status()
             payload = response.json()
@@ -346,32 +619,156 @@ class SchemeService:
         return self.schemes
 
 class ChatbotService:
+    """Answers agronomy questions from a BM25-weighted inverted index built at load time."""
+
+    K1 = 1.5
+    B = 0.75
+    KEYWORD_WEIGHT = 2
+
+    FALLBACK_EMPTY = "Please enter a question about crops, soil, irrigation, or schemes."
+    FALLBACK_NO_MATCH = (
+        "I do not have an exact answer. Please reach out to your local "
+        "Krishi Vigyan Kendra for expert advice."
+    )
+
     def __init__(self, knowledge_base: List[Dict[str, Any]]) -> None:
         self.knowledge_base = knowledge_base
+        self.postings: Dict[str, List[Tuple[int, float]]] = {}
+        self._build_index()
 
-    def answer(self, message: str) -> str:
-        text = (message or "").lower()
-        if not text.strip():
-            return "Please enter a question about crops, soil, irrigation, or schemes."
-        best_match = ""
-        best_score = 0
+    def _build_index(self) -> None:
+        term_frequencies: List[Counter] = []
         for entry in self.knowledge_base:
-            score = sum(1 for keyword in entry["keywords"] if keyword in text)
-            if score > best_score:
-                best_score = score
-                best_match = entry["answer"]
-        if best_score == 0:
-            return (
-                "I do not have an exact answer. Please reach out to your local "
-                "Krishi Vigyan Kendra for expert advice."
-            )
-        return best_match
+            counts: Counter = Counter()
+            for keyword in entry.get("keywords", []):
+                for token in tokenize(keyword):
+                    counts[token] += self.KEYWORD_WEIGHT
+            counts.update(tokenize(entry.get("question", "")))
+            term_frequencies.append(counts)
+
+        doc_count = len(term_frequencies)
+        lengths = [sum(counts.values()) for counts in term_frequencies]
+        avg_length = (sum(lengths) / doc_count) if doc_count else 0.0
+
+        document_frequency: Counter = Counter()
+        for counts in term_frequencies:
+            document_frequency.update(counts.keys())
+
+        postings: Dict[str, List[Tuple[int, float]]] = {}
+        for doc_id, counts in enumerate(term_frequencies):
+            norm = self.K1 * (1 - self.B + self.B * lengths[doc_id] / avg_length) if avg_length else self.K1
+            for token, tf in counts.items():
+                df = document_frequency[token]
+                idf = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+                weight = idf * tf * (self.K1 + 1) / (tf + norm)
+                postings.setdefault(token, []).append((doc_id, weight))
+        self.postings = postings
+
+    def search(self, message: str, top_k: int = 3) -> List[Dict[str, Any]]:
+        scores: Dict[int, float] = {}
+        for token in set(tokenize(message)):
+            for doc_id, weight in self.postings.get(token, ()):
+                scores[doc_id] = scores.get(doc_id, 0.0) + weight
+        best = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+        return [
+            {
+                "question": self.knowledge_base[doc_id].get("question"),
+                "answer": self.knowledge_base[doc_id]["answer"],
+                "score": round(score, 4),
+            }
+            for doc_id, score in best
+        ]
+
+    def answer(self, message: str) -> str:
+        return self.respond(message, top_k=1)[0]
+
+    def respond(self, message: str, top_k: int = 3) -> Tuple[str, List[Dict[str, Any]]]:
+        """The answer and the ``top_k`` matches it was picked from, from a single search."""
+        if not (message or "").strip():
+            return self.FALLBACK_EMPTY, []
+        matches = self.search(message, top_k=top_k)
+        if not matches:
+            return self.FALLBACK_NO_MATCH, matches
+        return matches[0]["answer"], matches
+
+class ModelBundle:
+    """One loaded model version (teacher plus optional student).
+
+    The engine swaps whole bundles, so a request that picked one up keeps
+    using it even if a reload lands mid-request.
+    """
+
+    def __init__(
+        self,
+        model: Any,
+        classes: List[str],
+        feature_cols: List[str],
+        version: str,
+        signature: Tuple,
+        student: Any = None,
+        student_version: Optional[str] = None,
+    ) -> None:
+        self.model = model
+        self.classes = classes
+        self.feature_cols = feature_cols
+        self.version = version
+        self.signature = signature
+        self.student = student
+        self.student_version = student_version
+
+
+def artifact_files(artifact_dir: Path, *fallback: Path) -> List[Path]:
+    """The files that identify an artifact: a mapped manifest, else the given fallbacks."""
+    manifest = artifact_dir / "manifest.json"
+    if manifest.exists():
+        return [manifest]
+    return [path for path in fallback if path.exists()]
+
+
+def stat_signature(paths: List[Path]) -> Tuple:
+    """Cheap change detector; exports replace files, so inode or mtime always moves."""
+    signature = []
+    for path in paths:
+        stat = path.stat()
+        signature.append((str(path), stat.st_ino, stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+def content_version(paths: List[Path]) -> Optional[str]:
+    """Content hash of the artifact files, identical across workers and hosts."""
+    if not paths:
+        return None
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(path.read_bytes())
+    return digest.hexdigest()[:12]
+
 
 class CropRecommendationEngine:
-    def __init__(self, dataset: pd.DataFrame) -> None:
+    RELOAD_SAMPLE_ROWS = 32
+    MAX_MISSING_FEATURE_SHARE = 0.05
+
+    def __init__(
+        self,
+        dataset: pd.DataFrame,
+        batcher: Optional[MicroBatcher] = None,
+        cache: Optional[CacheBackend] = None,
+        cache_ttl: float = RECOMMENDATION_CACHE_TTL,
+        dataset_version: Optional[str] = None,
+    ) -> None:
         # Lazy load model components
-        self.model = None
+        self.batcher = batcher or MicroBatcher(max_batch_size=1)
+        self.cache = cache if cache is not None and cache_ttl > 0 else NullCache()
+        self.cache_ttl = cache_ttl
+        self._bundle: Optional[ModelBundle] = None
+        self._load_lock = threading.Lock()
+        self._watcher: Optional[threading.Thread] = None
+        self._rejected_signature: Optional[Tuple] = None
         self.dataset = dataset.copy()
+        # Imputation depends on the dataset, so cached recommendations are keyed by its version too.
+        self.dataset_version = dataset_version or dataset_fingerprint(
+            pd.util.hash_pandas_object(self.dataset, index=False)
+        )
         # Pre-load dataset metadata (lightweight)
         if "Primary_Crop" not in self.dataset.columns:
             # Fallback if dataset is not loaded correctly
@@ -381,20 +778,44 @@ class CropRecommendationEngine:
             
         # We will initialize the rest in _ensure_loaded()
 
+    @property
+    def model(self) -> Any:
+        return self._bundle.model if self._bundle else None
+
+    @property
+    def student(self) -> Any:
+        return self._bundle.student if self._bundle else None
+
+    @property
+    def classes(self) -> List[str]:
+        return self._bundle.classes
+
+    @property
+    def feature_cols(self) -> List[str]:
+        return self._bundle.feature_cols
+
+    @property
+    def version(self) -> Optional[str]:
+        return self._bundle.version if self._bundle else None
+
     def _ensure_loaded(self):
         """Loads the heavy model and TensorFlow only when needed."""
-        if self.model is not None:
+        if self._bundle is not None:
             return
 
-        print("⏳ Loading TensorFlow and Model...")
-        # Local import to save memory on startup
-        from tensorflow.keras.models import load_model
-        
-        self.model = load_model(MODEL_PATH)
-        meta = np.load(META_PATH, allow_pickle=True)
-        self.feature_cols = list(meta["feature_cols"])
-        self.classes = list(meta["classes"])
-
+        with self._load_lock:
+            if self._bundle is not None:
+                return
+            load_started = time.perf_counter()
+            self._prepare_preprocessing()
+            bundle = self._load_bundle()
+            self._bundle = bundle
+            metrics.registry.set_gauge("agro_model_load_seconds", time.perf_counter() - load_started)
+            self._publish_version(bundle, None)
+            print(f"✅ Model Loaded Successfully (version {bundle.version})")
+        self._start_watcher()
+
+    def _prepare_preprocessing(self) -> None:
         self.dataset = self.dataset.drop(columns=EXCLUDE_COLUMNS, errors="ignore")
         self.input_columns = list(self.dataset.columns)
 
@@ -408,7 +829,198 @@ class CropRecommendationEngine:
             self.imputer.fit(numeric_df)
 
         self.cat_dummy_columns = self._build_categorical_template()
-        print("✅ Model Loaded Successfully")
+
+    def refresh_dataset(self, dataset: pd.DataFrame, dataset_version: str) -> None:
+        """Refits the imputer on a new version of the dataset; the loaded model is untouched.
+
+        The columns must stay the ones the model was trained on.
+        """
+        frame = dataset.drop(columns=EXCLUDE_COLUMNS, errors="ignore")
+        placeholder = safe_mode(frame["Primary_Crop"]) if "Primary_Crop" in frame.columns else None
+        with self._load_lock:
+            if self._bundle is None:
+                # Not prepared yet; the lazy load fits everything on this dataset.
+                self.dataset = dataset.copy()
+                self.placeholder_primary = placeholder or "Paddy"
+                self.dataset_version = dataset_version
+                return
+        if list(frame.columns) != self.input_columns:
+            raise ValueError("The new dataset's columns differ from the ones the model was trained on.")
+
+        imputer = None
+        if self.numeric_cols:
+            imputer = KNNImputer(n_neighbors=5)
+            imputer.fit(frame[self.numeric_cols])
+        with self._load_lock:
+            self.dataset = frame
+            self.imputer = imputer
+            self.placeholder_primary = placeholder or "Paddy"
+            # Last, so a recommendation cached under the new version never came from the old imputer.
+            self.dataset_version = dataset_version
+
+    def _artifact_paths(self) -> Tuple[List[Path], List[Path]]:
+        return (
+            artifact_files(MODEL_ARTIFACT_DIR, MODEL_PATH, META_PATH),
+            artifact_files(STUDENT_ARTIFACT_DIR),
+        )
+
+    def _current_signature(self) -> Tuple:
+        teacher_paths, student_paths = self._artifact_paths()
+        return stat_signature(teacher_paths), stat_signature(student_paths)
+
+    def _load_bundle(self) -> ModelBundle:
+        teacher_paths, student_paths = self._artifact_paths()
+        # Taken before reading, so a write that lands mid-load shows up as a new change.
+        signature = (stat_signature(teacher_paths), stat_signature(student_paths))
+
+        if (MODEL_ARTIFACT_DIR / "manifest.json").exists():
+            print(f"⏳ Mapping model weights from {MODEL_ARTIFACT_DIR.name}...")
+            from model_artifacts import load_mapped_model
+
+            model = load_mapped_model(MODEL_ARTIFACT_DIR)
+            feature_cols = model.feature_cols
+            classes = model.classes
+        else:
+            print("⏳ Loading TensorFlow and Model...")
+            # Local import to save memory on startup
+            from tensorflow.keras.models import load_model
+
+            model = load_model(MODEL_PATH)
+            meta = np.load(META_PATH, allow_pickle=True)
+            feature_cols = list(meta["feature_cols"])
+            classes = list(meta["classes"])
+
+        student = None
+        if student_paths:
+            from model_artifacts import load_mapped_model
+
+            student = load_mapped_model(STUDENT_ARTIFACT_DIR)
+            print(f"✅ Student model mapped from {STUDENT_ARTIFACT_DIR.name}")
+
+        return ModelBundle(
+            model=model,
+            classes=classes,
+            feature_cols=feature_cols,
+            version=content_version(teacher_paths),
+            signature=signature,
+            student=student,
+            student_version=content_version(student_paths),
+        )
+
+    def _publish_version(self, bundle: ModelBundle, previous: Optional[ModelBundle]) -> None:
+        if previous is not None:
+            metrics.registry.set_gauge("agro_model_info", 0, tier="teacher", version=str(previous.version))
+            if previous.student_version:
+                metrics.registry.set_gauge("agro_model_info", 0, tier="student", version=previous.student_version)
+        metrics.registry.set_gauge("agro_model_info", 1, tier="teacher", version=str(bundle.version))
+        if bundle.student_version:
+            metrics.registry.set_gauge("agro_model_info", 1, tier="student", version=bundle.student_version)
+
+    def _smoke_test(self, candidate: ModelBundle) -> Dict[str, Any]:
+        """Runs a fixed sample of dataset rows through the candidate; raises ValueError on failure.
+
+        Doubles as the warm-up, so the first request after the swap pays no
+        graph-building or page-fault cost.
+        """
+        sample = self.dataset.sample(
+            n=min(self.RELOAD_SAMPLE_ROWS, len(self.dataset)), random_state=0
+        ).reset_index(drop=True)
+        features = sample.drop(columns=["Primary_Crop"], errors="ignore")
+        combined = pd.concat(
+            [self._transform_numeric(features), self._transform_categorical(features)], axis=1
+        )
+
+        missing = [col for col in candidate.feature_cols if col not in combined.columns]
+        if len(missing) > self.MAX_MISSING_FEATURE_SHARE * len(candidate.feature_cols):
+            raise ValueError(
+                f"{len(missing)} of {len(candidate.feature_cols)} model features are not produced "
+                f"by preprocessing (e.g. {missing[:3]})"
+            )
+
+        report: Dict[str, Any] = {"rows": len(sample), "missing_features": len(missing)}
+        tiers = [("teacher", candidate.model, candidate.classes, candidate.feature_cols)]
+        if candidate.student is not None:
+            student = candidate.student
+            tiers.append(("student", student, student.classes, student.feature_cols))
+        for tier, model, classes, feature_cols in tiers:
+            matrix = combined.reindex(columns=feature_cols, fill_value=0).values
+            probabilities = np.asarray(model.predict(matrix, verbose=0))
+            if probabilities.shape != (len(sample), len(classes)):
+                raise ValueError(f"{tier} returned shape {probabilities.shape}, expected {(len(sample), len(classes))}")
+            if not np.isfinite(probabilities).all() or not np.allclose(probabilities.sum(axis=1), 1, atol=1e-3):
+                raise ValueError(f"{tier} did not return a probability distribution per row")
+            if tier == "teacher":
+                candidate_top = [classes[idx] for idx in probabilities.argmax(axis=1)]
+
+        current = self._bundle
+        if current is not None:
+            matrix = combined.reindex(columns=current.feature_cols, fill_value=0).values
+            current_top = [current.classes[idx] for idx in current.model.predict(matrix, verbose=0).argmax(axis=1)]
+            agreement = sum(a == b for a, b in zip(candidate_top, current_top)) / len(sample)
+            report["top1_agreement"] = round(agreement, 4)
+            if agreement < MODEL_RELOAD_MIN_AGREEMENT:
+                raise ValueError(
+                    f"top-1 agreement with the serving model is {agreement:.2f}, "
+                    f"below MODEL_RELOAD_MIN_AGREEMENT={MODEL_RELOAD_MIN_AGREEMENT}"
+                )
+        return report
+
+    def reload(self, force: bool = False) -> bool:
+        """Loads, warms and smoke-tests the artifacts on disk, then swaps them in.
+
+        Returns True when a new version went live. Requests already running
+        finish on the bundle they started with.
+        """
+        current = self._bundle
+        if current is None:
+            # Nothing served yet; the lazy load will pick up whatever is on disk.
+            return False
+        signature: Optional[Tuple] = None
+        try:
+            signature = self._current_signature()
+            if not force and signature == current.signature:
+                return False
+            candidate = self._load_bundle()
+            report = self._smoke_test(candidate)
+        except Exception:
+            # Remembered so the watcher does not retry the same broken export every tick.
+            self._rejected_signature = signature
+            metrics.registry.inc("agro_model_reloads_total", outcome="rejected")
+            app.logger.exception("Model reload rejected; still serving version %s", current.version)
+            return False
+
+        with self._load_lock:
+            previous, self._bundle = self._bundle, candidate
+        self._rejected_signature = None
+        self._publish_version(candidate, previous)
+        metrics.registry.inc("agro_model_reloads_total", outcome="swapped")
+        print(f"🔄 Model version {candidate.version} replaced {previous.version} (smoke test: {report})")
+        return True
+
+    def _start_watcher(self) -> None:
+        if MODEL_RELOAD_INTERVAL <= 0 or self._watcher is not None:
+            return
+        self._watcher = threading.Thread(target=self._watch, name="model-reload", daemon=True)
+        self._watcher.start()
+
+    def _watch(self) -> None:
+        pending: Optional[Tuple] = None
+        while True:
+            time.sleep(MODEL_RELOAD_INTERVAL)
+            try:
+                signature = self._current_signature()
+            except OSError:
+                # Caught between an unlink and a replace; look again next tick.
+                continue
+            if signature in (self._bundle.signature, self._rejected_signature):
+                pending = None
+                continue
+            # Wait until the artifacts look the same for two ticks, so a half-copied export is never loaded.
+            if signature != pending:
+                pending = signature
+                continue
+            pending = None
+            self.reload()
 
     def _identify_numeric_columns(self) -> List[str]:
         feature_df = self.dataset.drop(columns=["Primary_Crop"], errors='ignore')
@@ -451,30 +1063,136 @@ class CropRecommendationEngine:
         if not self.categorical_cols:
             return pd.DataFrame(index=X.index)
         cat_df = X[self.categorical_cols].copy().fillna("Unknown")
-        encoded = pd.get_dummies(cat_df, columns=self.categorical_cols, drop_first=True)
+        # No drop_first here: the template already omits each baseline level, and dropping the
+        # first level *present* would zero out single rows and make batches order-dependent.
+        encoded = pd.get_dummies(cat_df, columns=self.categorical_cols)
         encoded = encoded.reindex(columns=self.cat_dummy_columns, fill_value=0)
         return encoded
 
-    def predict(self, payload: Dict[str, Any]) -> List[Dict[str, Any]]:
-        self._ensure_loaded()  # <--- Load model here!
-        
-        row = self._build_row(payload)
-        sample_df = pd.DataFrame([row])
-        features = sample_df.drop(columns=["Primary_Crop"], errors="ignore")
+    def resolve_tier(self, tier: Optional[str] = None, bundle: Optional[ModelBundle] = None) -> str:
+        """Requested tier, else MODEL_TIER; falls back to the teacher when no student is deployed."""
+        bundle = bundle or self._bundle
+        tier = (tier or MODEL_TIER).lower()
+        if tier not in MODEL_TIERS:
+            raise ValueError(f"Model tier must be one of {', '.join(MODEL_TIERS)}")
+        if tier == "student" and (bundle is None or bundle.student is None):
+            return "teacher"
+        return tier
+
+    def _select(self, tier: Optional[str]) -> Tuple[str, Any, List[str], List[str], Optional[str]]:
+        """Tier, model, classes, feature columns and version, all from one bundle."""
+        if self._bundle is None:
+            with span("model_load"):
+                self._ensure_loaded()  # <--- Load model here!
+        bundle = self._bundle
+        tier = self.resolve_tier(tier, bundle)
+        if tier == "student":
+            student = bundle.student
+            return tier, student, student.classes, student.feature_cols, bundle.student_version
+        return tier, bundle.model, bundle.classes, bundle.feature_cols, bundle.version
+
+    def _feature_matrix(self, payloads: List[Dict[str, Any]], feature_cols: List[str]) -> np.ndarray:
+        rows = pd.DataFrame([self._build_row(payload) for payload in payloads])
+        features = rows.drop(columns=["Primary_Crop"], errors="ignore")
 
         numeric_part = self._transform_numeric(features)
         categorical_part = self._transform_categorical(features)
 
         combined = pd.concat([numeric_part, categorical_part], axis=1)
-        combined = combined.reindex(columns=self.feature_cols, fill_value=0)
+        combined = combined.reindex(columns=feature_cols, fill_value=0)
+        return combined.to_numpy(dtype=np.float32)
 
-        predictions = self.model.predict(combined.values, verbose=0)[0]
+    @staticmethod
+    def _top_three(predictions: np.ndarray, classes: List[str]) -> List[Dict[str, Any]]:
         top_indices = predictions.argsort()[::-1][:3]
         return [
-            {"crop": self.classes[idx], "score": round(float(predictions[idx]), 4)}
+            {"crop": classes[idx], "score": round(float(predictions[idx]), 4)}
             for idx in top_indices
         ]
 
+    def recommend(self, payload: Dict[str, Any], tier: Optional[str] = None) -> Dict[str, Any]:
+        """Top-3 crops plus the tier and model version that produced them.
+
+        Memoized per model version, so a hot reload never serves stale results.
+        """
+        tier, model, classes, feature_cols, version = self._select(tier)
+
+        def compute() -> Dict[str, Any]:
+            with span("preprocess"):
+                matrix = self._feature_matrix([payload], feature_cols)
+
+            with span("inference"):
+                predictions = self.batcher.predict_one(model, matrix[0])
+            recommendations = self._top_three(predictions, classes)
+            return {"recommendations": recommendations, "model_tier": tier, "model_version": version}
+
+        if version is None:
+            return compute()
+        digest = hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:32]
+        key = f"recommendation:{tier}:{version}:{self.dataset_version}:{digest}"
+        return self.cache.get_or_compute(key, compute, self.cache_ttl)
+
+    def recommend_batch(self, payloads: List[Dict[str, Any]], tier: Optional[str] = None) -> Dict[str, Any]:
+        """``recommend`` for many payloads: one preprocessing pass and one model call."""
+        tier, model, classes, feature_cols, version = self._select(tier)
+        if not payloads:
+            return {"recommendations": [], "model_tier": tier, "model_version": version}
+
+        with span("preprocess"):
+            matrix = self._feature_matrix(payloads, feature_cols)
+
+        with span("inference"):
+            predictions = np.asarray(model.predict(matrix, batch_size=len(matrix), verbose=0))
+        recommendations = [self._top_three(row, classes) for row in predictions]
+        return {"recommendations": recommendations, "model_tier": tier, "model_version": version}
+
+    def predict(self, payload: Dict[str, Any], tier: Optional[str] = None) -> List[Dict[str, Any]]:
+        return self.recommend(payload, tier)["recommendations"]
+
+    def what_if(
+        self, payload: Dict[str, Any], grid: Dict[str, Any], k: int = 3, tier: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Scores every point of a soil-nutrient grid laid over ``payload`` in one model call.
+
+        The base row is preprocessed once and tiled; only the varied columns
+        are overwritten. If the base needs KNN imputation, which depends on the
+        varied values, every point is preprocessed instead.
+        """
+        tier, model, classes, feature_cols, version = self._select(tier)
+        with span("preprocess"):
+            order, axes, values = build_grid(grid, payload)
+            column_index = {col: idx for idx, col in enumerate(feature_cols)}
+            unknown = [col for col in order if col not in column_index]
+            if unknown:
+                raise ValueError(f"The model does not use {', '.join(unknown)}")
+            needs_imputation = any(
+                pd.isna(pd.to_numeric(payload.get(col), errors="coerce"))
+                for col in self.numeric_cols if col not in axes
+            )
+            if needs_imputation:
+                payloads = [{**payload, **dict(zip(order, point))} for point in values]
+                matrix = self._feature_matrix(payloads, feature_cols)
+            else:
+                base_row = self._feature_matrix([payload], feature_cols)[0]
+                matrix = np.repeat(base_row[None, :], len(values), axis=0)
+                matrix[:, [column_index[col] for col in order]] = values
+
+        with span("inference"):
+            probabilities = np.asarray(model.predict(matrix, batch_size=len(matrix), verbose=0))
+        indices, scores = top_k_classes(probabilities, k)
+        # Crop names are sent once; each point refers to them by position.
+        used, positions = np.unique(indices, return_inverse=True)
+        return {
+            "order": order,
+            "axes": {col: np.round(axis, 4).tolist() for col, axis in axes.items()},
+            "points": int(len(values)),
+            "crops": [classes[idx] for idx in used],
+            "crop_index": positions.reshape(indices.shape).tolist(),
+            "score": np.round(scores.astype(np.float64), 4).tolist(),
+            "model_tier": tier,
+            "model_version": version,
+        }
+
 
 
 @app.route("/")
@@ -592,6 +1310,91 @@ def history():
     predictions = Prediction.query.filter_by(user_id=current_user.id).order_by(desc(Prediction.created_at)).all()
     return render_template('history.html', predictions=predictions)
 
+HISTORY_EXPORT_COLUMNS = [
+    "id", "created_at", "district", "mandal", "season", "soil_type", "water_source", "mode",
+    "soil_ph", "organic_carbon", "soil_n", "soil_p", "soil_k",
+    "top_crop", "top_crop_score", "second_crop", "second_crop_score", "third_crop", "third_crop_score",
+]
+HISTORY_EXPORT_BATCH = 500
+
+
+def parse_export_date(value: Optional[str], field: str) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise ValueError(f"'{field}' must be a date in YYYY-MM-DD format")
+
+
+@app.route("/history/export")
+@login_required
+def export_history() -> Any:
+    """Streams the signed-in user's predictions as CSV or JSON Lines.
+
+    Optional filters: ``start`` and ``end`` (inclusive, YYYY-MM-DD) and
+    ``district``. Rows come off a ``yield_per`` cursor as plain tuples and are
+    written HISTORY_EXPORT_BATCH at a time, so memory does not grow with the
+    history size.
+    """
+    export_format = request.args.get("format", "csv").lower()
+    if export_format not in {"csv", "jsonl"}:
+        return jsonify({"error": "format must be 'csv' or 'jsonl'"}), 400
+    try:
+        start = parse_export_date(request.args.get("start"), "start")
+        end = parse_export_date(request.args.get("end"), "end")
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+
+    columns = [getattr(Prediction, name) for name in HISTORY_EXPORT_COLUMNS]
+    query = db.session.query(*columns).filter(Prediction.user_id == current_user.id)
+    if start:
+        query = query.filter(Prediction.created_at >= start)
+    if end:
+        query = query.filter(Prediction.created_at < end + timedelta(days=1))
+    district = request.args.get("district")
+    if district:
+        query = query.filter(Prediction.district == district)
+    # yield_per also turns on server-side cursors where the driver has them (PostgreSQL).
+    rows = query.order_by(desc(Prediction.created_at), desc(Prediction.id)).yield_per(HISTORY_EXPORT_BATCH)
+
+    def as_record(row: Any) -> Dict[str, Any]:
+        record = dict(zip(HISTORY_EXPORT_COLUMNS, row))
+        if record["created_at"] is not None:
+            record["created_at"] = record["created_at"].isoformat()
+        return record
+
+    def generate_csv() -> Any:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(HISTORY_EXPORT_COLUMNS)
+        for count, row in enumerate(rows, start=1):
+            record = as_record(row)
+            writer.writerow([record[name] for name in HISTORY_EXPORT_COLUMNS])
+            if count % HISTORY_EXPORT_BATCH == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+    def generate_jsonl() -> Any:
+        lines: List[str] = []
+        for row in rows:
+            lines.append(json.dumps(as_record(row)) + "\n")
+            if len(lines) == HISTORY_EXPORT_BATCH:
+                yield "".join(lines)
+                lines = []
+        yield "".join(lines)
+
+    generate, mimetype = (generate_csv, "text/csv") if export_format == "csv" else (generate_jsonl, "application/x-ndjson")
+    filename = f"prediction_history_{datetime.utcnow():%Y%m%d}.{export_format}"
+    return Response(
+        stream_with_context(generate()),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
 @app.route("/logout")
 @login_required
 def logout():
@@ -643,10 +1446,13 @@ def terms_page() -> str:
 
 @app.route("/get_district_names")
 def get_district_names() -> Any:
-    return jsonify(district_service.get_districts())
+    return json_cache.respond(("districts",)) or jsonify(district_service.get_districts())
 
 @app.route("/get_district_data/<district_name>")
 def get_district_data(district_name: str) -> Any:
+    cached = json_cache.respond(("district_data", district_name))
+    if cached is not None:
+        return cached
     try:
         return jsonify(district_service.get_district_data(district_name))
     except ValueError as exc:
@@ -658,12 +1464,28 @@ def auto_defaults() -> Any:
     season = request.args.get("season")
     if not district:
         return jsonify({"error": "district is required"}), 400
+    # Unknown seasons fall back to the district-wide defaults, as in get_auto_defaults.
+    cached = json_cache.respond(("auto_defaults", district, season or None)) or json_cache.respond(
+        ("auto_defaults", district, None)
+    )
+    if cached is not None:
+        return cached
     try:
         data = district_service.get_auto_defaults(district, season)
         return jsonify(data)
     except ValueError as exc:
         return jsonify({"error": str(exc)}), 404
 
+@app.route("/api/bootstrap")
+def bootstrap() -> Any:
+    """Districts, mandals, defaults and schemes in one response, for pages to cache client-side.
+
+    Pages request ``?v=<bootstrap_version>``; that URL never changes content,
+    so it is served as immutable.
+    """
+    entry = json_cache.get(("bootstrap",))
+    return json_cache.respond(("bootstrap",), immutable=entry is not None and request.args.get("v") == entry.etag)
+
 @app.route("/api/weather/<district>")
 def weather(district: str) -> Any:
     data = weather_service.get_weather(district)
@@ -673,16 +1495,51 @@ def weather(district: str) -> Any:
 
 @app.route("/schemes")
 def schemes() -> Any:
-    return jsonify(scheme_service.list_schemes())
+    return json_cache.respond(("schemes",)) or jsonify(scheme_service.list_schemes())
 
 @app.route("/chat", methods=["POST"])
 def chat() -> Any:
     payload = request.get_json() or {}
     message = payload.get("message", "")
-    response = chatbot_service.answer(message)
-    return jsonify({"response": response})
+    try:
+        top_k = min(max(int(payload.get("top_k", 3)), 1), 10)
+    except (TypeError, ValueError):
+        top_k = 3
+    response, matches = chatbot_service.respond(message, top_k=top_k)
+    return jsonify({"response": response, "matches": matches})
+
+
+def run_inference(method: str, *args: Any, rows: int = 1) -> Dict[str, Any]:
+    """Runs an engine method in the model server sidecar when one is configured, else (or if it is down) locally.
+
+    ``rows`` (rows or grid points scored) sizes the sidecar timeout. A sidecar
+    that is merely slow raises ModelServerTimeout instead of falling back, so
+    the work is not run twice and the model is never loaded into the web worker.
+    """
+    if model_server_client is not None:
+        try:
+            with span("model_server"):
+                result = model_server_client.invoke(method, *args, rows=rows)
+            metrics.registry.inc("agro_model_server_requests_total", outcome="served")
+            return result
+        except ModelServerTimeout:
+            metrics.registry.inc("agro_model_server_requests_total", outcome="timeout")
+            raise
+        except ModelServerUnavailable:
+            # The client logs when it marks the sidecar down; no per-request noise here.
+            metrics.registry.inc("agro_model_server_requests_total", outcome="fallback")
+    return inference_pool.run(getattr(recommendation_engine, method), *args)
+
+
+def admission_key() -> str:
+    """Fairness key: the account when signed in, else the client address."""
+    if current_user.is_authenticated:
+        return f"user:{current_user.id}"
+    return f"ip:{request.remote_addr}"
+
 
 @app.route("/predict", methods=["GET", "POST"])
+@predict_admission.limit(admission_key)
 def predict() -> Any:
     # If GET request, redirect to dashboard with message
     if request.method == "GET":
@@ -705,42 +1562,49 @@ def predict() -> Any:
         return jsonify({"error": "Mode must be 'manual' or 'auto'"}), 400
 
     try:
-        model_payload = district_service.build_model_payload(
-            district=district,
-            season=season,
-            raw_payload=payload,
-            mode=mode,
-        )
-        recommendations = recommendation_engine.predict(model_payload)
+        with span("payload"):
+            model_payload = district_service.build_model_payload(
+                district=district,
+                season=season,
+                raw_payload=payload,
+                mode=mode,
+            )
+        result = run_inference("recommend", model_payload, payload.get("tier"))
+        recommendations = result["recommendations"]
         top_crop = recommendations[0]["crop"]
-        guidance = district_service.fetch_guidance(district, top_crop)
-        location_snapshot = district_service.get_auto_defaults(district, season)
-        weather_snapshot = weather_service.get_weather(district)
+        with span("guidance"):
+            guidance = district_service.fetch_guidance(district, top_crop)
+            location_snapshot = district_service.get_auto_defaults(district, season)
+        with span("weather"):
+            weather_snapshot = weather_service.get_weather(district)
 
         # Save prediction to database
         try:
-            prediction = Prediction(
-                user_id=current_user.id,
-                district=district,
-                mandal=model_payload.get("Mandal"),
-                season=model_payload.get("Season"),
-                soil_type=model_payload.get("Soil_Type"),
-                water_source=model_payload.get("Water_Source"),
-                mode=mode,
-                top_crop=recommendations[0]["crop"],
-                top_crop_score=recommendations[0]["score"],
-                second_crop=recommendations[1]["crop"] if len(recommendations) > 1 else None,
-                second_crop_score=recommendations[1]["score"] if len(recommendations) > 1 else None,
-                third_crop=recommendations[2]["crop"] if len(recommendations) > 2 else None,
-                third_crop_score=recommendations[2]["score"] if len(recommendations) > 2 else None,
-            )
-            db.session.add(prediction)
-            db.session.commit()
+            with span("db_commit"):
+                prediction = Prediction(
+                    user_id=current_user.id,
+                    district=district,
+                    mandal=model_payload.get("Mandal"),
+                    season=model_payload.get("Season"),
+                    soil_type=model_payload.get("Soil_Type"),
+                    water_source=model_payload.get("Water_Source"),
+                    mode=mode,
+                    top_crop=recommendations[0]["crop"],
+                    top_crop_score=recommendations[0]["score"],
+                    second_crop=recommendations[1]["crop"] if len(recommendations) > 1 else None,
+                    second_crop_score=recommendations[1]["score"] if len(recommendations) > 1 else None,
+                    third_crop=recommendations[2]["crop"] if len(recommendations) > 2 else None,
+                    third_crop_score=recommendations[2]["score"] if len(recommendations) > 2 else None,
+                )
+                db.session.add(prediction)
+                db.session.commit()
         except Exception as e:
             print(f"Error saving prediction: {e}")
 
         response_payload = {
             "mode": mode,
+            "model_tier": result["model_tier"],
+            "model_version": result["model_version"],
             "recommendations": recommendations,
             "location_details": {
                 "district": district,
@@ -757,10 +1621,103 @@ def predict() -> Any:
         return jsonify(response_payload)
     except ValueError as exc:
         return jsonify({"error": str(exc)}), 400
+    except ModelServerTimeout:
+        app.logger.warning("Model server timed out for district=%s mode=%s", district, mode)
+        return jsonify({"error": "The model server is busy; please try again."}), 504
     except Exception:
+        app.logger.exception("Prediction failed for district=%s mode=%s", district, mode)
         return jsonify({"error": "Unable to generate recommendations at the moment."}), 500
 
 
+@app.route("/predict/what-if", methods=["POST"])
+@predict_admission.limit(admission_key)
+def predict_what_if() -> Any:
+    """Top-k crops over a grid of soil N/P/K/pH/organic-carbon values around a district's defaults.
+
+    Body: ``district``, optional ``season``/``mandal``/``soil_type``/... like
+    manual-mode /predict, ``grid`` mapping features to ranges (see
+    what_if.parse_axis), optional ``top_k`` (1-10) and ``tier``. Points are
+    listed in C order of ``order``: the last axis varies fastest.
+    """
+    payload = request.get_json(silent=True)
+    if not payload:
+        return jsonify({"error": "Invalid input payload"}), 400
+    district = payload.get("district")
+    if not district:
+        return jsonify({"error": "Please select a district"}), 400
+    try:
+        k = min(max(int(payload.get("top_k", 3)), 1), 10)
+    except (TypeError, ValueError):
+        return jsonify({"error": "top_k must be an integer"}), 400
+
+    try:
+        with span("payload"):
+            model_payload = district_service.build_model_payload(
+                district=district,
+                season=payload.get("season"),
+                raw_payload=payload,
+                mode="manual",
+            )
+            points = math.prod(len(values) for values in parse_grid(payload.get("grid"), model_payload).values())
+        result = run_inference("what_if", model_payload, payload.get("grid"), k, payload.get("tier"), rows=points)
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+    except ModelServerTimeout:
+        app.logger.warning("Model server timed out on a what-if sweep for district=%s", district)
+        return jsonify({"error": "The model server is busy; please try again."}), 504
+    except Exception:
+        app.logger.exception("What-if sweep failed for district=%s", district)
+        return jsonify({"error": "Unable to run the what-if sweep at the moment."}), 500
+
+    base = {col: model_payload.get(col) for col in result["order"]}
+    return jsonify({"district": district, "season": model_payload.get("Season"), "base": base, **result})
+
+
+@app.route("/predict/bulk", methods=["POST"])
+@login_required
+def predict_bulk() -> Any:
+    """Scores an uploaded CSV of plots and streams the results back as CSV.
+
+    Send the file as multipart field ``file`` (or the raw body as text/csv).
+    Rows are read, preprocessed and scored BULK_CHUNK_ROWS at a time, so memory
+    stays flat whatever the upload size. The upload holds one prediction
+    admission slot until its last row is sent.
+    """
+    upload = request.files.get("file")
+    stream = upload.stream if upload is not None else request.stream
+    tier = request.args.get("tier") or request.form.get("tier")
+    try:
+        recommendation_engine.resolve_tier(tier)
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+    try:
+        chunks = read_chunks(stream, BULK_CHUNK_ROWS)
+    except BulkUploadError as exc:
+        return jsonify({"error": str(exc)}), 400
+
+    def build_payload(district: str, season: Optional[str], record: Dict[str, Any]) -> Dict[str, Any]:
+        return district_service.build_model_payload(district=district, season=season, raw_payload=record, mode="manual")
+
+    def on_error(exc: Exception) -> None:
+        app.logger.error("Bulk prediction chunk failed for user %s", current_user.get_id(), exc_info=exc)
+
+    def score(payloads: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return run_inference("recommend_batch", payloads, tier, rows=len(payloads))
+
+    results = stream_results(chunks, build_payload, score, on_error)
+    try:
+        # Scoring runs while the response streams, after this view returns, so a decorator would release too early.
+        results = predict_admission.hold_stream(admission_key(), results)
+    except AdmissionRejected as exc:
+        return predict_admission.busy_response(exc)
+    filename = Path(secure_filename(upload.filename) if upload is not None and upload.filename else "plots").stem or "plots"
+    return Response(
+        stream_with_context(results),
+        mimetype="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="{filename}_recommendations.csv"'},
+    )
+
+
 @app.route("/login/google")
 def login_google():
     flash("Google Login is not configured in this demo.", "info")
@@ -773,11 +1730,139 @@ def login_facebook():
 
 # Initialize Services (MUST BE AT BOTTOM, after classes are defined)
 DATASET = pd.read_csv(DATASET_PATH)
-district_service = DistrictDataService(DATASET)
-recommendation_engine = CropRecommendationEngine(DATASET)
+shared_cache = cache_from_env(Path(app.instance_path) / "agro-cache.sqlite")
+district_service = DistrictDataService(DATASET, cache=shared_cache)
+dataset_reload_lock = threading.Lock()
+inference_pool = InferencePool.from_env()
+inference_batcher = MicroBatcher.from_env()
+if green_mode() and inference_batcher.enabled:
+    # The batcher's queue and dispatcher would be gevent-patched while callers run on native pool threads.
+    print("⚠️  INFERENCE_MAX_BATCH is ignored in gevent workers; run the model server sidecar to batch.")
+    inference_batcher = MicroBatcher(max_batch_size=1)
+recommendation_engine = CropRecommendationEngine(
+    DATASET, batcher=inference_batcher, cache=shared_cache, dataset_version=district_service.fingerprint
+)
+model_server_client = ModelServerClient.from_env()
 scheme_service = SchemeService(GOVERNMENT_SCHEMES)
-chatbot_service = ChatbotService(CHATBOT_KNOWLEDGE)
-weather_service = WeatherService(DISTRICT_COORDINATES)
+chatbot_service = ChatbotService(CHATBOT_KNOWLEDGE + load_knowledge_base(CHATBOT_KNOWLEDGE_PATH))
+weather_service = WeatherService(
+    DISTRICT_COORDINATES,
+    timeout=float(os.environ.get("WEATHER_TIMEOUT_SECONDS", "8")),
+    pool_size=int(os.environ.get("WEATHER_POOL_SIZE", "20")),
+    cache=shared_cache,
+)
+json_cache = JsonResponseCache.from_env()
+# Summary keys sent in the bootstrap bundle; "district" is implied by the key it sits under.
+BOOTSTRAP_FIELDS = [
+    "mandal", "season", "soil_type", "water_source", "secondary_crop", "primary_crop", "soil_ph",
+    "organic_carbon", "soil_n", "soil_p", "soil_k", "rainfall", "humidity", "temperature",
+]
+
+
+def precompute_json_responses() -> None:
+    """Serializes the district and scheme endpoints once; call again whenever the dataset or schemes change."""
+    entries: Dict[Any, Any] = {
+        ("districts",): district_service.get_districts(),
+        ("schemes",): scheme_service.list_schemes(),
+    }
+    for district in district_service.district_summary:
+        entries[("district_data", district)] = district_service.get_district_data(district)
+        entries[("auto_defaults", district, None)] = district_service.get_auto_defaults(district, None)
+    for key, summary in district_service.seasonal_summary.items():
+        district, season = key.split("::", 1)
+        entries[("auto_defaults", district, season)] = summary
+    entries[("bootstrap",)] = {
+        "fields": BOOTSTRAP_FIELDS,
+        "districts": district_service.bootstrap_bundle(BOOTSTRAP_FIELDS),
+        "schemes": scheme_service.list_schemes(),
+    }
+    json_cache.load(entries)
+
+
+@app.context_processor
+def inject_bootstrap_version() -> Dict[str, Any]:
+    entry = json_cache.get(("bootstrap",))
+    return {"bootstrap_version": entry.etag if entry else ""}
+
+
+def reload_dataset(path: Path = DATASET_PATH) -> Optional[Dict[str, Any]]:
+    """Re-reads the dataset and swaps in what changed while requests keep being served.
+
+    Only districts and seasons whose rows differ are re-summarized; the
+    imputer is refitted and the JSON endpoints re-serialized once the
+    summaries are in place. Returns the change report, or None when the file
+    could not be loaded and the previous data is still served.
+    """
+    global DATASET
+    with dataset_reload_lock:
+        try:
+            dataset = pd.read_csv(path)
+            fingerprint = dataset_fingerprint(pd.util.hash_pandas_object(dataset, index=False))
+            if fingerprint != district_service.fingerprint:
+                # The engine goes first: it rejects a file whose columns no longer fit the model.
+                recommendation_engine.refresh_dataset(dataset, fingerprint)
+            report = district_service.refresh(dataset)
+            if report["fingerprint"] != report["previous_fingerprint"]:
+                precompute_json_responses()
+                DATASET = dataset
+        except Exception:
+            metrics.registry.inc("agro_dataset_reloads_total", outcome="rejected")
+            app.logger.exception("Dataset reload failed; still serving version %s", district_service.fingerprint)
+            return None
+    if report["fingerprint"] == report["previous_fingerprint"]:
+        metrics.registry.inc("agro_dataset_reloads_total", outcome="unchanged")
+        return report
+    metrics.registry.inc("agro_dataset_reloads_total", outcome="swapped")
+    districts = report["districts"]
+    recomputed = len(districts["added"]) + len(districts["changed"])
+    metrics.registry.inc("agro_dataset_districts_recomputed_total", recomputed)
+    print(
+        f"🔄 Dataset version {report['fingerprint']} replaced {report['previous_fingerprint']} "
+        f"({recomputed} districts recomputed, {len(districts['removed'])} removed, {report['seconds']}s)"
+    )
+    return report
+
+
+def watch_dataset(path: Path = DATASET_PATH) -> None:
+    served = stat_signature([path])
+    pending: Optional[Tuple] = None
+    while True:
+        time.sleep(DATASET_RELOAD_INTERVAL)
+        try:
+            signature = stat_signature([path])
+        except OSError:
+            continue
+        if signature == served:
+            pending = None
+            continue
+        # Same two-tick settle as the model watcher, so a half-written CSV is never parsed.
+        if signature != pending:
+            pending = signature
+            continue
+        pending = None
+        served = signature
+        inference_pool.run(reload_dataset, path)
+
+
+precompute_json_responses()
+# Each object is counted under the first component that reaches it: the shared cache
+# is listed before the services holding it, and the engine's model after its dataset.
+memory_accountant.track("dataset", lambda: DATASET)
+memory_accountant.track("shared_cache", lambda: shared_cache)
+memory_accountant.track("json_cache", lambda: json_cache)
+memory_accountant.track("district_service", lambda: district_service)
+memory_accountant.track("recommendation_engine", lambda: recommendation_engine)
+memory_accountant.track("chatbot_service", lambda: chatbot_service)
+memory_accountant.track("weather_service", lambda: weather_service)
+# Every live session in this process (one per in-flight request), not just the caller's.
+memory_accountant.track(
+    "sqlalchemy_identity_maps",
+    lambda: [list(session.identity_map.values()) for session in list(db.session.registry.registry.values())],
+)
+# A baseline taken from startup would list every import and service as growth.
+memory_accountant.tracer.reset()
+if DATASET_RELOAD_INTERVAL > 0:
+    threading.Thread(target=watch_dataset, name="dataset-reload", daemon=True).start()
 
 if __name__ == "__main__":
 
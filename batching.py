@@ -0,0 +1,114 @@
+# Micro-batching for single-row model inference
+# This file will be imported by app.py
+
+from __future__ import annotations
+
+import os
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+import metrics
+
+
+class _PendingRow:
+    __slots__ = ("model", "row", "enqueued", "done", "result", "error")
+
+    def __init__(self, model: Any, row: np.ndarray) -> None:
+        self.model = model
+        self.row = row
+        self.enqueued = time.perf_counter()
+        self.done = threading.Event()
+        self.result: Optional[np.ndarray] = None
+        self.error: Optional[BaseException] = None
+
+
+class MicroBatcher:
+    """Coalesces concurrent single-row ``predict`` calls into one matrix.
+
+    Callers block in ``predict_one`` while a dispatcher thread collects rows
+    until ``max_batch_size`` are waiting or ``max_wait_ms`` has passed since
+    the first one arrived, then runs one ``model.predict`` per distinct model
+    in the batch. Rows for different models (teacher/student, or two versions
+    across a hot reload) are never mixed in one matrix.
+    """
+
+    def __init__(self, max_batch_size: int = 32, max_wait_ms: float = 2.0) -> None:
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self._queue: "queue.Queue[_PendingRow]" = queue.Queue()
+        self._dispatcher: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "MicroBatcher":
+        return cls(
+            max_batch_size=int(os.environ.get("INFERENCE_MAX_BATCH", "1")),
+            max_wait_ms=float(os.environ.get("INFERENCE_MAX_WAIT_MS", "2")),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_batch_size > 1
+
+    def predict_one(self, model: Any, row: np.ndarray) -> np.ndarray:
+        """Probabilities for a single feature row, batched with concurrent callers when enabled."""
+        row = np.asarray(row, dtype=np.float32).reshape(-1)
+        if not self.enabled:
+            return np.asarray(model.predict(row[None, :], verbose=0))[0]
+        self._ensure_dispatcher()
+        pending = _PendingRow(model, row)
+        self._queue.put(pending)
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _ensure_dispatcher(self) -> None:
+        # Started on first use, i.e. inside each gunicorn worker rather than the forking master.
+        if self._dispatcher is not None:
+            return
+        with self._start_lock:
+            if self._dispatcher is None:
+                self._dispatcher = threading.Thread(target=self._run, name="inference-batcher", daemon=True)
+                self._dispatcher.start()
+
+    def _collect(self) -> List[_PendingRow]:
+        batch = [self._queue.get()]
+        deadline = batch[0].enqueued + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            flushed = time.perf_counter()
+            groups: Dict[int, List[_PendingRow]] = {}
+            for pending in batch:
+                groups.setdefault(id(pending.model), []).append(pending)
+                metrics.registry.observe("agro_inference_queue_wait_seconds", flushed - pending.enqueued)
+            for rows in groups.values():
+                self._flush(rows)
+
+    def _flush(self, rows: List[_PendingRow]) -> None:
+        metrics.registry.inc("agro_inference_batches_total")
+        metrics.registry.inc("agro_inference_batched_rows_total", len(rows))
+        try:
+            matrix = np.stack([pending.row for pending in rows])
+            probabilities = np.asarray(rows[0].model.predict(matrix, verbose=0))
+            for pending, result in zip(rows, probabilities):
+                pending.result = result
+        except BaseException as exc:
+            for pending in rows:
+                pending.error = exc
+        finally:
+            for pending in rows:
+                pending.done.set()
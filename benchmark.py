@@ -0,0 +1,307 @@
+# benchmark.py
+"""Times each stage of the prediction pipeline.
+
+Usage:
+    python benchmark.py --output bench.json
+    python benchmark.py --compare bench_baseline.json --tolerance 0.25
+    python benchmark.py --stage model_inference --batching --concurrency 32
+    python benchmark.py --stage engine_predict --with-cache   # cache-hit latency
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+# Benchmarks never touch the real database.
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+
+BASE_DIR = Path(__file__).resolve().parent
+
+BENCH_DISTRICT = "Guntur"
+BENCH_SEASON = "Kharif"
+
+STUB_WEATHER = {
+    "current": {"temperature": 31.2, "windspeed": 9.4, "weathercode": 2, "time": "2024-07-01T09:00"},
+    "hourly": [
+        {"time": f"2024-07-01T{hour:02d}:00", "temperature": 30.0, "humidity": 70, "precipitation": 0.0}
+        for hour in range(12)
+    ],
+}
+
+
+def measure(fn: Callable[[], Any], repeat: int, warmup: int = 3) -> Dict[str, float]:
+    """Runs ``fn`` and returns latency statistics in milliseconds."""
+    for _ in range(warmup):
+        fn()
+    samples: List[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "runs": repeat,
+        "mean_ms": round(statistics.fmean(samples), 4),
+        "p50_ms": round(samples[len(samples) // 2], 4),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 4),
+        "min_ms": round(samples[0], 4),
+        "max_ms": round(samples[-1], 4),
+    }
+
+
+def bench_boot(repeat: int) -> Dict[str, float]:
+    """Cold import of ``app`` in a fresh interpreter (dataset load + service construction)."""
+    env = {**os.environ, "DATABASE_URL": "sqlite://"}
+
+    def boot() -> None:
+        subprocess.run(
+            [sys.executable, "-c", "import app"],
+            cwd=BASE_DIR,
+            env=env,
+            check=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+
+    return measure(boot, repeat=repeat, warmup=0)
+
+
+def run_benchmarks(repeat: int, stages: Optional[List[str]] = None) -> Dict[str, Dict[str, float]]:
+    import pandas as pd
+
+    import app as agro_app
+
+    results: Dict[str, Dict[str, float]] = {}
+
+    def wanted(name: str) -> bool:
+        return not stages or name in stages
+
+    if wanted("app_boot"):
+        results["app_boot"] = bench_boot(max(1, repeat // 50))
+
+    district_service = agro_app.district_service
+    engine = agro_app.recommendation_engine
+    engine._ensure_loaded()
+
+    model_payload = district_service.build_model_payload(
+        district=BENCH_DISTRICT, season=BENCH_SEASON, raw_payload={}, mode="auto"
+    )
+    row = engine._build_row(model_payload)
+    features = pd.DataFrame([row]).drop(columns=["Primary_Crop"], errors="ignore")
+    numeric_part = engine._transform_numeric(features)
+    categorical_part = engine._transform_categorical(features)
+    combined = pd.concat([numeric_part, categorical_part], axis=1).reindex(
+        columns=engine.feature_cols, fill_value=0
+    )
+    matrix = combined.values
+    top_crop = engine.predict(model_payload)[0]["crop"]
+
+    if wanted("district_service_init"):
+        results["district_service_init"] = measure(
+            lambda: agro_app.DistrictDataService(agro_app.DATASET), repeat=max(1, repeat // 20), warmup=1
+        )
+    if wanted("build_model_payload"):
+        results["build_model_payload"] = measure(
+            lambda: district_service.build_model_payload(BENCH_DISTRICT, BENCH_SEASON, {}, "auto"), repeat
+        )
+    if wanted("build_row"):
+        results["build_row"] = measure(lambda: engine._build_row(model_payload), repeat)
+    if wanted("transform_numeric"):
+        results["transform_numeric"] = measure(lambda: engine._transform_numeric(features), repeat)
+    if wanted("transform_categorical"):
+        results["transform_categorical"] = measure(lambda: engine._transform_categorical(features), repeat)
+    if wanted("model_inference"):
+        results["model_inference"] = measure(lambda: engine.model.predict(matrix, verbose=0), repeat)
+    if wanted("engine_predict"):
+        results["engine_predict"] = measure(lambda: engine.predict(model_payload), repeat)
+    if wanted("fetch_guidance"):
+        results["fetch_guidance"] = measure(
+            lambda: district_service.fetch_guidance(BENCH_DISTRICT, top_crop), repeat
+        )
+    if wanted("predict_route"):
+        results["predict_route"] = bench_predict_route(agro_app, repeat)
+    return results
+
+
+def bench_predict_route(agro_app: Any, repeat: int) -> Dict[str, float]:
+    """Full ``POST /predict`` through the Flask test client with weather stubbed out."""
+
+    class StubWeatherService(agro_app.WeatherService):
+        def get_weather(self, district: str) -> Optional[Dict[str, Any]]:
+            return STUB_WEATHER
+
+    original_weather = agro_app.weather_service
+    agro_app.weather_service = StubWeatherService(agro_app.DISTRICT_COORDINATES)
+    try:
+        with agro_app.app.app_context():
+            agro_app.db.create_all()
+            user = agro_app.User.query.filter_by(email="bench@example.com").first()
+            if user is None:
+                user = agro_app.User(email="bench@example.com", username="bench")
+                user.set_password("bench")
+                agro_app.db.session.add(user)
+                agro_app.db.session.commit()
+            user_id = user.id
+
+        client = agro_app.app.test_client()
+        with client.session_transaction() as session:
+            session["_user_id"] = str(user_id)
+            session["_fresh"] = True
+
+        payload = {"mode": "auto", "district": BENCH_DISTRICT, "season": BENCH_SEASON}
+
+        def call() -> None:
+            response = client.post("/predict", json=payload)
+            if response.status_code != 200:
+                raise RuntimeError(f"/predict returned {response.status_code}: {response.get_data(as_text=True)}")
+
+        return measure(call, repeat)
+    finally:
+        agro_app.weather_service = original_weather
+
+
+def bench_batching(
+    concurrency: int, seconds: float, batch_sizes: List[int], waits_ms: List[float]
+) -> List[Dict[str, Any]]:
+    """Throughput vs. latency of concurrent single-row inference under each batcher setting."""
+    import numpy as np
+
+    import app as agro_app
+    import metrics
+    from batching import MicroBatcher
+
+    engine = agro_app.recommendation_engine
+    engine._ensure_loaded()
+    model = engine.model
+    row = np.zeros(len(engine.feature_cols), dtype=np.float32)
+
+    settings = [(1, 0.0)] + [(size, wait) for size in batch_sizes if size > 1 for wait in waits_ms]
+    results: List[Dict[str, Any]] = []
+    for max_batch, wait_ms in settings:
+        batcher = MicroBatcher(max_batch_size=max_batch, max_wait_ms=wait_ms)
+        batcher.predict_one(model, row)
+        batches_before = metrics.registry.get_counter("agro_inference_batches_total")
+        rows_before = metrics.registry.get_counter("agro_inference_batched_rows_total")
+        latencies: List[List[float]] = [[] for _ in range(concurrency)]
+        deadline = time.perf_counter() + seconds
+
+        def worker(index: int) -> None:
+            samples = latencies[index]
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                batcher.predict_one(model, row)
+                samples.append((time.perf_counter() - start) * 1000)
+
+        threads = [threading.Thread(target=worker, args=(index,)) for index in range(concurrency)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        samples = sorted(sample for per_thread in latencies for sample in per_thread)
+        batches = metrics.registry.get_counter("agro_inference_batches_total") - batches_before
+        rows = metrics.registry.get_counter("agro_inference_batched_rows_total") - rows_before
+        results.append({
+            "max_batch": max_batch,
+            "max_wait_ms": wait_ms,
+            "concurrency": concurrency,
+            "rows_per_second": round(len(samples) / elapsed, 1),
+            "p50_ms": round(samples[len(samples) // 2], 4),
+            "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 4),
+            "mean_batch": round(rows / batches, 2) if batches else 1.0,
+        })
+    return results
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Returns a message for every stage whose p50 regressed beyond ``tolerance``."""
+    regressions: List[str] = []
+    baseline_stages = baseline.get("stages", baseline)
+    for stage, stats in results.items():
+        previous = baseline_stages.get(stage)
+        if not previous:
+            continue
+        before, after = previous["p50_ms"], stats["p50_ms"]
+        change = (after - before) / before if before else 0.0
+        marker = "REGRESSION" if change > tolerance else "ok"
+        line = f"{stage:<24} {before:>10.3f} ms -> {after:>10.3f} ms  ({change:+.1%})  {marker}"
+        print(line)
+        if change > tolerance:
+            regressions.append(line)
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the AgroIntelligence prediction pipeline.")
+    parser.add_argument("--repeat", type=int, default=200, help="timed runs per stage")
+    parser.add_argument("--stage", action="append", dest="stages", help="only run the named stage(s)")
+    parser.add_argument("--output", type=Path, help="write results as JSON to this path")
+    parser.add_argument("--compare", type=Path, help="baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p50 slowdown before flagging")
+    parser.add_argument("--batching", action="store_true", help="also sweep micro-batcher settings")
+    parser.add_argument("--concurrency", type=int, default=16, help="threads for the batching sweep")
+    parser.add_argument("--batching-seconds", type=float, default=3.0, help="duration of each batching run")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[8, 32])
+    parser.add_argument("--batch-waits", type=float, nargs="+", default=[1.0, 2.0, 5.0], help="max wait in ms")
+    parser.add_argument("--with-cache", action="store_true",
+                        help="keep the recommendation/weather caches on, so repeated payloads time cache hits")
+    args = parser.parse_args()
+
+    # Every stage repeats one payload; with the caches on, engine_predict and predict_route would time hits.
+    if not args.with_cache:
+        os.environ["CACHE_BACKEND"] = "none"
+    results = run_benchmarks(args.repeat, args.stages)
+    report = {
+        "created_at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "repeat": args.repeat,
+        "cache": args.with_cache,
+        "stages": results,
+    }
+
+    for stage, stats in results.items():
+        print(f"{stage:<24} p50={stats['p50_ms']:>10.3f} ms  p95={stats['p95_ms']:>10.3f} ms")
+
+    if args.batching:
+        report["batching"] = bench_batching(
+            args.concurrency, args.batching_seconds, args.batch_sizes, args.batch_waits
+        )
+        print(f"\nmicro-batching, {args.concurrency} concurrent callers:")
+        for row in report["batching"]:
+            print(
+                f"max_batch={row['max_batch']:<4} wait={row['max_wait_ms']:>4g} ms  "
+                f"{row['rows_per_second']:>10.1f} rows/s  p50={row['p50_ms']:>8.3f} ms  "
+                f"p95={row['p95_ms']:>8.3f} ms  mean batch={row['mean_batch']:g}"
+            )
+
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+        print(f"Results written to {args.output}")
+
+    if args.compare:
+        baseline = json.loads(args.compare.read_text())
+        if baseline.get("cache", False) != args.with_cache:
+            print("Warning: the baseline and this run differ in --with-cache; cached stages are not comparable.")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} stage(s) regressed beyond {args.tolerance:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+# build_assets.py
+"""Content-hashes and precompresses everything under static/ for long-lived caching.
+
+Each file is copied to static/dist/<dir>/<stem>.<hash><ext>, next to .gz (and
+.br when the ``brotli`` package is installed) variants that are kept only when
+they save at least ``--min-saving`` of the size; PNGs, already compressed,
+mostly get none. static/dist/manifest.json maps the original path to the
+hashed one for ``asset_url()`` in templates. Older hashed files are kept so
+pages cached before a deploy still load; ``--prune`` removes them.
+
+Usage:
+    python build_assets.py
+    python build_assets.py --static static --min-saving 0.05 --prune
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+DIST_DIR = 'dist'
+MANIFEST = 'manifest.json'
+HASH_LENGTH = 10
+
+
+def hashed_name(relative: Path, data: bytes) -> Path:
+    digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+    return relative.with_name(f'{relative.stem}.{digest}{relative.suffix}')
+
+
+def write_atomic(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + '.tmp')
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def variants(data: bytes):
+    yield '.gz', gzip.compress(data, compresslevel=9, mtime=0)
+    if brotli is not None:
+        yield '.br', brotli.compress(data, quality=11)
+
+
+def build(static_dir: Path, min_saving: float, prune: bool) -> dict:
+    dist = static_dir / DIST_DIR
+    manifest = {}
+    written = set()
+    totals = {'files': 0, 'bytes': 0, 'gz': 0, 'br': 0}
+    for source in sorted(static_dir.rglob('*')):
+        if not source.is_file() or dist in source.parents:
+            continue
+        relative = source.relative_to(static_dir)
+        data = source.read_bytes()
+        target = dist / hashed_name(relative, data)
+        if not target.exists():
+            write_atomic(target, data)
+        written.add(target)
+        totals['files'] += 1
+        totals['bytes'] += len(data)
+        kept = []
+        for suffix, compressed in variants(data):
+            variant = target.with_name(target.name + suffix)
+            if len(compressed) <= len(data) * (1 - min_saving):
+                if not variant.exists():
+                    write_atomic(variant, compressed)
+                written.add(variant)
+                totals[suffix[1:]] += len(compressed)
+                kept.append(f'{suffix[1:]} {len(compressed) / len(data):.0%}')
+            else:
+                variant.unlink(missing_ok=True)
+        manifest[relative.as_posix()] = target.relative_to(dist).as_posix()
+        logging.info('%s -> %s (%d bytes%s)', relative, target.name, len(data),
+                     ''.join(f', {item}' for item in kept))
+
+    # Written last: the app only links to files that already exist.
+    write_atomic(dist / MANIFEST, json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+    if prune:
+        for path in dist.rglob('*'):
+            if path.is_file() and path.name != MANIFEST and path not in written:
+                path.unlink()
+                logging.info('Pruned %s', path.relative_to(dist))
+    return totals
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Hash and precompress static assets.')
+    parser.add_argument('--static', type=Path, default=Path(__file__).resolve().parent / 'static',
+                        help='static folder to build (output goes to <static>/dist)')
+    parser.add_argument('--min-saving', type=float, default=0.05,
+                        help='drop a compressed variant that saves less than this fraction')
+    parser.add_argument('--prune', action='store_true', help='delete hashed files not in the new manifest')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if brotli is None:
+        logging.warning('brotli is not installed; writing gzip variants only')
+    totals = build(args.static, args.min_saving, args.prune)
+    logging.info('Built %d assets (%d bytes): gzip variants %d bytes, brotli variants %d bytes',
+                 totals['files'], totals['bytes'], totals['gz'], totals['br'])
+
+
+if __name__ == '__main__':
+    main()
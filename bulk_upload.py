@@ -0,0 +1,139 @@
+# Streaming bulk CSV recommendations
+# This file will be imported by app.py
+
+from __future__ import annotations
+
+import csv
+import io
+import re
+from typing import IO, Any, Callable, Dict, Iterator, List, Optional
+
+import pandas as pd
+
+# Upload columns, named like the dashboard's manual-mode fields.
+INPUT_COLUMNS = [
+    "plot_id",
+    "district",
+    "mandal",
+    "season",
+    "soil_type",
+    "water_source",
+    "soil_ph",
+    "organic_carbon",
+    "soil_n",
+    "soil_p",
+    "soil_k",
+]
+
+OUTPUT_COLUMNS = [
+    "plot_id",
+    "district",
+    "mandal",
+    "season",
+    "soil_type",
+    "crop_1",
+    "score_1",
+    "crop_2",
+    "score_2",
+    "crop_3",
+    "score_3",
+    "model_tier",
+    "model_version",
+    "error",
+]
+
+
+class BulkUploadError(ValueError):
+    """The upload as a whole is unusable (no rows, or no district column)."""
+
+
+def normalize_header(name: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", str(name).strip().lower()).strip("_")
+
+
+def read_chunks(stream: IO[bytes], chunk_rows: int) -> Iterator[pd.DataFrame]:
+    """Parses the upload lazily; validates the header before the first chunk is yielded."""
+    try:
+        reader = pd.read_csv(stream, dtype=str, keep_default_na=False, chunksize=chunk_rows)
+        first = next(reader)
+    except (pd.errors.EmptyDataError, StopIteration):
+        raise BulkUploadError("The uploaded CSV has no rows.")
+    except (pd.errors.ParserError, UnicodeDecodeError) as exc:
+        raise BulkUploadError(f"Could not parse the uploaded CSV: {exc}")
+
+    def normalized(chunk: pd.DataFrame) -> pd.DataFrame:
+        chunk.columns = [normalize_header(col) for col in chunk.columns]
+        return chunk
+
+    first = normalized(first)
+    if "district" not in first.columns:
+        raise BulkUploadError("The uploaded CSV needs a 'district' column.")
+
+    def chunks() -> Iterator[pd.DataFrame]:
+        yield first
+        for chunk in reader:
+            yield normalized(chunk)
+
+    return chunks()
+
+
+def _to_csv(rows: List[Dict[str, Any]], header: bool = False) -> str:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=OUTPUT_COLUMNS, extrasaction="ignore")
+    if header:
+        writer.writeheader()
+    writer.writerows(rows)
+    return buffer.getvalue()
+
+
+def stream_results(
+    chunks: Iterator[pd.DataFrame],
+    build_payload: Callable[[str, Optional[str], Dict[str, Any]], Dict[str, Any]],
+    recommend_batch: Callable[[List[Dict[str, Any]]], Dict[str, Any]],
+    on_error: Callable[[Exception], None],
+) -> Iterator[str]:
+    """Yields the results CSV one chunk at a time; bad rows get an ``error`` instead of crops."""
+    yield _to_csv([], header=True)
+    while True:
+        try:
+            chunk = next(chunks)
+        except StopIteration:
+            return
+        except (pd.errors.ParserError, UnicodeDecodeError) as exc:
+            # Headers are already sent, so the failure is reported in-band and the stream ends.
+            on_error(exc)
+            yield _to_csv([{"error": f"could not parse the rest of the upload: {exc}"}])
+            return
+
+        columns = [col for col in INPUT_COLUMNS if col in chunk.columns]
+        rows: List[Dict[str, Any]] = []
+        payloads: List[Dict[str, Any]] = []
+        scored: List[Dict[str, Any]] = []
+        for record in chunk[columns].to_dict("records"):
+            row: Dict[str, Any] = {"plot_id": record.get("plot_id", ""), "district": record.get("district", "")}
+            rows.append(row)
+            if not row["district"]:
+                row["error"] = "missing district"
+                continue
+            try:
+                payload = build_payload(row["district"], record.get("season") or None, record)
+            except ValueError as exc:
+                row["error"] = str(exc)
+                continue
+            row.update(mandal=payload.get("Mandal"), season=payload.get("Season"), soil_type=payload.get("Soil_Type"))
+            payloads.append(payload)
+            scored.append(row)
+
+        try:
+            result = recommend_batch(payloads)
+        except Exception as exc:
+            on_error(exc)
+            for row in scored:
+                row["error"] = "prediction failed"
+        else:
+            for row, recommendations in zip(scored, result["recommendations"]):
+                row.update(model_tier=result["model_tier"], model_version=result["model_version"])
+                for rank, item in enumerate(recommendations, start=1):
+                    row[f"crop_{rank}"] = item["crop"]
+                    row[f"score_{rank}"] = item["score"]
+        yield _to_csv(rows)
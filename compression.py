@@ -0,0 +1,172 @@
+# Response compression and precompressed static assets
+# This file will be imported by app.py
+
+from __future__ import annotations
+
+import gzip
+import json
+import mimetypes
+import os
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from flask import Flask, Response, abort, request, send_file, url_for
+from werkzeug.security import safe_join
+
+import metrics
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = frozenset(
+    {
+        "application/json",
+        "application/x-ndjson",
+        "application/javascript",
+        "text/html",
+        "text/plain",
+        "text/css",
+        "text/csv",
+        "text/javascript",
+        "image/svg+xml",
+    }
+)
+
+# Extension of the precompressed variant written by build_assets.py, per content coding
+VARIANT_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+ASSET_MANIFEST = "manifest.json"
+ASSET_MAX_AGE = 365 * 24 * 3600
+
+
+def available_encodings() -> List[str]:
+    """Content codings this process can produce, preferred first."""
+    return ["br", "gzip"] if brotli is not None else ["gzip"]
+
+
+def negotiate(offered: List[str]) -> Optional[str]:
+    """The best of ``offered`` the client accepts (honouring ``q=0``), or None for identity."""
+    best = request.accept_encodings.best_match(offered)
+    return best if best in offered else None
+
+
+def encode(data: bytes, encoding: str, level: int) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=level)
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+class ResponseCompressor:
+    """Compresses dynamic text responses above ``min_bytes`` with brotli or gzip.
+
+    Streamed and file responses are left alone: bulk CSV and history export
+    stream chunk by chunk, and static assets have precompressed variants.
+    A strong ETag becomes weak on a compressed body, as the bytes differ;
+    ``If-None-Match`` uses weak comparison, so 304s keep working.
+    """
+
+    def __init__(
+        self, enabled: bool = True, min_bytes: int = 1024, gzip_level: int = 6, brotli_quality: int = 5
+    ) -> None:
+        self.enabled = enabled
+        self.min_bytes = min_bytes
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    @classmethod
+    def from_env(cls) -> "ResponseCompressor":
+        return cls(
+            enabled=os.environ.get("COMPRESS_RESPONSES", "1").lower() not in {"0", "false", "no"},
+            min_bytes=int(os.environ.get("COMPRESS_MIN_BYTES", "1024")),
+            gzip_level=int(os.environ.get("COMPRESS_GZIP_LEVEL", "6")),
+            brotli_quality=int(os.environ.get("COMPRESS_BROTLI_QUALITY", "5")),
+        )
+
+    def init_app(self, app: Flask) -> None:
+        # Registered after metrics, so it runs first and its time counts toward request latency.
+        if self.enabled:
+            app.after_request(self.compress)
+
+    def compress(self, response: Response) -> Response:
+        if response.mimetype not in COMPRESSIBLE_MIMETYPES:
+            return response
+        response.vary.add("Accept-Encoding")
+        if (
+            response.status_code < 200
+            or response.status_code in (204, 304)
+            or response.direct_passthrough
+            or response.is_streamed
+            or "Content-Encoding" in response.headers
+            or request.method == "HEAD"
+        ):
+            return response
+        data = response.get_data()
+        if len(data) < self.min_bytes:
+            return response
+        encoding = negotiate(available_encodings())
+        if encoding is None:
+            return response
+
+        level = self.brotli_quality if encoding == "br" else self.gzip_level
+        compressed = encode(data, encoding, level)
+        if len(compressed) >= len(data):
+            return response
+        response.set_data(compressed)
+        response.headers["Content-Encoding"] = encoding
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        metrics.registry.inc("agro_compressed_responses_total", encoding=encoding)
+        metrics.registry.inc("agro_compression_saved_bytes_total", len(data) - len(compressed))
+        return response
+
+
+class StaticAssets:
+    """Serves ``build_assets.py`` output: content-hashed files with .br/.gz siblings.
+
+    Templates call ``asset_url("js/bootstrap.js")``. If the manifest lists the
+    file, that resolves to ``/assets/js/bootstrap.<hash>.js``, which never
+    changes and is cached for a year. Otherwise it falls back to the plain
+    ``/static`` URL, so a checkout without a build still works.
+    """
+
+    def __init__(self, dist_dir: Path) -> None:
+        self.dist_dir = Path(dist_dir)
+        self.manifest: Dict[str, str] = {}
+
+    def load_manifest(self) -> None:
+        path = self.dist_dir / ASSET_MANIFEST
+        try:
+            self.manifest = json.loads(path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            self.manifest = {}
+
+    def init_app(self, app: Flask) -> None:
+        self.load_manifest()
+        app.add_url_rule("/assets/<path:filename>", "assets", self.serve)
+        app.add_template_global(self.asset_url, "asset_url")
+
+    def asset_url(self, filename: str) -> str:
+        hashed = self.manifest.get(filename)
+        if hashed is None:
+            return url_for("static", filename=filename)
+        return url_for("assets", filename=hashed)
+
+    def serve(self, filename: str) -> Response:
+        path = safe_join(str(self.dist_dir), filename)
+        if path is None or filename == ASSET_MANIFEST or not os.path.isfile(path):
+            abort(404)
+        offered = [enc for enc, suffix in VARIANT_SUFFIXES.items() if os.path.isfile(path + suffix)]
+        encoding = negotiate(offered) if offered else None
+        mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        variant = path + VARIANT_SUFFIXES[encoding] if encoding else path
+
+        response = send_file(variant, mimetype=mimetype, conditional=True, max_age=ASSET_MAX_AGE)
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+        if offered:
+            response.vary.add("Accept-Encoding")
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
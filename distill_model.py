@@ -0,0 +1,177 @@
+# distill_model.py
+"""Distils the teacher MLP into a small student for ultra-low-latency serving.
+
+The student learns the teacher's (temperature-softened) probabilities on the
+training rows. The temperature is then taken back out of it: the MLP's output
+logits are scaled by T and the tree's leaves sharpened (p**T), so its scores
+are on the teacher's scale at T=1. It is written in the mapped artifact
+format, so the app can serve it without TensorFlow:
+
+    python distill_model.py --student mlp --hidden-units 32 --out croprecommender_student.weights
+    python distill_model.py --student tree --max-depth 14
+"""
+import argparse
+import json
+import logging
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from evaluation import evaluate, holdout_split, load_artifact, top_k_hits
+from model_artifacts import (export_keras_model, export_tree_model, load_mapped_model, single_row_latency_ms,
+                             write_manifest)
+
+
+def soften(probabilities, temperature):
+    """Re-tempers softmax outputs: softmax(log(p) / T)."""
+    if temperature == 1:
+        return probabilities
+    logits = np.log(np.clip(probabilities, 1e-9, 1.0)) / temperature
+    logits -= logits.max(axis=1, keepdims=True)
+    exp = np.exp(logits)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+def fold_temperature(model, temperature):
+    """Scales the softmax layer's logits by T, so the student serves at T=1.
+
+    Trained on softmax(z) ~ softmax(teacher_logits / T), its logits are the
+    teacher's divided by T; multiplying the last kernel and bias undoes that.
+    """
+    if temperature == 1:
+        return model
+    output = model.layers[-1]
+    kernel, bias = output.get_weights()
+    output.set_weights([kernel * temperature, bias * temperature])
+    return model
+
+
+def train_mlp_student(X, soft_targets, hidden_units, epochs, batch_size, seed=42):
+    import tensorflow as tf
+    from train_model import build_model
+
+    tf.random.set_seed(seed)
+    model = build_model(X.shape[1], soft_targets.shape[1], hidden_units=hidden_units, dropout=0.0)
+    model.compile(optimizer='adam', loss='categorical_crossentropy')
+    dataset = (
+        tf.data.Dataset.from_tensor_slices((X, soft_targets.astype(np.float32)))
+        .cache()
+        .shuffle(len(X), seed=seed)
+        .batch(batch_size)
+        .prefetch(tf.data.AUTOTUNE)
+    )
+    model.fit(dataset, epochs=epochs, verbose=2)
+    return model
+
+
+def train_tree_student(X, soft_targets, max_depth, min_samples_leaf, seed=42):
+    from sklearn.tree import DecisionTreeRegressor
+
+    tree = DecisionTreeRegressor(max_depth=max_depth, min_samples_leaf=min_samples_leaf, random_state=seed)
+    tree.fit(X, soft_targets)
+    return tree
+
+
+def agreement(teacher_probs, student_probs, k=3):
+    """Share of rows where the student's top-k set matches the teacher's, plus top-1 agreement."""
+    k = min(k, teacher_probs.shape[1])
+    teacher_top = np.sort(np.argpartition(teacher_probs, -k, axis=1)[:, -k:], axis=1)
+    student_top = np.sort(np.argpartition(student_probs, -k, axis=1)[:, -k:], axis=1)
+    return {
+        'top1_agreement': float((teacher_probs.argmax(axis=1) == student_probs.argmax(axis=1)).mean()),
+        f'top{k}_set_agreement': float((teacher_top == student_top).all(axis=1).mean()),
+        f'teacher_top1_in_student_top{k}': float(top_k_hits(student_probs, teacher_probs.argmax(axis=1), k).mean()),
+    }
+
+
+def calibration(probabilities, labels, bins=10):
+    """Mean top-1 score, top-1 accuracy and expected calibration error (ECE) over ``bins`` score bins."""
+    confidence = probabilities.max(axis=1)
+    correct = probabilities.argmax(axis=1) == labels
+    bin_index = np.minimum((confidence * bins).astype(int), bins - 1)
+    ece = 0.0
+    for index in range(bins):
+        in_bin = bin_index == index
+        if in_bin.any():
+            ece += in_bin.mean() * abs(confidence[in_bin].mean() - correct[in_bin].mean())
+    return {
+        'mean_top1_score': float(confidence.mean()),
+        'top1_accuracy': float(correct.mean()),
+        'ece': float(ece),
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Distil the crop MLP into a lightweight student model.")
+    parser.add_argument('--teacher', default='croprecommender_mlp', help="teacher .h5/.npz prefix or mapped directory")
+    parser.add_argument('--data', default='apcrop_dataset_realistic.csv')
+    parser.add_argument('--student', choices=['mlp', 'tree'], default='mlp')
+    parser.add_argument('--out', default='croprecommender_student.weights')
+    parser.add_argument('--temperature', type=float, default=2.0)
+    parser.add_argument('--hidden-units', type=int, nargs='+', default=[32])
+    parser.add_argument('--epochs', type=int, default=30)
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--dtype', choices=['float32', 'float16', 'int8'], default='float16')
+    parser.add_argument('--max-depth', type=int, default=14)
+    parser.add_argument('--min-samples-leaf', type=int, default=5)
+    return parser.parse_args()
+
+
+def main():
+    from train_model import load_and_preprocess_data
+
+    args = parse_args()
+    teacher, classes, feature_cols = load_artifact(args.teacher)
+    X, y = load_and_preprocess_data(args.data)
+    known = y.isin(classes).to_numpy()
+    X = X[known].reindex(columns=feature_cols, fill_value=0).to_numpy(dtype=np.float32)
+    labels = pd.Categorical(y[known], categories=classes).codes
+    fit_idx, test_idx = holdout_split(labels)
+
+    logging.info(f"Scoring {len(fit_idx)} training rows with the teacher...")
+    teacher_fit = teacher.predict(X[fit_idx], batch_size=8192, verbose=0)
+    soft_targets = soften(teacher_fit, args.temperature)
+
+    started = time.perf_counter()
+    if args.student == 'mlp':
+        student_model = train_mlp_student(X[fit_idx], soft_targets, tuple(args.hidden_units),
+                                          args.epochs, args.batch_size)
+        fold_temperature(student_model, args.temperature)
+        manifest = export_keras_model(student_model, classes, feature_cols, args.out, args.dtype)
+    else:
+        tree = train_tree_student(X[fit_idx], soft_targets, args.max_depth, args.min_samples_leaf)
+        manifest = export_tree_model(tree, classes, feature_cols, args.out, temperature=args.temperature)
+    logging.info(f"Student trained in {time.perf_counter() - started:.1f}s")
+
+    student = load_mapped_model(args.out)
+    X_test = X[test_idx]
+    teacher_test = teacher.predict(X_test, batch_size=8192, verbose=0)
+    student_test = student.predict(X_test)
+    teacher_latency = single_row_latency_ms(teacher, X_test)
+    student_latency = single_row_latency_ms(student, X_test)
+    report = {
+        'student': args.student,
+        'temperature': args.temperature,
+        'rows': int(len(test_idx)),
+        **agreement(teacher_test, student_test),
+        # Same-scale scores: the mean top-1 gap should be near zero, not negative (flatter student).
+        'teacher_calibration': calibration(teacher_test, labels[test_idx]),
+        'student_calibration': calibration(student_test, labels[test_idx]),
+        'mean_top1_score_gap': float(student_test.max(axis=1).mean() - teacher_test.max(axis=1).mean()),
+        'teacher_accuracy': evaluate(teacher, X_test, labels[test_idx], classes)['accuracy'],
+        'student_accuracy': evaluate(student, X_test, labels[test_idx], classes)['accuracy'],
+        'teacher_single_row_latency_ms': teacher_latency,
+        'student_single_row_latency_ms': student_latency,
+        'speedup': teacher_latency / student_latency if student_latency else None,
+        'student_weight_bytes': int(student.nbytes),
+    }
+    manifest['distillation'] = report
+    write_manifest(Path(args.out), manifest)
+    logging.info(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
@@ -0,0 +1,199 @@
+# evaluation.py
+"""Vectorized evaluation of crop recommendation models.
+
+Used by train_model.py on its held-out test split, and as a CLI against any
+saved ``croprecommender_mlp``-style artifact:
+
+    python evaluation.py --model croprecommender_mlp --split test --output eval.json
+"""
+import argparse
+import json
+import logging
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import StratifiedShuffleSplit
+
+HOLDOUT_TEST_SIZE = 0.2
+HOLDOUT_SEED = 42
+
+
+def holdout_split(y, test_size=HOLDOUT_TEST_SIZE, seed=HOLDOUT_SEED):
+    """Stratified (fit_indices, test_indices); the defaults are what train_model.py holds out."""
+    splitter = StratifiedShuffleSplit(n_splits=1, test_size=test_size, random_state=seed)
+    return next(splitter.split(np.zeros(len(y)), y))
+
+
+def top_k_hits(probabilities, labels, k):
+    """Boolean hit vector: is the true label among the ``k`` highest scores of each row."""
+    k = min(k, probabilities.shape[1])
+    top_k = np.argpartition(probabilities, -k, axis=1)[:, -k:]
+    return (top_k == np.asarray(labels)[:, None]).any(axis=1)
+
+
+def top_k_accuracy(probabilities, labels, k):
+    return float(top_k_hits(probabilities, labels, k).mean()) if len(labels) else 0.0
+
+
+def confusion_matrix(labels, predictions, num_classes):
+    """Rows are true classes, columns predicted classes (single ``bincount``)."""
+    flat = np.asarray(labels, dtype=np.int64) * num_classes + np.asarray(predictions, dtype=np.int64)
+    return np.bincount(flat, minlength=num_classes * num_classes).reshape(num_classes, num_classes)
+
+
+class Evaluator:
+    """Accumulates a confusion matrix and top-k hits over any number of batches."""
+
+    def __init__(self, classes, ks=(1, 3)):
+        self.classes = [str(name) for name in classes]
+        self.ks = tuple(ks)
+        self.confusion = np.zeros((len(self.classes), len(self.classes)), dtype=np.int64)
+        self.top_k_hit_counts = {k: 0 for k in self.ks}
+        self.count = 0
+
+    def update(self, probabilities, labels):
+        labels = np.asarray(labels)
+        self.confusion += confusion_matrix(labels, probabilities.argmax(axis=1), len(self.classes))
+        for k in self.ks:
+            self.top_k_hit_counts[k] += int(top_k_hits(probabilities, labels, k).sum())
+        self.count += len(labels)
+
+    def result(self):
+        confusion = self.confusion
+        true_positive = np.diag(confusion).astype(np.float64)
+        support = confusion.sum(axis=1)
+        predicted = confusion.sum(axis=0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            precision = np.where(predicted > 0, true_positive / predicted, 0.0)
+            recall = np.where(support > 0, true_positive / support, 0.0)
+            f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+        present = (support > 0) | (predicted > 0)
+        return {
+            'rows': int(self.count),
+            'accuracy': float(true_positive.sum() / self.count) if self.count else 0.0,
+            'macro_f1': float(f1[present].mean()) if present.any() else 0.0,
+            'top_k_accuracy': {
+                str(k): (hits / self.count if self.count else 0.0) for k, hits in self.top_k_hit_counts.items()
+            },
+            'per_class': [
+                {'crop': name, 'precision': float(precision[i]), 'recall': float(recall[i]),
+                 'f1': float(f1[i]), 'support': int(support[i])}
+                for i, name in enumerate(self.classes)
+            ],
+            'confusion_matrix': confusion.tolist(),
+        }
+
+
+def evaluate(model, X, y, classes, ks=(1, 3), batch_size=65536):
+    """Scores ``X`` in fixed-size batches so memory stays flat for millions of rows."""
+    evaluator = Evaluator(classes, ks)
+    features = np.asarray(X, dtype=np.float32)
+    labels = np.asarray(y)
+    for start in range(0, len(labels), batch_size):
+        probabilities = model.predict(features[start:start + batch_size], batch_size=8192, verbose=0)
+        evaluator.update(probabilities, labels[start:start + batch_size])
+    return evaluator.result()
+
+
+def log_report(report):
+    top_k = ' | '.join(f"Top-{k} Accuracy: {value:.3f}" for k, value in report['top_k_accuracy'].items() if k != '1')
+    logging.info(f"Rows: {report['rows']} | Accuracy: {report['accuracy']:.3f} | "
+                 f"Macro-F1: {report['macro_f1']:.3f} | {top_k}")
+    for row in report['per_class']:
+        logging.info(f"  {row['crop']:<20} precision={row['precision']:.3f} recall={row['recall']:.3f} "
+                     f"f1={row['f1']:.3f} support={row['support']}")
+
+
+def load_artifact(prefix):
+    """Loads a Keras ``prefix.h5``/``prefix.npz`` pair, or a mapped artifact directory."""
+    if (Path(prefix) / 'manifest.json').exists():
+        from model_artifacts import load_mapped_model
+
+        model = load_mapped_model(prefix)
+        return model, model.classes, model.feature_cols
+
+    from tensorflow.keras.models import load_model
+
+    model = load_model(f'{prefix}.h5')
+    meta = np.load(f'{prefix}.npz', allow_pickle=True)
+    return model, [str(name) for name in meta['classes']], [str(col) for col in meta['feature_cols']]
+
+
+def holdout_mask(data_path, classes, test_size=HOLDOUT_TEST_SIZE, seed=HOLDOUT_SEED, chunksize=50_000):
+    """Boolean mask over the file's rows selecting the held-out split.
+
+    Only the label column is read, so the mask costs one byte per row and the
+    split is the same stratified one ``holdout_split`` draws in memory.
+    """
+    labels = np.concatenate([
+        pd.Categorical(chunk['Primary_Crop'], categories=classes).codes
+        for chunk in pd.read_csv(data_path, usecols=['Primary_Crop'], chunksize=chunksize)
+    ])
+    known = np.flatnonzero(labels >= 0)
+    _, test_idx = holdout_split(labels[known], test_size, seed)
+    mask = np.zeros(len(labels), dtype=bool)
+    mask[known[test_idx]] = True
+    return mask
+
+
+def evaluate_file(model, data_path, classes, feature_cols, ks=(1, 3), chunksize=50_000, batch_size=65536,
+                  mask=None):
+    """Scores a CSV chunk by chunk with the streaming encoder from train_model.py.
+
+    Numeric gaps are filled with column means from ``scan_dataset`` instead of
+    a KNN imputation over the whole file, so memory stays bounded by
+    ``chunksize``. Rows whose crop the model does not know are skipped.
+    """
+    from train_model import encode_chunk, scan_dataset
+
+    # The model's classes replace the scanned ones, so labels come out as the model's indices.
+    schema = {**scan_dataset(data_path, chunksize, min_samples=0), 'classes': np.array(classes)}
+    columns = pd.Index(schema['feature_cols']).get_indexer(feature_cols)
+    present = columns >= 0
+    evaluator = Evaluator(classes, ks)
+    row_offset = 0
+    for chunk in pd.read_csv(data_path, chunksize=chunksize):
+        if mask is not None:
+            selected = mask[row_offset:row_offset + len(chunk)]
+            row_offset += len(chunk)
+            chunk = chunk[selected]
+        X, labels = encode_chunk(chunk, schema)
+        features = np.zeros((len(labels), len(feature_cols)), dtype=np.float32)
+        features[:, present] = X[:, columns[present]]
+        for start in range(0, len(labels), batch_size):
+            probabilities = model.predict(features[start:start + batch_size], batch_size=8192, verbose=0)
+            evaluator.update(probabilities, labels[start:start + batch_size])
+    return evaluator.result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate a saved crop recommendation model.")
+    parser.add_argument('--model', default='croprecommender_mlp',
+                        help="artifact prefix (.h5 + .npz) or a mapped artifact directory")
+    parser.add_argument('--data', default='apcrop_dataset_realistic.csv')
+    parser.add_argument('--split', choices=['test', 'all'], default='test',
+                        help="'test' reproduces train_model.py's held-out split; 'all' scores every row")
+    parser.add_argument('--test-size', type=float, default=HOLDOUT_TEST_SIZE)
+    parser.add_argument('--seed', type=int, default=HOLDOUT_SEED)
+    parser.add_argument('--top-k', type=int, nargs='+', default=[1, 3])
+    parser.add_argument('--chunksize', type=int, default=50_000, help="CSV rows read per chunk")
+    parser.add_argument('--batch-size', type=int, default=65536)
+    parser.add_argument('--output', help="write the full report (incl. confusion matrix) as JSON")
+    args = parser.parse_args()
+
+    model, classes, feature_cols = load_artifact(args.model)
+    mask = None
+    if args.split == 'test':
+        mask = holdout_mask(args.data, classes, args.test_size, args.seed, args.chunksize)
+    report = evaluate_file(model, args.data, classes, feature_cols, ks=args.top_k, chunksize=args.chunksize,
+                           batch_size=args.batch_size, mask=mask)
+    log_report(report)
+    if args.output:
+        with open(args.output, 'w') as handle:
+            json.dump(report, handle, indent=2)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
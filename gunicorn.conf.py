@@ -0,0 +1,39 @@
+# gunicorn.conf.py
+"""Gunicorn settings, read automatically by ``gunicorn app:app`` from this directory.
+
+WEB_WORKER_CLASS picks the serving mode:
+    sync     one request per worker process (gunicorn's default)
+    gthread  WEB_THREADS requests per worker on OS threads
+    gevent   WEB_WORKER_CONNECTIONS requests per worker on greenlets; outbound
+             weather calls yield instead of blocking, and inference runs on
+             INFERENCE_THREADS native threads (see serving.InferencePool)
+
+Workers share one cache through CACHE_BACKEND=sqlite, the default (see
+shared_cache.cache_from_env). CACHE_BACKEND=memory gives each worker its
+own cold copy, so keep it to WEB_CONCURRENCY=1.
+
+Usage:
+    gunicorn app:app
+    WEB_WORKER_CLASS=gevent WEB_CONCURRENCY=2 gunicorn app:app
+    WEB_WORKER_CLASS=gthread WEB_THREADS=16 gunicorn app:app
+"""
+import os
+
+worker_class = os.environ.get("WEB_WORKER_CLASS", "sync")
+workers = int(os.environ.get("WEB_CONCURRENCY", "1"))
+threads = int(os.environ.get("WEB_THREADS", "8" if worker_class == "gthread" else "1"))
+worker_connections = int(os.environ.get("WEB_WORKER_CONNECTIONS", "200"))
+timeout = int(os.environ.get("WEB_TIMEOUT", "30"))
+keepalive = int(os.environ.get("WEB_KEEPALIVE", "5" if worker_class != "sync" else "2"))
+
+
+def post_worker_init(worker):
+    # TensorFlow's first import shells out (platform.processor), and gevent can only
+    # reap child processes from the hub's own thread, so under gevent the model is
+    # loaded here, before any request can send inference to the native thread pool.
+    if worker_class != "gevent":
+        return
+    import app
+
+    if app.model_server_client is None:
+        app.recommendation_engine._ensure_loaded()
@@ -0,0 +1,75 @@
+# Pre-serialized JSON responses with strong ETags
+# This file will be imported by app.py
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Dict, Hashable, Optional
+
+from flask import Response, request
+
+import metrics
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+
+class PrecomputedJSON:
+    """One response body, serialized once like ``jsonify`` would, with its ETag."""
+
+    __slots__ = ("body", "etag")
+
+    def __init__(self, data: Any) -> None:
+        self.body = (json.dumps(data, sort_keys=True, separators=(",", ":")) + "\n").encode("utf-8")
+        self.etag = hashlib.sha256(self.body).hexdigest()[:20]
+
+
+class JsonResponseCache:
+    """Serves read-only JSON endpoints from bytes computed up front.
+
+    ``load`` replaces the whole table at once (at startup, or after the
+    dataset or schemes change), so readers never see a half-built mix. Every
+    response carries a strong ETag and ``Cache-Control: public, max-age``;
+    a matching ``If-None-Match`` is answered 304 with no body.
+    """
+
+    def __init__(self, max_age: int = 300) -> None:
+        self.max_age = max_age
+        self._entries: Dict[Hashable, PrecomputedJSON] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "JsonResponseCache":
+        return cls(max_age=int(os.environ.get("JSON_CACHE_MAX_AGE", "300")))
+
+    def load(self, entries: Dict[Hashable, Any]) -> None:
+        table = {key: PrecomputedJSON(data) for key, data in entries.items()}
+        with self._lock:
+            self._entries = table
+
+    def get(self, key: Hashable) -> Optional[PrecomputedJSON]:
+        return self._entries.get(key)
+
+    def respond(self, key: Hashable, immutable: bool = False) -> Optional[Response]:
+        """The cached response for ``key`` (304 when the client's copy is current), or None.
+
+        ``immutable`` is for URLs that embed the ETag: the browser may keep
+        them for a year without revalidating.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        response = Response(entry.body, mimetype="application/json")
+        response.set_etag(entry.etag)
+        response.cache_control.public = True
+        if immutable:
+            response.cache_control.max_age = IMMUTABLE_MAX_AGE
+            response.cache_control.immutable = True
+        else:
+            response.cache_control.max_age = self.max_age
+        response.make_conditional(request)
+        outcome = "not_modified" if response.status_code == 304 else "full"
+        metrics.registry.inc("agro_json_cache_responses_total", outcome=outcome)
+        return response
@@ -0,0 +1,373 @@
+# loadtest.py
+"""Replays dashboard flows against a running app and reports per-endpoint latency.
+
+A local Open-Meteo stand-in with configurable latency and error rate keeps
+the weather dependency realistic without hitting the real API.
+
+Usage:
+    # fake weather only (point the app at it with OPEN_METEO_URL)
+    python loadtest.py fake-weather --port 8099 --latency-ms 250 --error-rate 0.02
+
+    # fake weather + spawn the app + run the load
+    python loadtest.py run --spawn "gunicorn -w 4 -b 127.0.0.1:8000 app:app" \\
+        --target http://127.0.0.1:8000 --users 40 --duration 60 --output load.json
+
+    # how many concurrent users one instance holds while they wait on the weather API
+    WEB_WORKER_CLASS=gevent python loadtest.py run --flow weather --users 200 --latency-ms 1000 \\
+        --spawn "gunicorn -b 127.0.0.1:8000 app:app"
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import shlex
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+SEASONS = ["Kharif", "Rabi", "Zaid"]
+
+
+class FakeOpenMeteoServer:
+    """Serves ``/v1/forecast`` with Open-Meteo shaped payloads."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency_ms: float = 200.0,
+                 jitter_ms: float = 50.0, error_rate: float = 0.0) -> None:
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.requests_served = 0
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1/forecast"
+
+    def start(self) -> "FakeOpenMeteoServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _handler_class(self) -> type:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                with server._lock:
+                    server.requests_served += 1
+                delay = max(0.0, random.gauss(server.latency_ms, server.jitter_ms)) / 1000
+                time.sleep(delay)
+                if random.random() < server.error_rate:
+                    self._send(503, {"error": True, "reason": "simulated outage"})
+                    return
+                query = parse_qs(urlparse(self.path).query)
+                self._send(200, forecast_payload(
+                    float(query.get("latitude", ["16.5"])[0]),
+                    float(query.get("longitude", ["80.6"])[0]),
+                ))
+
+            def _send(self, status: int, body: Dict[str, Any]) -> None:
+                encoded = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(encoded)))
+                self.end_headers()
+                self.wfile.write(encoded)
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+        return Handler
+
+
+def forecast_payload(latitude: float, longitude: float, hours: int = 168) -> Dict[str, Any]:
+    start = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+    times = [(start + timedelta(hours=offset)).strftime("%Y-%m-%dT%H:%M") for offset in range(hours)]
+    return {
+        "latitude": latitude,
+        "longitude": longitude,
+        "current_weather": {
+            "temperature": round(random.uniform(24, 38), 1),
+            "windspeed": round(random.uniform(2, 20), 1),
+            "weathercode": random.choice([0, 1, 2, 3, 61]),
+            "time": times[0],
+        },
+        "hourly": {
+            "time": times,
+            "temperature_2m": [round(random.uniform(22, 38), 1) for _ in times],
+            "relativehumidity_2m": [random.randint(40, 95) for _ in times],
+            "precipitation": [round(max(0.0, random.gauss(0.2, 0.8)), 1) for _ in times],
+        },
+    }
+
+
+class Recorder:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    def record(self, endpoint: str, seconds: float, ok: bool) -> None:
+        with self._lock:
+            self.latencies[endpoint].append(seconds * 1000)
+            if not ok:
+                self.errors[endpoint] += 1
+
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        endpoints: Dict[str, Any] = {}
+        with self._lock:
+            for endpoint, samples in sorted(self.latencies.items()):
+                ordered = sorted(samples)
+                endpoints[endpoint] = {
+                    "requests": len(ordered),
+                    "errors": self.errors.get(endpoint, 0),
+                    "throughput_rps": round(len(ordered) / elapsed, 2),
+                    "mean_ms": round(statistics.fmean(ordered), 2),
+                    "p50_ms": round(percentile(ordered, 50), 2),
+                    "p95_ms": round(percentile(ordered, 95), 2),
+                    "p99_ms": round(percentile(ordered, 99), 2),
+                }
+        total = sum(item["requests"] for item in endpoints.values())
+        return {
+            "duration_s": round(elapsed, 2),
+            "total_requests": total,
+            "total_errors": sum(item["errors"] for item in endpoints.values()),
+            "throughput_rps": round(total / elapsed, 2) if elapsed else 0.0,
+            "endpoints": endpoints,
+        }
+
+
+def percentile(ordered: List[float], pct: float) -> float:
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class VirtualFarmer:
+    """One simulated dashboard user with its own session cookie."""
+
+    def __init__(self, target: str, recorder: Recorder, think_time: float, flow: str = "dashboard") -> None:
+        self.target = target.rstrip("/")
+        self.recorder = recorder
+        self.think_time = think_time
+        self.flow = flow
+        self.session = requests.Session()
+        self.districts: List[str] = []
+
+    def _call(self, endpoint: str, method: str, path: str, **kwargs: Any) -> Optional[requests.Response]:
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, self.target + path, timeout=30, **kwargs)
+        except requests.RequestException:
+            self.recorder.record(endpoint, time.perf_counter() - started, ok=False)
+            return None
+        self.recorder.record(endpoint, time.perf_counter() - started, ok=response.status_code < 400)
+        return response
+
+    def sign_in(self) -> None:
+        token = uuid.uuid4().hex[:12]
+        credentials = {"email": f"load-{token}@example.com", "password": token}
+        self.session.post(
+            self.target + "/signup",
+            data={**credentials, "username": f"load-{token}", "full_name": "Load Test"},
+            timeout=30,
+        )
+        self.session.post(self.target + "/login", data=credentials, timeout=30)
+
+    def run_flow(self) -> None:
+        if not self.districts:
+            response = self._call("GET /get_district_names", "GET", "/get_district_names")
+            if response is None or not response.ok:
+                return
+            self.districts = response.json()
+        district = random.choice(self.districts)
+        season = random.choice(SEASONS)
+        if self.flow == "weather":
+            # I/O-bound only: measures how many waiting users a worker can hold at once.
+            self._call("GET /api/weather/<district>", "GET", f"/api/weather/{district}")
+            self._pause()
+            return
+
+        response = self._call("GET /get_district_data/<district>", "GET", f"/get_district_data/{district}")
+        mandals = (response.json().get("mandals") if response is not None and response.ok else None) or [None]
+        self._pause()
+        self._call("GET /api/weather/<district>", "GET", f"/api/weather/{district}")
+        self._pause()
+        self._call("POST /predict (auto)", "POST", "/predict",
+                   json={"mode": "auto", "district": district, "season": season})
+        self._pause()
+        self._call("POST /predict (manual)", "POST", "/predict", json={
+            "mode": "manual",
+            "district": district,
+            "season": season,
+            "mandal": random.choice(mandals),
+            "soil_ph": round(random.uniform(5.5, 8.5), 1),
+            "organic_carbon": round(random.uniform(0.2, 1.0), 2),
+            "soil_n": random.randint(120, 400),
+            "soil_p": random.randint(8, 45),
+            "soil_k": random.randint(90, 380),
+        })
+        self._pause()
+        self._call("GET /history", "GET", "/history")
+        self._pause()
+
+    def _pause(self) -> None:
+        if self.think_time:
+            time.sleep(random.uniform(0, 2 * self.think_time))
+
+
+def run_load(target: str, users: int, duration: float, think_time: float, ramp_up: float,
+             flow: str = "dashboard") -> Dict[str, Any]:
+    recorder = Recorder()
+    deadline = time.monotonic() + duration
+
+    def worker(index: int) -> None:
+        time.sleep(ramp_up * index / max(users, 1))
+        farmer = VirtualFarmer(target, recorder, think_time, flow)
+        if flow == "dashboard":
+            try:
+                farmer.sign_in()
+            except requests.RequestException:
+                pass
+        while time.monotonic() < deadline:
+            farmer.run_flow()
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=worker, args=(index,), daemon=True) for index in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return recorder.report(time.monotonic() - started)
+
+
+def wait_for(target: str, timeout: float = 120.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            requests.get(target + "/get_district_names", timeout=5)
+            return
+        except requests.RequestException:
+            time.sleep(0.5)
+    raise RuntimeError(f"App at {target} did not come up within {timeout:.0f}s")
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    header = f"{'endpoint':<34}{'reqs':>7}{'errs':>6}{'rps':>8}{'p50':>9}{'p95':>9}{'p99':>9}"
+    print(header)
+    print("-" * len(header))
+    for endpoint, stats in report["endpoints"].items():
+        print(
+            f"{endpoint:<34}{stats['requests']:>7}{stats['errors']:>6}{stats['throughput_rps']:>8.1f}"
+            f"{stats['p50_ms']:>9.1f}{stats['p95_ms']:>9.1f}{stats['p99_ms']:>9.1f}"
+        )
+    print("-" * len(header))
+    print(f"{report['total_requests']} requests, {report['total_errors']} errors, "
+          f"{report['throughput_rps']} req/s over {report['duration_s']} s")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Load-test the AgroIntelligence dashboard flows.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    def add_weather_options(sub: argparse.ArgumentParser) -> None:
+        sub.add_argument("--weather-port", type=int, default=8099)
+        sub.add_argument("--latency-ms", type=float, default=200.0)
+        sub.add_argument("--jitter-ms", type=float, default=50.0)
+        sub.add_argument("--error-rate", type=float, default=0.0)
+
+    fake = subparsers.add_parser("fake-weather", help="only run the Open-Meteo stand-in")
+    add_weather_options(fake)
+
+    run = subparsers.add_parser("run", help="replay dashboard flows against the app")
+    add_weather_options(run)
+    run.add_argument("--target", default="http://127.0.0.1:8000")
+    run.add_argument("--spawn", help="command that starts the app; it gets OPEN_METEO_URL pointed at the stand-in")
+    run.add_argument("--no-fake-weather", action="store_true", help="use whatever weather API the app is configured with")
+    run.add_argument("--users", type=int, default=20)
+    run.add_argument("--duration", type=float, default=60.0)
+    run.add_argument("--think-time", type=float, default=0.0, help="mean pause between steps in seconds")
+    run.add_argument("--ramp-up", type=float, default=5.0)
+    run.add_argument("--flow", choices=["dashboard", "weather"], default="dashboard",
+                     help="full dashboard journey, or only the weather endpoint")
+    run.add_argument("--with-cache", action="store_true",
+                     help="leave the spawned app's weather/recommendation caches on (they are off by default, "
+                          "since simulated users repeat districts and payloads)")
+    run.add_argument("--output", help="write the report as JSON")
+    args = parser.parse_args()
+
+    weather: Optional[FakeOpenMeteoServer] = None
+    if args.command == "fake-weather" or not args.no_fake_weather:
+        weather = FakeOpenMeteoServer(
+            port=args.weather_port,
+            latency_ms=args.latency_ms,
+            jitter_ms=args.jitter_ms,
+            error_rate=args.error_rate,
+        ).start()
+        print(f"Fake Open-Meteo listening on {weather.url}")
+
+    if args.command == "fake-weather":
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            weather.stop()
+        return 0
+
+    app_process: Optional[subprocess.Popen] = None
+    try:
+        if args.spawn:
+            env = dict(os.environ)
+            if weather is not None:
+                env["OPEN_METEO_URL"] = weather.url
+            if not args.with_cache:
+                env["CACHE_BACKEND"] = "none"
+            app_process = subprocess.Popen(shlex.split(args.spawn), env=env)
+        wait_for(args.target.rstrip("/"))
+        print(f"Running {args.users} users for {args.duration:.0f}s against {args.target}")
+        report = run_load(args.target, args.users, args.duration, args.think_time, args.ramp_up, args.flow)
+        report["config"] = {
+            "flow": args.flow,
+            "users": args.users,
+            "think_time": args.think_time,
+            # Only known for a spawned app; a --target server runs with its own settings.
+            "cache": args.with_cache if args.spawn else None,
+            "weather_latency_ms": None if weather is None else args.latency_ms,
+            "weather_error_rate": None if weather is None else args.error_rate,
+            "weather_requests": None if weather is None else weather.requests_served,
+        }
+        print_report(report)
+        if args.output:
+            with open(args.output, "w") as handle:
+                json.dump(report, handle, indent=2)
+    finally:
+        if app_process is not None:
+            app_process.terminate()
+            app_process.wait(timeout=30)
+        if weather is not None:
+            weather.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,413 @@
+# Per-component memory accounting and tracemalloc leak diffs
+# This file will be imported by app.py
+
+"""Answers "what is using this worker's memory?" one component at a time.
+
+``MemoryAccountant.report()`` walks each registered component (the
+dataset copies, each service, the model bundle, the caches, the SQLAlchemy
+identity map) and adds up the deep size of everything it reaches. Each
+object is counted once, under the first component that reaches it, so the
+components add up. NumPy arrays mapped from artifact files are reported
+apart as ``mapped_bytes``; they are page cache shared by every worker, not
+private heap. Process RSS minus the accounted total is the part no Python
+object owns: the TensorFlow runtime, the interpreter and allocator slack.
+
+Tracing with tracemalloc is optional because it slows every allocation.
+Once started, each report diffs the heap against the baseline taken at
+start (or at the last reset) and lists the lines that grew the most.
+
+Usage:
+    python memory_report.py                              # this checkout, in-process
+    python memory_report.py --load-model --trace --predict 500
+    python memory_report.py --url http://127.0.0.1:8000 --token "$DIAGNOSTICS_TOKEN"
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import hmac
+import json
+import os
+import resource
+import sys
+import threading
+import tracemalloc
+import types
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+from flask import Flask, Response, jsonify, request
+
+# Objects from these packages are counted shallowly: walking into them would
+# pull in the whole ORM, app or connection pool once per component.
+OPAQUE_MODULES = (
+    "sqlalchemy", "flask", "werkzeug", "jinja2", "requests", "urllib3", "threading", "_thread",
+    "logging", "sqlite3", "gevent", "socket", "ssl", "queue", "concurrent",
+)
+# Keras models are measured by their weights; their Python graph says nothing about TensorFlow.
+KERAS_MODULES = ("keras", "tf_keras", "tensorflow")
+SKIPPED_TYPES = (
+    type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType,
+    types.FrameType, types.GeneratorType, types.CodeType,
+)
+# Attributes listed per component: the largest few, and none under 1 KB
+PARTS_LIMIT = 10
+PART_MIN_BYTES = 1024
+
+
+def process_memory() -> Dict[str, Optional[int]]:
+    """Resident and peak resident set size in bytes, from /proc on Linux."""
+    rss = peak = None
+    try:
+        with open("/proc/self/status", encoding="ascii") as handle:
+            for line in handle:
+                if line.startswith("VmRSS:"):
+                    rss = int(line.split()[1]) * 1024
+                elif line.startswith("VmHWM:"):
+                    peak = int(line.split()[1]) * 1024
+    except OSError:
+        # ru_maxrss is kilobytes on Linux but bytes on macOS.
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        peak = maxrss if sys.platform == "darwin" else maxrss * 1024
+    return {"rss_bytes": rss, "peak_rss_bytes": peak}
+
+
+def _keras_weight_bytes(model: Any) -> int:
+    total = 0
+    for weight in getattr(model, "weights", []):
+        total += int(np.prod(weight.shape)) * weight.dtype.size
+    return total
+
+
+class DeepSizer:
+    """Deep size of object graphs, sharing one ``seen`` set across calls."""
+
+    def __init__(self) -> None:
+        self.seen: Set[int] = set()
+
+    def measure(self, root: Any) -> Tuple[int, int]:
+        """(private bytes, mapped bytes) reachable from ``root`` and not measured before."""
+        private = mapped = 0
+        stack = [root]
+        while stack:
+            obj = stack.pop()
+            if id(obj) in self.seen or isinstance(obj, SKIPPED_TYPES):
+                continue
+            self.seen.add(id(obj))
+
+            if isinstance(obj, (pd.DataFrame, pd.Series, pd.Index)):
+                usage = obj.memory_usage(deep=True)
+                private += int(usage.sum()) if isinstance(usage, pd.Series) else int(usage)
+                continue
+            if isinstance(obj, np.ndarray):
+                if isinstance(obj, np.memmap):
+                    mapped += obj.nbytes
+                elif obj.flags.owndata:
+                    private += sys.getsizeof(obj, 0)
+                elif isinstance(obj.base, np.ndarray):
+                    # A view: only its header here, the buffer is counted with its base.
+                    private += sys.getsizeof(obj, 0)
+                    stack.append(obj.base)
+                else:
+                    private += obj.nbytes
+                continue
+
+            module = type(obj).__module__ or ""
+            if module.startswith(KERAS_MODULES):
+                private += _keras_weight_bytes(obj) or sys.getsizeof(obj, 0)
+                continue
+            private += sys.getsizeof(obj, 0)
+            if module.startswith(OPAQUE_MODULES):
+                continue
+            if isinstance(obj, dict):
+                stack.extend(obj.keys())
+                stack.extend(obj.values())
+            elif isinstance(obj, (list, tuple, set, frozenset)):
+                stack.extend(obj)
+            elif isinstance(obj, (str, bytes, bytearray, int, float, complex, bool)) or obj is None:
+                continue
+            else:
+                attributes = getattr(obj, "__dict__", None)
+                if isinstance(attributes, dict):
+                    stack.append(attributes)
+                for slot in getattr(type(obj), "__slots__", ()):
+                    if hasattr(obj, slot):
+                        stack.append(getattr(obj, slot))
+        return private, mapped
+
+
+class LeakTracer:
+    """tracemalloc with a movable baseline."""
+
+    def __init__(self) -> None:
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+        self._lock = threading.Lock()
+
+    @property
+    def active(self) -> bool:
+        return tracemalloc.is_tracing() and self._baseline is not None
+
+    def start(self, frames: int = 1) -> None:
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(frames)
+            self._baseline = self._snapshot()
+
+    def reset(self) -> None:
+        """Moves the baseline to now, so the next diff shows only what grows from here."""
+        with self._lock:
+            if tracemalloc.is_tracing():
+                self._baseline = self._snapshot()
+
+    def stop(self) -> None:
+        with self._lock:
+            self._baseline = None
+            tracemalloc.stop()
+
+    @staticmethod
+    def _snapshot() -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, "<frozen importlib._bootstrap>")]
+        )
+
+    def diff(self, top: int = 25) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if not self.active:
+                return None
+            baseline = self._baseline
+            current = self._snapshot()
+        stats = current.compare_to(baseline, "traceback")
+        traced, peak = tracemalloc.get_traced_memory()
+        return {
+            "traced_bytes": traced,
+            "traced_peak_bytes": peak,
+            "growth_bytes": sum(stat.size_diff for stat in stats),
+            "top": [
+                {
+                    "where": [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback],
+                    "size_diff_bytes": stat.size_diff,
+                    "count_diff": stat.count_diff,
+                    "size_bytes": stat.size,
+                }
+                for stat in stats[:top]
+            ],
+        }
+
+
+class MemoryAccountant:
+    """Named components to measure, in order; earlier components claim shared objects."""
+
+    def __init__(self) -> None:
+        self.components: List[Tuple[str, Callable[[], Any]]] = []
+        self.tracer = LeakTracer()
+
+    @classmethod
+    def from_env(cls) -> "MemoryAccountant":
+        accountant = cls()
+        # Tracing from startup catches what the first requests leave behind, at some cost per allocation.
+        frames = int(os.environ.get("MEMORY_TRACEMALLOC_FRAMES", "0"))
+        if frames > 0:
+            accountant.tracer.start(frames)
+        return accountant
+
+    def init_app(self, app: Flask, token: Optional[str] = None) -> None:
+        """Registers ``GET /admin/memory`` and ``POST /admin/memory/tracemalloc``.
+
+        Both require ``Authorization: Bearer <token>``. Without a token nothing
+        is registered: a report exposes internals and can take a second.
+        """
+        if not token:
+            return
+
+        def authorized() -> bool:
+            return hmac.compare_digest(request.headers.get("Authorization", "").encode(), f"Bearer {token}".encode())
+
+        @app.route("/admin/memory")
+        def memory_report_endpoint() -> Response:
+            if not authorized():
+                return Response("unauthorized\n", status=401, mimetype="text/plain")
+            report = self.report(
+                collect=request.args.get("gc") in {"1", "true"},
+                top=request.args.get("top", 25, type=int),
+            )
+            # Not jsonify: it sorts keys, and components are listed in the order they claim objects.
+            response = Response(json.dumps(report), mimetype="application/json")
+            response.cache_control.no_store = True
+            return response
+
+        @app.route("/admin/memory/tracemalloc", methods=["POST"])
+        def memory_trace_endpoint() -> Response:
+            if not authorized():
+                return Response("unauthorized\n", status=401, mimetype="text/plain")
+            action = request.args.get("action", "start")
+            if action == "start":
+                self.tracer.start(request.args.get("frames", 5, type=int))
+            elif action == "reset":
+                self.tracer.reset()
+            elif action == "stop":
+                self.tracer.stop()
+            else:
+                return jsonify({"error": "action must be start, reset or stop"}), 400
+            return jsonify({"tracing": self.tracer.active, "pid": os.getpid()})
+
+    def track(self, name: str, getter: Callable[[], Any]) -> None:
+        """``getter`` is called at report time, so swapped datasets and models are measured as served."""
+        self.components.append((name, getter))
+
+    def report(self, collect: bool = False, top: int = 25) -> Dict[str, Any]:
+        if collect:
+            gc.collect()
+        # Diffed first, so the sizer's own bookkeeping is not reported as growth.
+        traced = self.tracer.diff(top)
+        sizer = DeepSizer()
+        components: Dict[str, Any] = {}
+        for name, getter in self.components:
+            root = getter()
+            private, mapped, parts = self._measure_component(sizer, root)
+            entry: Dict[str, Any] = {"bytes": private, "mapped_bytes": mapped}
+            if parts:
+                entry["parts"] = parts
+            components[name] = entry
+
+        accounted = sum(entry["bytes"] for entry in components.values())
+        report: Dict[str, Any] = {"pid": os.getpid(), **process_memory()}
+        report.update(
+            {
+                "accounted_bytes": accounted,
+                "unattributed_bytes": report["rss_bytes"] - accounted if report["rss_bytes"] is not None else None,
+                "tensorflow_loaded": "tensorflow" in sys.modules,
+                "components": components,
+                "tracemalloc": traced,
+            }
+        )
+        return report
+
+    @staticmethod
+    def _measure_component(sizer: DeepSizer, root: Any) -> Tuple[int, int, Dict[str, Dict[str, int]]]:
+        """Sizes a service attribute by attribute, so the report shows which one is large."""
+        attributes = getattr(root, "__dict__", None)
+        if (
+            not isinstance(attributes, dict)
+            or isinstance(root, SKIPPED_TYPES + (pd.DataFrame, pd.Series, np.ndarray))
+            or (type(root).__module__ or "").startswith(OPAQUE_MODULES + KERAS_MODULES)
+        ):
+            private, mapped = sizer.measure(root)
+            return private, mapped, {}
+        sizer.seen.update((id(root), id(attributes)))
+        private = sys.getsizeof(root, 0) + sys.getsizeof(attributes, 0)
+        mapped = 0
+        parts: List[Tuple[str, int, int]] = []
+        for attribute, value in attributes.items():
+            part_private, part_mapped = sizer.measure(value)
+            parts.append((attribute, part_private, part_mapped))
+            private += part_private
+            mapped += part_mapped
+        parts.sort(key=lambda part: part[1] + part[2], reverse=True)
+        return private, mapped, {
+            attribute: {"bytes": part_private, "mapped_bytes": part_mapped}
+            for attribute, part_private, part_mapped in parts[:PARTS_LIMIT]
+            if part_private + part_mapped >= PART_MIN_BYTES
+        }
+
+
+def _size(value: Optional[int]) -> str:
+    if value is None:
+        return "-"
+    if abs(value) < 1 << 20:
+        return f"{value / 1024:.1f} KB"
+    return f"{value / (1 << 20):.1f} MB"
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    def row(label: str, entry: Dict[str, Any]) -> str:
+        mapped = f"  (+{_size(entry['mapped_bytes'])} mapped)" if entry["mapped_bytes"] else ""
+        return f"{label:<30}{_size(entry['bytes']):>10}{mapped}"
+
+    lines = [
+        f"pid {report['pid']}  RSS {_size(report['rss_bytes'])}  peak {_size(report['peak_rss_bytes'])}"
+        f"  TensorFlow {'loaded' if report['tensorflow_loaded'] else 'not loaded'}",
+        "",
+    ]
+    for name, entry in report["components"].items():
+        lines.append(row(name, entry))
+        for attribute, part in entry.get("parts", {}).items():
+            lines.append(row(f"  .{attribute}", part))
+    lines.append(f"{'accounted':<30}{_size(report['accounted_bytes']):>10}")
+    lines.append(f"{'unattributed (RSS - above)':<30}{_size(report['unattributed_bytes']):>10}")
+
+    traced = report.get("tracemalloc")
+    if traced:
+        lines += [
+            "",
+            f"tracemalloc: {traced['growth_bytes'] / 1024:+.1f} KB since baseline "
+            f"(traced {_size(traced['traced_bytes'])}, peak {_size(traced['traced_peak_bytes'])})",
+        ]
+        for stat in traced["top"]:
+            # Frames run oldest first; the allocating line is the last one.
+            where = stat["where"]
+            lines.append(f"  {stat['size_diff_bytes'] / 1024:+10.1f} KB {stat['count_diff']:+7d} blocks  {where[-1]}")
+            lines.extend(f"{'':>34}{frame}" for frame in reversed(where[:-1]))
+    return "\n".join(lines)
+
+
+def _fetch_remote(url: str, token: Optional[str], top: int, collect: bool) -> Dict[str, Any]:
+    import requests
+
+    response = requests.get(
+        url.rstrip("/") + "/admin/memory",
+        params={"top": top, "gc": int(collect)},
+        headers={"Authorization": f"Bearer {token}"} if token else {},
+        timeout=60,
+    )
+    response.raise_for_status()
+    return response.json()
+
+
+def _replay_predictions(agro_app: Any, count: int) -> None:
+    """Runs sampled dataset rows through the same path as /predict (payload, recommend, guidance)."""
+    service = agro_app.district_service
+    rows = agro_app.DATASET.sample(n=count, replace=True, random_state=0)
+    for record in rows.to_dict("records"):
+        payload = service.build_model_payload(record["District"], record["Season"], {}, mode="auto")
+        result = agro_app.run_inference("recommend", payload, None)
+        service.fetch_guidance(record["District"], result["recommendations"][0]["crop"])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Report memory use per component.")
+    parser.add_argument("--url", help="read /admin/memory from a running server instead (one worker per call)")
+    parser.add_argument("--token", default=os.environ.get("DIAGNOSTICS_TOKEN"), help="bearer token for --url")
+    parser.add_argument("--load-model", action="store_true", help="load the model before measuring")
+    parser.add_argument("--trace", action="store_true", help="trace allocations from after start-up")
+    parser.add_argument("--frames", type=int, default=5, help="traceback depth recorded by --trace")
+    parser.add_argument("--predict", type=int, default=0, help="recommendations to replay before measuring")
+    parser.add_argument("--top", type=int, default=25, help="allocation sites listed in the diff")
+    parser.add_argument("--gc", action="store_true", help="run a full garbage collection first")
+    parser.add_argument("--json", action="store_true", help="print the raw report")
+    args = parser.parse_args()
+
+    if args.url:
+        report = _fetch_remote(args.url, args.token, args.top, args.gc)
+    else:
+        # Measure in-process inference, not a sidecar.
+        os.environ.pop("MODEL_SERVER_SOCKET", None)
+        import app as agro_app
+
+        if args.load_model or args.predict:
+            agro_app.recommendation_engine._ensure_loaded()
+        if args.trace:
+            if args.predict:
+                _replay_predictions(agro_app, 1)  # lazy one-off allocations land before the baseline
+            agro_app.memory_accountant.tracer.start(args.frames)
+        if args.predict:
+            _replay_predictions(agro_app, args.predict)
+        with agro_app.app.test_request_context():
+            report = agro_app.memory_accountant.report(collect=args.gc, top=args.top)
+    print(json.dumps(report, indent=2) if args.json else format_report(report))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,222 @@
+# Lightweight request timing and Prometheus metrics
+# This file will be imported by app.py
+
+from __future__ import annotations
+
+import hmac
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from flask import Flask, Response, g, has_request_context, request
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelSet = Tuple[Tuple[str, str], ...]
+
+
+def _labels(**labels: str) -> LabelSet:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(labels: LabelSet, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (
+        key + '="' + value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for key, value in pairs
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        self.total += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """Per-process counters, gauges and histograms rendered as Prometheus text.
+
+    Each gunicorn worker keeps its own registry, so scrape every worker or
+    aggregate by instance.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._help: Dict[str, Tuple[str, str]] = {}
+        self._counters: Dict[str, Dict[LabelSet, float]] = {}
+        self._gauges: Dict[str, Dict[LabelSet, float]] = {}
+        self._histograms: Dict[str, Dict[LabelSet, Histogram]] = {}
+
+    def describe(self, name: str, kind: str, help_text: str) -> None:
+        self._help[name] = (kind, help_text)
+
+    def inc(self, name: str, amount: float = 1.0, **labels: str) -> None:
+        key = _labels(**labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + amount
+
+    def set_gauge(self, name: str, value: float, **labels: str) -> None:
+        with self._lock:
+            self._gauges.setdefault(name, {})[_labels(**labels)] = value
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        key = _labels(**labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram()
+            histogram.observe(value)
+
+    def record_cache(self, cache: str, hit: bool) -> None:
+        self.inc("agro_cache_requests_total", cache=cache, result="hit" if hit else "miss")
+
+    def get_counter(self, name: str, **labels: str) -> float:
+        with self._lock:
+            return self._counters.get(name, {}).get(_labels(**labels), 0.0)
+
+    def _cache_hit_ratios(self) -> Dict[LabelSet, float]:
+        totals: Dict[str, List[float]] = {}
+        for labels, value in self._counters.get("agro_cache_requests_total", {}).items():
+            label_map = dict(labels)
+            hits_total = totals.setdefault(label_map["cache"], [0.0, 0.0])
+            if label_map["result"] == "hit":
+                hits_total[0] += value
+            hits_total[1] += value
+        return {
+            _labels(cache=cache): (hits / total if total else 0.0)
+            for cache, (hits, total) in totals.items()
+        }
+
+    def render(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            gauges = {name: dict(series) for name, series in self._gauges.items()}
+            gauges["agro_cache_hit_ratio"] = self._cache_hit_ratios()
+            sections = [("counter", self._counters), ("gauge", gauges)]
+            for kind, metrics in sections:
+                for name in sorted(metrics):
+                    if not metrics[name]:
+                        continue
+                    self._render_header(lines, name, kind)
+                    for labels, value in sorted(metrics[name].items()):
+                        lines.append(f"{name}{_format_labels(labels)} {value:g}")
+            for name in sorted(self._histograms):
+                self._render_header(lines, name, "histogram")
+                for labels, histogram in sorted(self._histograms[name].items()):
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_format_labels(labels, ('le', f'{bound:g}'))} {cumulative}")
+                    lines.append(f"{name}_bucket{_format_labels(labels, ('le', '+Inf'))} {histogram.count}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {histogram.total:.6f}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def _render_header(self, lines: List[str], name: str, kind: str) -> None:
+        declared_kind, help_text = self._help.get(name, (kind, name.replace("_", " ")))
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {declared_kind}")
+
+
+registry = MetricsRegistry()
+registry.describe("agro_http_requests_total", "counter", "HTTP requests by route, method and status.")
+registry.describe("agro_http_request_duration_seconds", "histogram", "End-to-end request latency by route.")
+registry.describe("agro_stage_duration_seconds", "histogram", "Latency of individual pipeline stages.")
+registry.describe("agro_stage_errors_total", "counter", "Exceptions raised inside a pipeline stage.")
+registry.describe("agro_cache_requests_total", "counter", "Cache lookups by cache and result.")
+registry.describe("agro_cache_hit_ratio", "gauge", "Cache hits divided by lookups since process start.")
+registry.describe("agro_model_load_seconds", "gauge", "Time spent loading the recommendation model.")
+registry.describe("agro_model_info", "gauge", "1 for the model version currently served, per tier.")
+registry.describe("agro_inference_batches_total", "counter", "Model calls made by the micro-batcher.")
+registry.describe("agro_inference_batched_rows_total", "counter", "Rows scored by the micro-batcher; divide by batches for mean size.")
+registry.describe("agro_inference_queue_wait_seconds", "histogram", "Time a row waited in the micro-batcher before its flush.")
+registry.describe("agro_model_server_requests_total", "counter", "Predictions sent to the model server sidecar, served or fallen back.")
+registry.describe("agro_admission_in_flight", "gauge", "Prediction requests currently holding an admission slot.")
+registry.describe("agro_admission_queue_depth", "gauge", "Prediction requests waiting for an admission slot.")
+registry.describe("agro_admission_shed_total", "counter", "Prediction requests answered 503, by reason.")
+registry.describe("agro_admission_wait_seconds", "histogram", "Time admitted prediction requests spent queued.")
+registry.describe("agro_model_reloads_total", "counter", "Hot reload attempts by outcome (swapped or rejected).")
+registry.describe("agro_dataset_reloads_total", "counter", "Dataset reloads by outcome (swapped, unchanged or rejected).")
+registry.describe("agro_dataset_districts_recomputed_total", "counter", "Districts re-summarized by incremental dataset reloads.")
+registry.describe("agro_json_cache_responses_total", "counter", "Pre-serialized JSON responses, full or 304 not modified.")
+registry.describe("agro_compressed_responses_total", "counter", "Dynamic responses compressed, by content coding.")
+registry.describe("agro_compression_saved_bytes_total", "counter", "Response bytes saved by dynamic compression.")
+registry.describe("agro_cache_lock_timeouts_total", "counter", "Cache misses computed without the refresh lock after waiting it out.")
+
+
+def _current_route() -> str:
+    if has_request_context() and request.url_rule is not None:
+        return request.url_rule.rule
+    return "background"
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Times a pipeline stage; inside a request it also feeds the Server-Timing header."""
+    start = time.perf_counter()
+    route = _current_route()
+    try:
+        yield
+    except Exception:
+        registry.inc("agro_stage_errors_total", route=route, stage=stage)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        registry.observe("agro_stage_duration_seconds", elapsed, route=route, stage=stage)
+        if has_request_context():
+            g.setdefault("server_timing", []).append((stage, elapsed))
+
+
+def init_app(app: Flask, token: Optional[str] = None) -> None:
+    """Registers request timing hooks and the ``/metrics`` endpoint.
+
+    When ``token`` is set, ``/metrics`` requires ``Authorization: Bearer <token>``.
+    """
+
+    @app.before_request
+    def _start_timer() -> None:
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response: Response) -> Response:
+        started = g.pop("request_started", None)
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        route = _current_route() if request.url_rule is not None else "unmatched"
+        registry.inc(
+            "agro_http_requests_total",
+            route=route,
+            method=request.method,
+            status=str(response.status_code),
+        )
+        registry.observe("agro_http_request_duration_seconds", elapsed, route=route)
+        timings = g.get("server_timing", [])
+        entries = [f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in timings]
+        entries.append(f"total;dur={elapsed * 1000:.2f}")
+        response.headers["Server-Timing"] = ", ".join(entries)
+        return response
+
+    @app.route("/metrics")
+    def metrics_endpoint() -> Response:
+        # Constant-time comparison, so response timing does not leak how much of the token matched.
+        supplied = request.headers.get("Authorization", "").encode()
+        if token and not hmac.compare_digest(supplied, f"Bearer {token}".encode()):
+            return Response("unauthorized\n", status=401, mimetype="text/plain")
+        return Response(registry.render(), mimetype="text/plain; version=0.0.4")
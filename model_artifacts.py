@@ -0,0 +1,311 @@
+# model_artifacts.py
+"""Compact, memory-mappable artifact format for the crop recommendation models.
+
+An artifact is a directory with a ``manifest.json`` (architecture, classes,
+feature columns, quantization scales) and one plain ``.npy`` file per tensor.
+Nothing is pickled, and the loader maps every tensor read-only so all
+gunicorn workers on a host share the same page-cache pages. Inference is a
+NumPy forward pass, so serving from this format does not import TensorFlow.
+
+    python model_artifacts.py export --dtype int8 --out croprecommender_mlp.weights
+"""
+import argparse
+import json
+import logging
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+
+FORMAT_VERSION = 1
+SUPPORTED_DTYPES = ('float32', 'float16', 'int8')
+
+
+def _quantize_int8(kernel):
+    """Symmetric per-output-channel int8 quantization of a (inputs, units) kernel."""
+    scale = np.abs(kernel).max(axis=0) / 127.0
+    scale[scale == 0] = 1.0
+    quantized = np.clip(np.round(kernel / scale), -127, 127).astype(np.int8)
+    return quantized, scale.astype(np.float32)
+
+
+def _save_array(path, array):
+    """Writes next to ``path`` and renames over it.
+
+    Serving workers keep the previous file mapped; replacing the inode rather
+    than truncating it in place leaves their mapping intact until they swap.
+    """
+    partial = path.with_name(f'.{path.name}.partial')
+    with open(partial, 'wb') as handle:
+        np.save(handle, array)
+    os.replace(partial, path)
+
+
+def write_manifest(out_dir, manifest):
+    # Written last: a manifest only ever points at arrays that are already complete.
+    partial = out_dir / '.manifest.json.partial'
+    partial.write_text(json.dumps(manifest, indent=2))
+    os.replace(partial, out_dir / 'manifest.json')
+
+
+def export_keras_model(model, classes, feature_cols, out_dir, dtype='float16'):
+    """Writes the Dense layers of a Keras MLP as a mapped artifact directory."""
+    if dtype not in SUPPORTED_DTYPES:
+        raise ValueError(f"dtype must be one of {SUPPORTED_DTYPES}")
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    layers = []
+    dense_layers = [layer for layer in model.layers if layer.__class__.__name__ == 'Dense']
+    for index, layer in enumerate(dense_layers):
+        kernel, bias = (np.asarray(weights, dtype=np.float32) for weights in layer.get_weights())
+        entry = {
+            'kernel': f'layer{index}_kernel.npy',
+            'bias': f'layer{index}_bias.npy',
+            'activation': layer.get_config()['activation'],
+            'shape': list(kernel.shape),
+        }
+        if dtype == 'int8':
+            kernel, scale = _quantize_int8(kernel)
+            entry['scale'] = f'layer{index}_scale.npy'
+            _save_array(out_dir / entry['scale'], scale)
+        else:
+            kernel = kernel.astype(dtype)
+        _save_array(out_dir / entry['kernel'], kernel)
+        _save_array(out_dir / entry['bias'], bias)
+        layers.append(entry)
+
+    manifest = {
+        'format_version': FORMAT_VERSION,
+        'kind': 'mlp',
+        'dtype': dtype,
+        'layers': layers,
+        'classes': [str(name) for name in classes],
+        'feature_cols': [str(col) for col in feature_cols],
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+    }
+    write_manifest(out_dir, manifest)
+    return manifest
+
+
+def export_tree_model(tree, classes, feature_cols, out_dir, temperature=1.0):
+    """Writes a fitted multi-output sklearn decision tree as flat node arrays.
+
+    A tree fitted to probabilities softened at ``temperature`` gets its leaves
+    sharpened back (p**T, renormalised), so it serves on the teacher's scale.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    nodes = tree.tree_
+    values = nodes.value.reshape(nodes.node_count, -1).astype(np.float32)
+    values /= np.maximum(values.sum(axis=1, keepdims=True), 1e-12)
+    if temperature != 1:
+        values = np.power(values, temperature)
+        values /= np.maximum(values.sum(axis=1, keepdims=True), 1e-30)
+    arrays = {
+        'children_left': nodes.children_left.astype(np.int32),
+        'children_right': nodes.children_right.astype(np.int32),
+        'feature': nodes.feature.astype(np.int32),
+        'threshold': nodes.threshold.astype(np.float64),
+        'value': values,
+    }
+    for name, array in arrays.items():
+        _save_array(out_dir / f'{name}.npy', array)
+    manifest = {
+        'format_version': FORMAT_VERSION,
+        'kind': 'tree',
+        'dtype': 'float32',
+        'max_depth': int(nodes.max_depth),
+        'arrays': {name: f'{name}.npy' for name in arrays},
+        'classes': [str(name) for name in classes],
+        'feature_cols': [str(col) for col in feature_cols],
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+    }
+    write_manifest(out_dir, manifest)
+    return manifest
+
+
+def load_mapped_model(artifact_dir):
+    """Opens a mapped artifact directory as a MappedMLP or MappedTree."""
+    manifest = json.loads((Path(artifact_dir) / 'manifest.json').read_text())
+    if manifest.get('kind', 'mlp') == 'tree':
+        return MappedTree(artifact_dir)
+    return MappedMLP(artifact_dir)
+
+
+class MappedMLP:
+    """Read-only, memory-mapped MLP with a Keras-compatible ``predict``.
+
+    Weights stay in their stored dtype inside the shared mapping and are
+    widened per call; at this model size that costs microseconds and keeps
+    the process-private footprint near zero.
+    """
+
+    def __init__(self, artifact_dir):
+        self.artifact_dir = Path(artifact_dir)
+        self.manifest = json.loads((self.artifact_dir / 'manifest.json').read_text())
+        if self.manifest.get('format_version') != FORMAT_VERSION or self.manifest.get('kind', 'mlp') != 'mlp':
+            raise ValueError(f"{self.artifact_dir} is not an MLP artifact")
+        self.dtype = self.manifest['dtype']
+        self.classes = list(self.manifest['classes'])
+        self.feature_cols = list(self.manifest['feature_cols'])
+        self.layers = []
+        for entry in self.manifest['layers']:
+            self.layers.append({
+                'kernel': self._map(entry['kernel']),
+                'bias': self._map(entry['bias']),
+                'scale': self._map(entry['scale']) if 'scale' in entry else None,
+                'activation': entry['activation'],
+            })
+
+    def _map(self, name):
+        return np.load(self.artifact_dir / name, mmap_mode='r', allow_pickle=False)
+
+    @property
+    def nbytes(self):
+        return sum(
+            array.nbytes for layer in self.layers
+            for array in (layer['kernel'], layer['bias'], layer['scale']) if array is not None
+        )
+
+    def predict(self, X, verbose=0, batch_size=None):
+        hidden = np.asarray(X, dtype=np.float32)
+        for layer in self.layers:
+            hidden = hidden @ layer['kernel'].astype(np.float32)
+            if layer['scale'] is not None:
+                hidden *= layer['scale']
+            hidden += layer['bias']
+            activation = layer['activation']
+            if activation == 'relu':
+                np.maximum(hidden, 0, out=hidden)
+            elif activation == 'softmax':
+                hidden -= hidden.max(axis=1, keepdims=True)
+                np.exp(hidden, out=hidden)
+                hidden /= hidden.sum(axis=1, keepdims=True)
+            elif activation != 'linear':
+                raise ValueError(f"Unsupported activation '{activation}'")
+        return hidden
+
+    def __call__(self, X, training=False):
+        return self.predict(X)
+
+
+class MappedTree:
+    """Read-only, memory-mapped decision tree whose leaves hold class probabilities."""
+
+    def __init__(self, artifact_dir):
+        self.artifact_dir = Path(artifact_dir)
+        self.manifest = json.loads((self.artifact_dir / 'manifest.json').read_text())
+        if self.manifest.get('format_version') != FORMAT_VERSION or self.manifest.get('kind') != 'tree':
+            raise ValueError(f"{self.artifact_dir} is not a tree artifact")
+        self.classes = list(self.manifest['classes'])
+        self.feature_cols = list(self.manifest['feature_cols'])
+        self.max_depth = self.manifest['max_depth']
+        arrays = {
+            name: np.load(self.artifact_dir / filename, mmap_mode='r', allow_pickle=False)
+            for name, filename in self.manifest['arrays'].items()
+        }
+        self.children_left = arrays['children_left']
+        self.children_right = arrays['children_right']
+        self.feature = arrays['feature']
+        self.threshold = arrays['threshold']
+        self.value = arrays['value']
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in (self.children_left, self.children_right,
+                                              self.feature, self.threshold, self.value))
+
+    def predict(self, X, verbose=0, batch_size=None):
+        features = np.asarray(X, dtype=np.float32)
+        rows = np.arange(len(features))
+        node = np.zeros(len(features), dtype=np.int64)
+        # One vectorized step per tree level; rows that reached a leaf stay put.
+        for _ in range(self.max_depth):
+            left = self.children_left[node]
+            internal = left != -1
+            if not internal.any():
+                break
+            split_feature = np.where(internal, self.feature[node], 0)
+            go_left = features[rows, split_feature] <= self.threshold[node]
+            node = np.where(internal, np.where(go_left, left, self.children_right[node]), node)
+        return np.asarray(self.value[node])
+
+    def __call__(self, X, training=False):
+        return self.predict(X)
+
+
+def single_row_latency_ms(model, X, runs=200):
+    row = np.asarray(X[:1], dtype=np.float32)
+    model.predict(row, verbose=0)
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        model.predict(row, verbose=0)
+        timings.append((time.perf_counter() - started) * 1000)
+    return float(np.median(timings))
+
+
+def compare_models(reference, candidate, X, y, classes):
+    """Accuracy, agreement and latency of ``candidate`` against the float32 ``reference``."""
+    from evaluation import evaluate
+
+    features = np.asarray(X, dtype=np.float32)
+    reference_report = evaluate(reference, features, y, classes)
+    candidate_report = evaluate(candidate, features, y, classes)
+    reference_probs = reference.predict(features, verbose=0)
+    candidate_probs = candidate.predict(features, verbose=0)
+    return {
+        'rows': int(len(y)),
+        'float32': {
+            'accuracy': reference_report['accuracy'],
+            'top3_accuracy': reference_report['top_k_accuracy'].get('3'),
+            'single_row_latency_ms': single_row_latency_ms(reference, features),
+        },
+        'exported': {
+            'accuracy': candidate_report['accuracy'],
+            'top3_accuracy': candidate_report['top_k_accuracy'].get('3'),
+            'single_row_latency_ms': single_row_latency_ms(candidate, features),
+        },
+        'top1_agreement': float((reference_probs.argmax(axis=1) == candidate_probs.argmax(axis=1)).mean()),
+        'max_abs_prob_diff': float(np.abs(reference_probs - candidate_probs).max()),
+    }
+
+
+def main():
+    from evaluation import holdout_split, load_artifact
+    from train_model import load_and_preprocess_data
+
+    parser = argparse.ArgumentParser(description="Export the crop MLP to the compact mapped format.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    export = subparsers.add_parser('export')
+    export.add_argument('--model', default='croprecommender_mlp', help="Keras artifact prefix (.h5 + .npz)")
+    export.add_argument('--dtype', choices=SUPPORTED_DTYPES, default='float16')
+    export.add_argument('--out', default='croprecommender_mlp.weights')
+    export.add_argument('--data', default='apcrop_dataset_realistic.csv', help="used for the comparison")
+    export.add_argument('--skip-compare', action='store_true')
+    args = parser.parse_args()
+
+    model, classes, feature_cols = load_artifact(args.model)
+    manifest = export_keras_model(model, classes, feature_cols, args.out, args.dtype)
+    mapped = MappedMLP(args.out)
+    logging.info(f"Exported {args.dtype} artifact to {args.out} ({mapped.nbytes / 1024:.1f} KiB of weights)")
+
+    if not args.skip_compare:
+        import pandas as pd
+
+        X, y = load_and_preprocess_data(args.data)
+        known = y.isin(classes).to_numpy()
+        X = X[known].reindex(columns=feature_cols, fill_value=0)
+        labels = pd.Categorical(y[known], categories=classes).codes
+        _, test_idx = holdout_split(labels)
+        comparison = compare_models(model, mapped, X.iloc[test_idx], labels[test_idx], classes)
+        manifest['comparison'] = comparison
+        write_manifest(Path(args.out), manifest)
+        logging.info(json.dumps(comparison, indent=2))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
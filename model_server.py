@@ -0,0 +1,311 @@
+# Local inference sidecar and its client
+# This file will be imported by app.py
+
+"""One process owns the recommendation engine; web workers ask it over a Unix socket.
+
+Without the sidecar every gunicorn worker loads its own model, TensorFlow and
+fitted imputer. With it, workers only send the model payload (a few hundred
+bytes) and fall back to in-process inference if the sidecar is down.
+
+Usage:
+    python model_server.py serve --socket /run/agro/model.sock --max-batch 32 --max-wait-ms 2
+    MODEL_SERVER_SOCKET=/run/agro/model.sock gunicorn -w 8 app:app
+    python model_server.py health --socket /run/agro/model.sock
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import socket
+import socketserver
+import struct
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+FRAME_HEADER = struct.Struct(">I")
+MAX_FRAME_BYTES = 16 << 20
+
+logger = logging.getLogger(__name__)
+
+# CropRecommendationEngine methods a web worker may run in the sidecar
+ENGINE_METHODS = ("recommend", "recommend_batch", "what_if")
+
+
+class ModelServerUnavailable(RuntimeError):
+    """The sidecar could not answer; callers should fall back to in-process inference."""
+
+
+class ModelServerTimeout(RuntimeError):
+    """The sidecar took the request but did not reply in time.
+
+    It is alive and still working on it, so callers should fail the request
+    rather than run the same work again in-process.
+    """
+
+
+def _json_default(value: Any) -> Any:
+    # Dataset-derived payload values can be NumPy scalars.
+    if hasattr(value, "item"):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def send_frame(sock: socket.socket, message: Dict[str, Any]) -> None:
+    body = json.dumps(message, default=_json_default).encode("utf-8")
+    sock.sendall(FRAME_HEADER.pack(len(body)) + body)
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    chunks = []
+    while size:
+        chunk = sock.recv(size)
+        if not chunk:
+            raise ConnectionError("connection closed mid-frame")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def recv_frame(sock: socket.socket) -> Optional[Dict[str, Any]]:
+    """Next length-prefixed JSON message, or None on a clean EOF."""
+    header = sock.recv(FRAME_HEADER.size, socket.MSG_WAITALL)
+    if not header:
+        return None
+    if len(header) < FRAME_HEADER.size:
+        header += _recv_exact(sock, FRAME_HEADER.size - len(header))
+    (size,) = FRAME_HEADER.unpack(header)
+    if size > MAX_FRAME_BYTES:
+        raise ValueError(f"frame of {size} bytes exceeds {MAX_FRAME_BYTES}")
+    return json.loads(_recv_exact(sock, size))
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    server: "_SocketServer"
+
+    def handle(self) -> None:
+        # Connections are persistent: one per web-worker thread.
+        while True:
+            try:
+                message = recv_frame(self.request)
+            except (OSError, ValueError):
+                return
+            if message is None:
+                return
+            reply = self.server.model_server.dispatch(message)
+            try:
+                send_frame(self.request, reply)
+            except OSError:
+                # The client timed out and hung up while this request ran.
+                return
+
+
+class _SocketServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    model_server: "ModelServer"
+
+
+class ModelServer:
+    """Serves ``ENGINE_METHODS`` and ``health`` for one engine over a Unix socket."""
+
+    def __init__(self, engine: Any, socket_path: Path) -> None:
+        self.engine = engine
+        self.socket_path = Path(socket_path)
+        self.started = time.time()
+        self.requests = 0
+        self.errors = 0
+        self._counter_lock = threading.Lock()
+
+    def dispatch(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        op = message.get("op")
+        if op == "health":
+            return {"ok": True, "result": self.health()}
+        if op not in ENGINE_METHODS:
+            return {"ok": False, "error": f"unknown op {op!r}", "error_type": "ValueError"}
+        with self._counter_lock:
+            self.requests += 1
+        try:
+            result = getattr(self.engine, op)(*message.get("args", []))
+        except Exception as exc:
+            with self._counter_lock:
+                self.errors += 1
+            return {"ok": False, "error": str(exc), "error_type": type(exc).__name__}
+        return {"ok": True, "result": result}
+
+    def health(self) -> Dict[str, Any]:
+        bundle = self.engine._bundle
+        batcher = self.engine.batcher
+        return {
+            "status": "ok" if bundle is not None else "loading",
+            "pid": os.getpid(),
+            "uptime_seconds": round(time.time() - self.started, 1),
+            "model_version": bundle.version if bundle else None,
+            "student_version": bundle.student_version if bundle else None,
+            "requests": self.requests,
+            "errors": self.errors,
+            "max_batch": batcher.max_batch_size,
+            "max_wait_ms": batcher.max_wait * 1000,
+        }
+
+    def serve_forever(self) -> None:
+        # Loaded before binding, so the first forwarded request never pays the cold start.
+        self.engine._ensure_loaded()
+        self.socket_path.parent.mkdir(parents=True, exist_ok=True)
+        self.socket_path.unlink(missing_ok=True)
+        with _SocketServer(str(self.socket_path), _Handler) as server:
+            server.model_server = self
+            print(f"✅ Model server listening on {self.socket_path} (pid {os.getpid()})")
+            try:
+                server.serve_forever()
+            finally:
+                self.socket_path.unlink(missing_ok=True)
+
+
+class ModelServerClient:
+    """Web-worker side of the sidecar, with one persistent connection per thread.
+
+    After a failure to connect or send, the client reports unavailable for
+    ``retry_after`` seconds without dialling, so a dead sidecar costs one
+    timeout per worker rather than one per request. A reply that is merely
+    late raises ``ModelServerTimeout`` and leaves the sidecar marked up.
+    Each call waits ``timeout`` plus ``row_timeout`` per row it scores.
+    """
+
+    def __init__(
+        self, socket_path: Path, timeout: float = 2.0, retry_after: float = 5.0, row_timeout: float = 0.001
+    ) -> None:
+        self.socket_path = str(socket_path)
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.row_timeout = row_timeout
+        self._local = threading.local()
+        self._down_until = 0.0
+
+    @classmethod
+    def from_env(cls) -> Optional["ModelServerClient"]:
+        path = os.environ.get("MODEL_SERVER_SOCKET")
+        if not path:
+            return None
+        return cls(
+            Path(path),
+            timeout=float(os.environ.get("MODEL_SERVER_TIMEOUT_MS", "2000")) / 1000,
+            retry_after=float(os.environ.get("MODEL_SERVER_RETRY_SECONDS", "5")),
+            row_timeout=float(os.environ.get("MODEL_SERVER_TIMEOUT_PER_ROW_MS", "1")) / 1000,
+        )
+
+    def _connect(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        self._local.sock = sock
+        return sock
+
+    def _drop_connection(self) -> None:
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            sock.close()
+            self._local.sock = None
+
+    def _exchange(self, message: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+        sock = getattr(self._local, "sock", None)
+        reused = sock is not None
+        try:
+            sock = sock or self._connect()
+            sock.settimeout(timeout)
+            send_frame(sock, message)
+        except (OSError, ValueError) as exc:
+            self._drop_connection()
+            if reused and not isinstance(exc, socket.timeout):
+                # The kept-alive connection may predate a sidecar restart; redial once.
+                return self._exchange(message, timeout)
+            raise
+        try:
+            reply = recv_frame(sock)
+            if reply is None:
+                raise ConnectionError("model server closed the connection")
+            return reply
+        except socket.timeout as exc:
+            # Sent, so the sidecar is up and busy with it. Its late reply would
+            # desync the framing, so the connection goes; the sidecar stays up.
+            self._drop_connection()
+            raise ModelServerTimeout(
+                f"model server at {self.socket_path} did not reply within {timeout:.1f}s"
+            ) from exc
+        except (OSError, ValueError):
+            self._drop_connection()
+            if reused:
+                return self._exchange(message, timeout)
+            raise
+
+    def call(self, message: Dict[str, Any], rows: int = 0) -> Dict[str, Any]:
+        if time.monotonic() < self._down_until:
+            raise ModelServerUnavailable(f"model server at {self.socket_path} marked down")
+        try:
+            return self._exchange(message, self.timeout + rows * self.row_timeout)
+        except (OSError, ValueError) as exc:
+            self._down_until = time.monotonic() + self.retry_after
+            logger.warning("Model server at %s unavailable (%s); using in-process inference for %.0fs",
+                           self.socket_path, exc, self.retry_after)
+            raise ModelServerUnavailable(f"model server at {self.socket_path}: {exc}") from exc
+
+    def invoke(self, method: str, *args: Any, rows: int = 1) -> Dict[str, Any]:
+        """Runs ``engine.<method>(*args)`` in the sidecar; arguments must be JSON-serializable.
+
+        ``rows`` is how many rows or grid points the call scores; it sizes the timeout.
+        """
+        return self._result(self.call({"op": method, "args": list(args)}, rows))
+
+    @staticmethod
+    def _result(reply: Dict[str, Any]) -> Dict[str, Any]:
+        if reply.get("ok"):
+            return reply["result"]
+        if reply.get("error_type") == "ValueError":
+            raise ValueError(reply.get("error"))
+        raise ModelServerUnavailable(f"model server failed: {reply.get('error')}")
+
+    def health(self) -> Dict[str, Any]:
+        return self.call({"op": "health"})["result"]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Local inference sidecar for AgroIntelligence.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    serve = subparsers.add_parser("serve", help="load the engine and listen on a Unix socket")
+    serve.add_argument("--socket", default=os.environ.get("MODEL_SERVER_SOCKET", "agro-model.sock"))
+    serve.add_argument("--max-batch", type=int, default=int(os.environ.get("INFERENCE_MAX_BATCH", "32")))
+    serve.add_argument("--max-wait-ms", type=float, default=float(os.environ.get("INFERENCE_MAX_WAIT_MS", "2")))
+    health = subparsers.add_parser("health", help="print the sidecar's health as JSON")
+    health.add_argument("--socket", default=os.environ.get("MODEL_SERVER_SOCKET", "agro-model.sock"))
+    args = parser.parse_args()
+
+    if args.command == "health":
+        client = ModelServerClient(Path(args.socket), retry_after=0)
+        try:
+            print(json.dumps(client.health(), indent=2))
+        except ModelServerUnavailable as exc:
+            print(exc, file=sys.stderr)
+            return 1
+        return 0
+
+    # The sidecar must not forward to itself.
+    os.environ.pop("MODEL_SERVER_SOCKET", None)
+    import app as agro_app
+    from batching import MicroBatcher
+
+    engine = agro_app.recommendation_engine
+    engine.batcher = MicroBatcher(max_batch_size=args.max_batch, max_wait_ms=args.max_wait_ms)
+    ModelServer(engine, Path(args.socket)).serve_forever()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,6 +3,7 @@
 
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
+from sqlalchemy import inspect
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
 import secrets
@@ -57,6 +58,8 @@ class User(UserMixin, db.Model):
 class Prediction(db.Model):
     """Model to store user predictions"""
     __tablename__ = 'predictions'
+    # History pages and exports read one user's rows newest-first
+    __table_args__ = (db.Index('ix_predictions_user_created', 'user_id', 'created_at'),)
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -106,3 +109,22 @@ class ContactMessage(db.Model):
     
     def __repr__(self):
         return f'<ContactMessage {self.id} from {self.name}>'
+
+
+def ensure_indexes():
+    """Creates model indexes missing from tables that already exist.
+
+    ``db.create_all()`` only builds indexes along with a new table, so an index
+    added to a model later never reaches an existing database without this.
+    """
+    inspector = inspect(db.engine)
+    created = []
+    for table in db.metadata.sorted_tables:
+        if not table.indexes or not inspector.has_table(table.name):
+            continue
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(bind=db.engine)
+                created.append(index.name)
+    return created
@@ -0,0 +1,137 @@
+# Opt-in slow-request profiling
+# This file will be imported by app.py
+
+from __future__ import annotations
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional, Set
+
+from flask import Flask, Response, g, request
+from flask_login import current_user
+
+PROFILE_HEADER = "X-Profile-Request"
+
+
+class RequestProfiler:
+    """Runs cProfile on selected requests and keeps the slow ones on disk.
+
+    Profiling is enabled for every request with ``PROFILE_REQUESTS=1``, or per
+    request by sending ``X-Profile-Request: 1`` as a user listed in
+    ``PROFILE_ALLOWED_USERS`` (emails or ids). Only requests slower than
+    ``PROFILE_THRESHOLD_MS`` are written; the directory keeps the newest
+    ``PROFILE_MAX_FILES`` captures.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        threshold_ms: float = 500.0,
+        max_files: int = 50,
+        always_on: bool = False,
+        allowed_users: Optional[Set[str]] = None,
+    ) -> None:
+        self.directory = directory
+        self.threshold_ms = threshold_ms
+        self.max_files = max_files
+        self.always_on = always_on
+        self.allowed_users = allowed_users or set()
+        self._rotate_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, default_directory: Path) -> "RequestProfiler":
+        allowed = os.environ.get("PROFILE_ALLOWED_USERS", "")
+        return cls(
+            directory=Path(os.environ.get("PROFILE_DIR", default_directory)),
+            threshold_ms=float(os.environ.get("PROFILE_THRESHOLD_MS", "500")),
+            max_files=int(os.environ.get("PROFILE_MAX_FILES", "50")),
+            always_on=os.environ.get("PROFILE_REQUESTS", "").lower() in {"1", "true", "yes"},
+            allowed_users={item.strip().lower() for item in allowed.split(",") if item.strip()},
+        )
+
+    @property
+    def active(self) -> bool:
+        return self.always_on or bool(self.allowed_users)
+
+    def init_app(self, app: Flask) -> None:
+        # Nothing is registered when profiling is off, so the disabled cost is zero.
+        if not self.active:
+            return
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    def _wants_profile(self) -> bool:
+        if self.always_on:
+            return True
+        if request.headers.get(PROFILE_HEADER) != "1":
+            return False
+        if not current_user.is_authenticated:
+            return False
+        identities = {str(current_user.id), (current_user.email or "").lower()}
+        return bool(identities & self.allowed_users)
+
+    def _before_request(self) -> None:
+        if not self._wants_profile():
+            return
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is already active on this interpreter.
+            return
+        g.request_profiler = profiler
+        g.request_profile_started = time.perf_counter()
+
+    def _after_request(self, response: Response) -> Response:
+        profiler = g.pop("request_profiler", None)
+        if profiler is None:
+            return response
+        profiler.disable()
+        elapsed_ms = (time.perf_counter() - g.pop("request_profile_started")) * 1000
+        if elapsed_ms >= self.threshold_ms:
+            self._write(profiler, elapsed_ms, response)
+        return response
+
+    def _write(self, profiler: cProfile.Profile, elapsed_ms: float, response: Response) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+        route = re.sub(r"[^A-Za-z0-9]+", "_", request.path).strip("_") or "root"
+        stem = self.directory / f"{stamp}_{request.method}_{route}_{int(elapsed_ms)}ms"
+
+        profiler.dump_stats(f"{stem}.prof")
+        summary = io.StringIO()
+        pstats.Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(40)
+        Path(f"{stem}.txt").write_text(summary.getvalue())
+
+        metadata: Dict[str, Any] = {
+            "timestamp": stamp,
+            "method": request.method,
+            "path": request.path,
+            "route": request.url_rule.rule if request.url_rule is not None else None,
+            "query": request.args.to_dict(),
+            "status": response.status_code,
+            "duration_ms": round(elapsed_ms, 2),
+            "threshold_ms": self.threshold_ms,
+            "user_id": current_user.get_id() if current_user else None,
+            "remote_addr": request.remote_addr,
+            "user_agent": request.headers.get("User-Agent"),
+            "server_timing": response.headers.get("Server-Timing"),
+            "pid": os.getpid(),
+        }
+        Path(f"{stem}.json").write_text(json.dumps(metadata, indent=2))
+        self._rotate()
+
+    def _rotate(self) -> None:
+        with self._rotate_lock:
+            captures = sorted(self.directory.glob("*.prof"))
+            for stale in captures[: max(0, len(captures) - self.max_files)]:
+                for suffix in (".prof", ".txt", ".json"):
+                    stale.with_suffix(suffix).unlink(missing_ok=True)
@@ -0,0 +1,50 @@
+# Green-thread (gevent) serving support
+# This file will be imported by app.py
+
+from __future__ import annotations
+
+import contextvars
+import os
+from typing import Any, Callable, TypeVar
+
+T = TypeVar("T")
+
+
+def green_mode() -> bool:
+    """True inside a gevent worker, i.e. once gevent has monkey-patched the socket module."""
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched("socket")
+
+
+class InferencePool:
+    """Keeps CPU-bound work off the gevent hub.
+
+    In a gevent worker every request is a greenlet on one OS thread, so
+    TensorFlow, pandas and KNN imputation would stall all of the worker's
+    connections, including those only waiting on Open-Meteo. ``run`` sends
+    such calls to gevent's pool of native threads and parks only the calling
+    greenlet. The request context travels with the call, so spans still reach
+    Server-Timing. Under sync and gthread workers each request already owns an
+    OS thread, and ``run`` calls straight through.
+    """
+
+    def __init__(self, threads: int = 4) -> None:
+        self.threads = max(1, threads)
+
+    @classmethod
+    def from_env(cls) -> "InferencePool":
+        return cls(threads=int(os.environ.get("INFERENCE_THREADS", "4")))
+
+    def run(self, func: Callable[..., T], *args: Any) -> T:
+        if not green_mode():
+            return func(*args)
+        import gevent
+
+        pool = gevent.get_hub().threadpool
+        if pool.maxsize != self.threads:
+            pool.maxsize = self.threads
+        context = contextvars.copy_context()
+        return pool.apply(context.run, (func, *args))
@@ -0,0 +1,260 @@
+# Cache backends shared by the services (weather, recommendations, district summaries)
+# This file will be imported by app.py
+
+from __future__ import annotations
+
+import abc
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import metrics
+
+# Expiry stored for entries without a TTL; sorts after every real deadline when evicting.
+NEVER = 1e300
+
+
+def _json_default(value: Any) -> Any:
+    # Dataset-derived values can be NumPy scalars.
+    if hasattr(value, "item"):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+class CacheBackend(abc.ABC):
+    """JSON-serializable values with optional TTLs, plus a per-key refresh lock.
+
+    ``get_or_compute`` is what services call. On a miss only the holder of
+    the key's refresh lock runs ``compute``. Other callers, in this process or
+    (for shared backends) any other worker, wait up to ``lock_timeout`` for
+    the value to appear, so a cold cache after a deploy makes one upstream
+    call per key rather than one per worker. ``None`` results are not cached.
+    """
+
+    def __init__(self, lock_timeout: float = 10.0, poll_interval: float = 0.05) -> None:
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+
+    @abc.abstractmethod
+    def get(self, key: str) -> Optional[Any]:
+        ...
+
+    @abc.abstractmethod
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ...
+
+    @abc.abstractmethod
+    def delete(self, key: str) -> None:
+        ...
+
+    @abc.abstractmethod
+    def _try_lock(self, key: str) -> bool:
+        ...
+
+    @abc.abstractmethod
+    def _unlock(self, key: str) -> None:
+        ...
+
+    def get_or_compute(self, key: str, compute: Callable[[], Optional[Any]], ttl: Optional[float] = None) -> Optional[Any]:
+        cache_name = key.split(":", 1)[0]
+        value = self.get(key)
+        metrics.registry.record_cache(cache_name, value is not None)
+        if value is not None:
+            return value
+
+        deadline = time.monotonic() + self.lock_timeout
+        while not self._try_lock(key):
+            time.sleep(self.poll_interval)
+            value = self.get(key)
+            if value is not None:
+                return value
+            if time.monotonic() > deadline:
+                # The holder is stuck or gone; computing beats failing the request.
+                metrics.registry.inc("agro_cache_lock_timeouts_total", cache=cache_name)
+                return compute()
+        try:
+            value = self.get(key)  # filled while we were acquiring
+            if value is None:
+                value = compute()
+                if value is not None:
+                    self.set(key, value, ttl)
+            return value
+        finally:
+            self._unlock(key)
+
+
+class NullCache(CacheBackend):
+    """Caching switched off: every call computes."""
+
+    def get(self, key: str) -> Optional[Any]:
+        return None
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        pass
+
+    def delete(self, key: str) -> None:
+        pass
+
+    def _try_lock(self, key: str) -> bool:
+        return True
+
+    def _unlock(self, key: str) -> None:
+        pass
+
+
+class MemoryCache(CacheBackend):
+    """Per-process LRU with TTLs; each gunicorn worker warms its own copy."""
+
+    def __init__(self, max_entries: int = 10000, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._locked: set = set()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, payload = entry
+            if expires < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+        # Stored serialized so callers can never mutate a cached value in place.
+        return json.loads(payload)
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        payload = json.dumps(value, default=_json_default)
+        expires = time.time() + ttl if ttl else NEVER
+        with self._lock:
+            self._entries[key] = (expires, payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def _try_lock(self, key: str) -> bool:
+        with self._lock:
+            if key in self._locked:
+                return False
+            self._locked.add(key)
+            return True
+
+    def _unlock(self, key: str) -> None:
+        with self._lock:
+            self._locked.discard(key)
+
+
+class SQLiteCache(CacheBackend):
+    """One SQLite file in WAL mode shared by every worker on the host, and kept across restarts.
+
+    Readers never block the writer under WAL. Refresh locks are rows in a
+    second table with their own expiry, so a worker killed mid-refresh
+    cannot wedge a key. When the table grows past ``max_entries``, the
+    entries closest to expiry are evicted first.
+    """
+
+    def __init__(self, path: Path, max_entries: int = 10000, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._writes = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_cache_expires ON cache (expires)")
+            conn.execute("CREATE TABLE IF NOT EXISTS refresh_locks (key TEXT PRIMARY KEY, expires REAL NOT NULL)")
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per thread and per process: connections must not cross a fork.
+        conn: Optional[sqlite3.Connection] = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        conn = sqlite3.connect(str(self.path), timeout=5.0, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key: str) -> Optional[Any]:
+        row = self._connect().execute(
+            "SELECT value FROM cache WHERE key = ? AND expires > ?", (key, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        payload = json.dumps(value, default=_json_default)
+        expires = time.time() + ttl if ttl else NEVER
+        conn = self._connect()
+        conn.execute("INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)", (key, payload, expires))
+        self._writes += 1
+        if self._writes % 100 == 0:
+            self._prune(conn)
+
+    def _prune(self, conn: sqlite3.Connection) -> None:
+        conn.execute("DELETE FROM cache WHERE expires <= ?", (time.time(),))
+        (count,) = conn.execute("SELECT COUNT(*) FROM cache").fetchone()
+        if count > self.max_entries:
+            conn.execute(
+                "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY expires LIMIT ?)",
+                (count - self.max_entries,),
+            )
+
+    def delete(self, key: str) -> None:
+        self._connect().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def _try_lock(self, key: str) -> bool:
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+        except sqlite3.OperationalError:
+            # "database is locked": another worker held the write lock past the busy timeout.
+            # Nothing was started, so there is nothing to roll back; get_or_compute polls again.
+            return False
+        try:
+            conn.execute("DELETE FROM refresh_locks WHERE key = ? AND expires <= ?", (key, now))
+            acquired = conn.execute(
+                "INSERT OR IGNORE INTO refresh_locks (key, expires) VALUES (?, ?)", (key, now + self.lock_timeout)
+            ).rowcount == 1
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return acquired
+
+    def _unlock(self, key: str) -> None:
+        self._connect().execute("DELETE FROM refresh_locks WHERE key = ?", (key,))
+
+
+def cache_from_env(default_path: Path) -> CacheBackend:
+    """``CACHE_BACKEND`` is ``sqlite`` (default, shared across workers), ``memory`` (per worker) or ``none``.
+
+    SQLite is the default because it needs no external service and is the only
+    backend that lets every gunicorn worker, and the next deploy, reuse one
+    warm cache instead of each calling Open-Meteo for itself.
+    """
+    backend = os.environ.get("CACHE_BACKEND", "sqlite").lower()
+    options: Dict[str, Any] = {"lock_timeout": float(os.environ.get("CACHE_LOCK_TIMEOUT", "10"))}
+    max_entries = int(os.environ.get("CACHE_MAX_ENTRIES", "10000"))
+    if backend == "none":
+        return NullCache(**options)
+    if backend == "sqlite":
+        return SQLiteCache(Path(os.environ.get("CACHE_PATH", default_path)), max_entries=max_entries, **options)
+    if backend != "memory":
+        raise ValueError(f"CACHE_BACKEND must be memory, sqlite or none, not {backend!r}")
+    return MemoryCache(max_entries=max_entries, **options)
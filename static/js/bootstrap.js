@@ -0,0 +1,81 @@
+// Shared district, mandal, default and scheme data for every page.
+// Fetched once per data version from /api/bootstrap and kept in localStorage,
+// so district lists and district changes need no network round trip.
+const AgroBootstrap = (() => {
+    const STORAGE_KEY = "agro-bootstrap";
+    let pending = null;
+
+    // Version of the bundle the server currently serves, rendered into base.html
+    function currentVersion() {
+        const meta = document.querySelector('meta[name="bootstrap-version"]');
+        return meta ? meta.content : "";
+    }
+
+    function readCache(version) {
+        try {
+            const cached = JSON.parse(localStorage.getItem(STORAGE_KEY));
+            if (cached && version && cached.version === version) return cached.data;
+        } catch (err) {
+            // Storage disabled or corrupt; fall through to the network.
+        }
+        return null;
+    }
+
+    async function fetchBundle(version) {
+        const response = await fetch(`/api/bootstrap?v=${encodeURIComponent(version)}`);
+        if (!response.ok) throw new Error("Unable to load district data.");
+        const data = await response.json();
+        // Compressed responses carry the same tag marked weak (W/"...")
+        const served = (response.headers.get("ETag") || "").replace(/^W\//, "").replace(/"/g, "") || version;
+        try {
+            localStorage.setItem(STORAGE_KEY, JSON.stringify({ version: served, data }));
+        } catch (err) {
+            // Quota exceeded or private mode; the in-memory copy still works.
+        }
+        return data;
+    }
+
+    function expand(fields, district, values) {
+        const summary = { district };
+        fields.forEach((field, idx) => {
+            summary[field] = values[idx];
+        });
+        return summary;
+    }
+
+    function wrap(data) {
+        const districts = Object.keys(data.districts).sort();
+        return {
+            districts,
+            schemes: data.schemes,
+            // Same shape as /get_district_data/<district>
+            districtData(district) {
+                const entry = data.districts[district];
+                if (!entry) return null;
+                return { ...expand(data.fields, district, entry.defaults), mandals: entry.mandals };
+            },
+            // Same shape as /auto_defaults: seasonal defaults, else district-wide
+            autoDefaults(district, season) {
+                const entry = data.districts[district];
+                if (!entry) return null;
+                const values = (season && entry.seasons[season]) || entry.defaults;
+                return expand(data.fields, district, values);
+            },
+        };
+    }
+
+    function load() {
+        if (!pending) {
+            pending = (async () => {
+                const version = currentVersion();
+                return wrap(readCache(version) || (await fetchBundle(version)));
+            })();
+            pending.catch(() => {
+                pending = null;
+            });
+        }
+        return pending;
+    }
+
+    return { load };
+})();
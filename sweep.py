@@ -0,0 +1,236 @@
+# sweep.py
+"""Parallel hyperparameter sweep for the crop recommendation MLP.
+
+The dataset is preprocessed once and written to memory-mapped ``.npy`` files
+that every worker process maps read-only, so candidates share one copy of the
+feature matrix while training in parallel.
+
+Usage:
+    python sweep.py --workers 4 --out sweeps/run1
+    python sweep.py --space space.json --samples 12 --export-best
+"""
+import argparse
+import itertools
+import json
+import logging
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+DEFAULT_SPACE = {
+    'hidden_units': [[128, 64], [256, 128], [64, 32], [256, 128, 64]],
+    'dropout': [0.2, 0.3],
+    'optimizer': ['adam', 'rmsprop'],
+    'learning_rate': [0.001],
+    'batch_size': [256],
+}
+
+LEADERBOARD_FIELDS = ['rank', 'candidate', 'macro_f1', 'accuracy', 'top3_accuracy', 'latency_ms',
+                      'epochs', 'train_seconds', 'num_classes', 'min_samples', 'params']
+
+
+def expand_space(space, samples=None, seed=42):
+    """Grid over the search space, optionally sub-sampled to ``samples`` candidates."""
+    keys = sorted(space)
+    grid = [dict(zip(keys, values)) for values in itertools.product(*(space[key] for key in keys))]
+    if samples and samples < len(grid):
+        grid = random.Random(seed).sample(grid, samples)
+    return grid
+
+
+def prepare_shared_data(data_path, work_dir, min_samples=100):
+    """Preprocesses once and writes memory-mappable arrays for the workers.
+
+    The ``min_samples`` crop filter is applied here, once for the whole sweep,
+    so every candidate trains on the same classes and is scored on the same
+    held-out rows.
+    """
+    from train_model import load_and_preprocess_data
+
+    X, y = load_and_preprocess_data(data_path)
+    counts = y.value_counts()
+    kept = y.isin(counts[counts >= min_samples].index)
+    if y[kept].nunique() < 2:
+        raise ValueError(f"min_samples={min_samples} leaves fewer than two crops to classify")
+    X, y = X[kept.to_numpy()], y[kept]
+    labels, crops = pd.factorize(y, sort=True)
+    work_dir.mkdir(parents=True, exist_ok=True)
+    np.save(work_dir / 'X.npy', np.ascontiguousarray(X.to_numpy(dtype=np.float32)))
+    np.save(work_dir / 'y.npy', labels.astype(np.int32))
+    meta = {'crops': [str(crop) for crop in crops], 'feature_cols': list(X.columns), 'min_samples': min_samples}
+    (work_dir / 'meta.json').write_text(json.dumps(meta))
+    logging.info(f"Shared arrays written to {work_dir} ({X.shape[0]} rows x {X.shape[1]} features, "
+                 f"{len(crops)} crops with >= {min_samples} samples)")
+    return meta
+
+
+def _init_worker(threads):
+    os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+
+def run_candidate(job):
+    """Trains and scores one candidate inside a worker process."""
+    from sklearn.model_selection import StratifiedShuffleSplit
+    from evaluation import Evaluator, holdout_split
+    from train_model import build_model, fit_model, make_dataset, save_model
+
+    work_dir = Path(job['work_dir'])
+    params = job['params']
+    X_all = np.load(work_dir / 'X.npy', mmap_mode='r')
+    y = np.asarray(np.load(work_dir / 'y.npy', mmap_mode='r'))
+    meta = json.loads((work_dir / 'meta.json').read_text())
+    crops = meta['crops']
+
+    # Same labels and seed for every candidate, so all of them are scored on the same held-out rows.
+    fit_idx, test_idx = holdout_split(y, job['test_size'])
+    inner = StratifiedShuffleSplit(n_splits=1, test_size=job['val_size'], random_state=42)
+    train_pos, val_pos = next(inner.split(fit_idx, y[fit_idx]))
+    train_idx, val_idx = fit_idx[train_pos], fit_idx[val_pos]
+
+    model = build_model(X_all.shape[1], len(crops), hidden_units=tuple(params['hidden_units']),
+                        dropout=params['dropout'], optimizer=params['optimizer'],
+                        learning_rate=params.get('learning_rate'))
+    started = time.perf_counter()
+    model = fit_model(
+        model,
+        make_dataset(X_all[train_idx], y[train_idx], params['batch_size'], shuffle=True),
+        make_dataset(X_all[val_idx], y[val_idx], params['batch_size']),
+        epochs=job['epochs'],
+        patience=job['patience'],
+    )
+    train_seconds = time.perf_counter() - started
+    epochs_run = len(model.history.history['loss'])
+
+    X_test, y_test = np.asarray(X_all[test_idx]), y[test_idx]
+    evaluator = Evaluator(crops, ks=(1, 3))
+    evaluator.update(model.predict(X_test, batch_size=4096, verbose=0), y_test)
+    report = evaluator.result()
+
+    single_row = X_test[:1]
+    model(single_row, training=False)
+    timings = []
+    for _ in range(50):
+        start = time.perf_counter()
+        model(single_row, training=False)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    prefix = Path(job['out_dir']) / f"candidate_{job['index']:03d}"
+    save_model(model, np.array(crops), meta['feature_cols'], prefix=str(prefix))
+    return {
+        'candidate': job['index'],
+        'params': params,
+        'accuracy': round(report['accuracy'], 4),
+        'macro_f1': round(report['macro_f1'], 4),
+        'top3_accuracy': round(report['top_k_accuracy']['3'], 4),
+        'latency_ms': round(float(np.median(timings)), 3),
+        'epochs': epochs_run,
+        'train_seconds': round(train_seconds, 1),
+        'num_classes': len(crops),
+        'min_samples': meta['min_samples'],
+        'artifact': str(prefix),
+    }
+
+
+def write_leaderboard(results, out_dir):
+    ranked = sorted(results, key=lambda item: (item['macro_f1'], item['accuracy']), reverse=True)
+    for rank, item in enumerate(ranked, start=1):
+        item['rank'] = rank
+    (out_dir / 'leaderboard.json').write_text(json.dumps(ranked, indent=2))
+    table = pd.DataFrame([{**item, 'params': json.dumps(item['params'])} for item in ranked])
+    table[LEADERBOARD_FIELDS].to_csv(out_dir / 'leaderboard.csv', index=False)
+    return ranked
+
+
+def export_candidate(result, prefix='croprecommender_mlp'):
+    """Copies a candidate's artifacts to the filenames the app loads.
+
+    Each file is written next to its target and renamed over it, so the app's
+    reload watcher never sees a half-copied model.
+    """
+    for suffix in ('.npz', '.h5'):
+        target = Path(prefix + suffix)
+        partial = target.with_name(f'.{target.name}.partial')
+        partial.write_bytes(Path(result['artifact'] + suffix).read_bytes())
+        os.replace(partial, target)
+    logging.info(f"Exported candidate {result['candidate']} to {prefix}.h5/.npz")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Parallel hyperparameter sweep for the crop MLP.")
+    parser.add_argument('--data', default='apcrop_dataset_realistic.csv')
+    parser.add_argument('--space', type=Path, help="JSON object mapping each parameter to a list of values")
+    parser.add_argument('--samples', type=int, help="randomly sample this many candidates from the grid")
+    parser.add_argument('--min-samples', type=int, default=100,
+                        help="drop crops with fewer rows than this; fixed for the whole sweep")
+    parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument('--threads-per-worker', type=int, default=0, help="0 = cores / workers")
+    parser.add_argument('--epochs', type=int, default=60)
+    parser.add_argument('--patience', type=int, default=5)
+    parser.add_argument('--val-size', type=float, default=0.1)
+    parser.add_argument('--test-size', type=float, default=0.2)
+    parser.add_argument('--out', type=Path, default=Path('sweeps') / time.strftime('%Y%m%d-%H%M%S'))
+    parser.add_argument('--export-best', action='store_true', help="overwrite croprecommender_mlp.* with the winner")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    space = {**DEFAULT_SPACE, **(json.loads(args.space.read_text()) if args.space else {})}
+    if 'min_samples' in space:
+        # Candidates filtered differently would be scored on different held-out rows.
+        raise SystemExit("min_samples cannot be swept; pass --min-samples to fix it for the whole sweep")
+    candidates = expand_space(space, args.samples)
+    args.out.mkdir(parents=True, exist_ok=True)
+    threads = args.threads_per_worker or max(1, (os.cpu_count() or 1) // args.workers)
+    logging.info(f"Sweeping {len(candidates)} candidates on {args.workers} workers x {threads} threads")
+
+    prepare_shared_data(args.data, args.out / 'shared', args.min_samples)
+    jobs = [
+        {'index': index, 'params': params, 'work_dir': str(args.out / 'shared'), 'out_dir': str(args.out),
+         'epochs': args.epochs, 'patience': args.patience, 'val_size': args.val_size, 'test_size': args.test_size}
+        for index, params in enumerate(candidates)
+    ]
+
+    results = []
+    started = time.perf_counter()
+    # TensorFlow is not fork-safe, so workers are spawned fresh.
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=get_context('spawn'),
+                             initializer=_init_worker, initargs=(threads,)) as pool:
+        futures = {pool.submit(run_candidate, job): job for job in jobs}
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                result = future.result()
+            except Exception:
+                logging.exception(f"Candidate {job['index']} failed: {job['params']}")
+                continue
+            results.append(result)
+            logging.info(f"Candidate {result['candidate']}: macro-F1={result['macro_f1']:.3f} "
+                         f"acc={result['accuracy']:.3f} top3={result['top3_accuracy']:.3f} "
+                         f"latency={result['latency_ms']:.2f}ms {result['params']}")
+
+    if not results:
+        logging.error("No candidate finished successfully.")
+        return 1
+    ranked = write_leaderboard(results, args.out)
+    logging.info(f"Sweep finished in {time.perf_counter() - started:.1f}s; leaderboard in {args.out}/leaderboard.csv")
+    best = ranked[0]
+    logging.info(f"Best: candidate {best['candidate']} macro-F1={best['macro_f1']:.3f} {best['params']}")
+    if args.export_best:
+        export_candidate(best)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -1,11 +1,14 @@
 # train_model.py
+import argparse
+import json
+import time
 import pandas as pd
 import numpy as np
 import tensorflow as tf
 from sklearn.model_selection import StratifiedShuffleSplit
 from sklearn.preprocessing import LabelEncoder
 from sklearn.impute import KNNImputer
-from sklearn.metrics import f1_score, accuracy_score
+from evaluation import Evaluator, HOLDOUT_TEST_SIZE, evaluate, holdout_split, log_report
 import logging
 import os
 import random
@@ -17,15 +20,16 @@ np.random.seed(42)
 random.seed(42)
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
 
+EXCLUDE_COLUMNS = ['Year', 'Suitable_Crops', 'Fertilizer_Plan', 'Irrigation_Plan',
+                   'Market_Price_Index', 'Previous_Crop']
+
 def load_and_preprocess_data(file_path):
     """Loads and preprocesses the dataset robustly."""
     logging.info("[Step 1] Loading dataset...")
     df = pd.read_csv(file_path)
 
     # Remove columns not needed
-    exclude_cols = ['Year', 'Suitable_Crops', 'Fertilizer_Plan', 'Irrigation_Plan', 
-                    'Market_Price_Index', 'Previous_Crop']
-    df = df.drop(columns=exclude_cols, errors='ignore')
+    df = df.drop(columns=EXCLUDE_COLUMNS, errors='ignore')
 
     # Check target column
     if 'Primary_Crop' not in df.columns:
@@ -97,55 +101,275 @@ def filter_and_label_data(X, y, min_samples=100):
     logging.info(f"Filtered dataset shape: X={X_filtered.shape}, y={len(y_encoded)}, classes={len(le.classes_)}")
     return X_filtered, y_encoded, le.classes_, list(X_filtered.columns)
 
-def train_model(X, y, num_classes, feature_cols):
-    """Builds and trains the MLP model."""
-    logging.info("[Step 6] Building MLP model...")
-    model = tf.keras.models.Sequential([
-        tf.keras.layers.Dense(128, activation='relu', input_shape=(X.shape[1],)),
-        tf.keras.layers.Dropout(0.3),
-        tf.keras.layers.Dense(64, activation='relu'),
-        tf.keras.layers.Dropout(0.3),
-        tf.keras.layers.Dense(num_classes, activation='softmax')
-    ])
-
-    model.compile(optimizer='adam',
+def configure_threads(intra_op_threads=0, inter_op_threads=0):
+    """Pins TensorFlow's thread pools; must run before any op executes (0 = TF default)."""
+    tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+    tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+    logging.info(f"TensorFlow threads: intra_op={intra_op_threads or 'auto'}, inter_op={inter_op_threads or 'auto'}")
+
+def split_train_validation(X, y, val_size=0.1, seed=42):
+    """Stratified split that holds out a validation set for early stopping."""
+    ss = StratifiedShuffleSplit(n_splits=1, test_size=val_size, random_state=seed)
+    train_idx, val_idx = next(ss.split(X, y))
+    return X.iloc[train_idx], X.iloc[val_idx], y[train_idx], y[val_idx]
+
+def make_dataset(X, y, batch_size, shuffle=False, seed=42):
+    """Builds a cached, prefetching tf.data pipeline from in-memory features."""
+    features = np.asarray(X, dtype=np.float32)
+    labels = np.asarray(y, dtype=np.int32)
+    dataset = tf.data.Dataset.from_tensor_slices((features, labels)).cache()
+    if shuffle:
+        dataset = dataset.shuffle(len(labels), seed=seed, reshuffle_each_iteration=True)
+    return dataset.batch(batch_size).prefetch(tf.data.AUTOTUNE)
+
+def build_model(input_dim, num_classes, hidden_units=(128, 64), dropout=0.3,
+                optimizer='adam', learning_rate=None):
+    """Builds and compiles the MLP; the defaults are the shipped architecture."""
+    layers = []
+    for index, units in enumerate(hidden_units):
+        kwargs = {'input_shape': (input_dim,)} if index == 0 else {}
+        layers.append(tf.keras.layers.Dense(units, activation='relu', **kwargs))
+        if dropout:
+            layers.append(tf.keras.layers.Dropout(dropout))
+    layers.append(tf.keras.layers.Dense(num_classes, activation='softmax'))
+    model = tf.keras.models.Sequential(layers)
+
+    if learning_rate is not None:
+        optimizer = tf.keras.optimizers.get({'class_name': optimizer,
+                                             'config': {'learning_rate': learning_rate}})
+    model.compile(optimizer=optimizer,
                   loss='sparse_categorical_crossentropy',
                   metrics=['accuracy'])
+    return model
 
-    logging.info("[Step 7] Training model...")
-    model.fit(X, y, epochs=100, batch_size=32, verbose=1)
+def fit_model(model, train_ds, val_ds=None, epochs=100, patience=8, checkpoint_dir=None):
+    """Fits on tf.data inputs with early stopping and resumable checkpoints.
+
+    With a validation set, training stops once ``val_loss`` has not improved for
+    ``patience`` epochs and the best weights are restored. With ``checkpoint_dir``,
+    an interrupted run resumes from the last completed epoch.
+    """
+    callbacks = []
+    if val_ds is not None:
+        callbacks.append(tf.keras.callbacks.EarlyStopping(
+            monitor='val_loss', patience=patience, restore_best_weights=True, verbose=1))
+    if checkpoint_dir:
+        # Keeps the last finished epoch on disk and is cleared after a successful run.
+        callbacks.append(tf.keras.callbacks.BackupAndRestore(backup_dir=str(checkpoint_dir)))
+
+    started = time.perf_counter()
+    history = model.fit(train_ds, validation_data=val_ds, epochs=epochs, callbacks=callbacks, verbose=2)
+    elapsed = time.perf_counter() - started
+
+    epochs_run = len(history.history['loss'])
+    summary = f"Training finished in {elapsed:.1f}s over {epochs_run} epochs ({elapsed / max(epochs_run, 1):.2f}s/epoch)"
+    if 'val_loss' in history.history:
+        best_epoch = int(np.argmin(history.history['val_loss']))
+        summary += (f" | best epoch {best_epoch + 1}: val_loss={history.history['val_loss'][best_epoch]:.4f}, "
+                    f"val_accuracy={history.history['val_accuracy'][best_epoch]:.3f}")
+    logging.info(summary)
     return model
 
-def evaluate_model(model, X, y, classes):
-    """Evaluates model performance."""
-    logging.info("[Step 8] Evaluating model...")
-    ss = StratifiedShuffleSplit(n_splits=1, test_size=0.2, random_state=42)
-    train_idx, test_idx = next(ss.split(X, y))
+def train_model(X, y, num_classes, feature_cols, X_val=None, y_val=None, epochs=100,
+                batch_size=256, patience=8, checkpoint_dir=None):
+    """Builds and trains the MLP model on in-memory features."""
+    logging.info("[Step 6] Building MLP model...")
+    model = build_model(X.shape[1], num_classes)
+
+    train_ds = make_dataset(X, y, batch_size, shuffle=True)
+    val_ds = make_dataset(X_val, y_val, batch_size) if X_val is not None else None
+
+    logging.info(f"[Step 7] Training model (max {epochs} epochs, batch size {batch_size})...")
+    return fit_model(model, train_ds, val_ds, epochs=epochs, patience=patience, checkpoint_dir=checkpoint_dir)
+
+def scan_dataset(file_path, chunksize=50_000, min_samples=100):
+    """First streaming pass: vocabularies, imputation means and class counts.
 
-    X_train, X_test = X.iloc[train_idx], X.iloc[test_idx]
-    y_train, y_test = y[train_idx], y[test_idx]
+    Only running sums and value sets are kept, so memory is bounded by
+    ``chunksize`` rather than by the file. Numeric gaps are filled with the
+    column mean here because KNN imputation needs the whole matrix in memory.
+    """
+    logging.info(f"[Stream 1] Scanning {file_path} in chunks of {chunksize} rows...")
+    sums, counts = {}, {}
+    vocab = {}
+    class_counts = {}
+    numeric_cols, categorical_cols = None, None
+    n_rows = 0
 
-    predictions = model.predict(X_test)
-    y_pred = np.argmax(predictions, axis=1)
+    for chunk in pd.read_csv(file_path, chunksize=chunksize):
+        chunk = chunk.drop(columns=EXCLUDE_COLUMNS, errors='ignore')
+        if 'Primary_Crop' not in chunk.columns:
+            raise ValueError("❌ 'Primary_Crop' column is missing in the dataset!")
+        features = chunk.drop(columns='Primary_Crop')
+        if numeric_cols is None:
+            numeric_cols = features.select_dtypes(include=np.number).columns.tolist()
+            categorical_cols = [c for c in features.columns if c not in numeric_cols]
+        for col in numeric_cols:
+            values = pd.to_numeric(features[col], errors='coerce')
+            sums[col] = sums.get(col, 0.0) + float(values.sum())
+            counts[col] = counts.get(col, 0) + int(values.notna().sum())
+        for col in categorical_cols:
+            vocab.setdefault(col, set()).update(features[col].fillna("Unknown").astype(str).unique())
+        for crop, count in chunk['Primary_Crop'].value_counts().items():
+            class_counts[crop] = class_counts.get(crop, 0) + int(count)
+        n_rows += len(chunk)
+
+    fully_empty = [col for col in numeric_cols if counts[col] == 0]
+    if fully_empty:
+        logging.warning(f"Dropping fully empty numeric columns: {fully_empty}")
+    numeric_cols = [col for col in numeric_cols if counts[col] > 0]
+    categorical_vocab = {col: sorted(vocab[col]) for col in categorical_cols}
+    # Matches pd.get_dummies(drop_first=True) on the full frame: sorted categories, first dropped.
+    feature_cols = list(numeric_cols) + [
+        f"{col}_{value}" for col in categorical_cols for value in categorical_vocab[col][1:]
+    ]
+    classes = np.array(sorted(crop for crop, count in class_counts.items() if count >= min_samples))
+
+    logging.info(f"Scanned {n_rows} rows: {len(feature_cols)} features, {len(classes)} classes kept")
+    return {
+        'numeric_cols': numeric_cols,
+        'numeric_fill': {col: sums[col] / counts[col] for col in numeric_cols},
+        'categorical_cols': categorical_cols,
+        'categorical_vocab': categorical_vocab,
+        'feature_cols': feature_cols,
+        'classes': classes,
+        'n_rows': n_rows,
+    }
+
+def encode_chunk(chunk, schema):
+    """Encodes one raw chunk into (float32 features, int32 labels) using a scanned schema."""
+    classes = schema['classes']
+    labels = pd.Categorical(chunk['Primary_Crop'], categories=classes).codes
+    keep = labels >= 0
+    chunk, labels = chunk[keep], labels[keep]
+
+    X = np.zeros((len(chunk), len(schema['feature_cols'])), dtype=np.float32)
+    for i, col in enumerate(schema['numeric_cols']):
+        values = pd.to_numeric(chunk[col], errors='coerce')
+        X[:, i] = values.fillna(schema['numeric_fill'][col]).to_numpy(dtype=np.float32)
+
+    offset = len(schema['numeric_cols'])
+    rows = np.arange(len(chunk))
+    for col in schema['categorical_cols']:
+        vocab = schema['categorical_vocab'][col]
+        codes = pd.Categorical(chunk[col].fillna("Unknown").astype(str), categories=vocab).codes
+        hit = codes > 0  # code 0 is the dropped reference category, -1 is unseen
+        X[rows[hit], offset + codes[hit] - 1] = 1.0
+        offset += len(vocab) - 1
+    return X, labels.astype(np.int32)
+
+def stream_batches(file_path, schema, chunksize, batch_size, holdout_every=10, split='train', seed=42):
+    """Yields encoded mini-batches read chunk by chunk from disk.
 
-    acc = accuracy_score(y_test, y_pred)
-    f1 = f1_score(y_test, y_pred, average='macro')
+    Row position decides the split: every ``holdout_every``-th row is
+    validation, the row after it is test, and the rest is train, so the
+    splits never overlap without keeping an index in memory.
+    """
+    rng = np.random.default_rng(seed)
+    row_offset = 0
+    for chunk in pd.read_csv(file_path, chunksize=chunksize):
+        positions = np.arange(row_offset, row_offset + len(chunk)) % holdout_every
+        row_offset += len(chunk)
+        if split == 'validation':
+            chunk = chunk[positions == 0]
+        elif split == 'test':
+            chunk = chunk[positions == 1]
+        else:
+            chunk = chunk[positions > 1]
+        X, y = encode_chunk(chunk, schema)
+        if split == 'train':
+            order = rng.permutation(len(y))
+            X, y = X[order], y[order]
+        for start in range(0, len(y), batch_size):
+            yield X[start:start + batch_size], y[start:start + batch_size]
+
+def make_streaming_dataset(file_path, schema, chunksize, batch_size, holdout_every=10, split='train'):
+    n_features = len(schema['feature_cols'])
+    dataset = tf.data.Dataset.from_generator(
+        lambda: stream_batches(file_path, schema, chunksize, batch_size, holdout_every, split),
+        output_signature=(
+            tf.TensorSpec(shape=(None, n_features), dtype=tf.float32),
+            tf.TensorSpec(shape=(None,), dtype=tf.int32),
+        ),
+    )
+    if split == 'train':
+        # Mixes batches across chunk boundaries without materialising the epoch.
+        dataset = dataset.shuffle(8)
+    return dataset.prefetch(tf.data.AUTOTUNE)
+
+def train_streaming(file_path, chunksize=50_000, min_samples=100, epochs=100, batch_size=256,
+                    patience=8, val_size=0.1, checkpoint_dir=None):
+    """Out-of-core training: peak memory is bounded by ``chunksize``, not by the dataset."""
+    schema = scan_dataset(file_path, chunksize, min_samples)
+    holdout_every = max(3, int(round(1 / val_size)))
+    train_ds = make_streaming_dataset(file_path, schema, chunksize, batch_size, holdout_every)
+    val_ds = make_streaming_dataset(file_path, schema, chunksize, batch_size, holdout_every, split='validation')
+
+    logging.info("[Stream 2] Building MLP model...")
+    model = build_model(len(schema['feature_cols']), len(schema['classes']))
+    logging.info(f"[Stream 3] Training from disk (max {epochs} epochs, batch size {batch_size})...")
+    model = fit_model(model, train_ds, val_ds, epochs=epochs, patience=patience, checkpoint_dir=checkpoint_dir)
 
-    top3_hits = sum(1 for i in range(len(y_test)) 
-                    if y_test[i] in predictions[i].argsort()[-3:][::-1])
-    top3_acc = top3_hits / len(y_test)
+    logging.info("[Stream 4] Evaluating model on the held-out test rows...")
+    evaluator = Evaluator(schema['classes'])
+    for X_batch, y_batch in stream_batches(file_path, schema, chunksize, 65536, holdout_every, split='test'):
+        evaluator.update(model.predict(X_batch, batch_size=8192, verbose=0), y_batch)
+    report = evaluator.result()
+    log_report(report)
+    return model, schema, report
 
-    logging.info(f"Accuracy: {acc:.3f} | Macro-F1: {f1:.3f} | Top-3 Accuracy: {top3_acc:.3f}")
+def evaluate_model(model, X_test, y_test, classes):
+    """Evaluates model performance on rows the model never saw during training."""
+    logging.info("[Step 8] Evaluating model on the held-out test split...")
+    report = evaluate(model, X_test, y_test, classes)
+    log_report(report)
+    return report
 
-def save_model(model, classes, feature_cols):
+def save_model(model, classes, feature_cols, prefix='croprecommender_mlp'):
     """Saves model and metadata."""
     logging.info("[Step 9] Saving model...")
-    model.save('croprecommender_mlp.h5')
-    np.savez('croprecommender_mlp.npz', classes=classes, feature_cols=feature_cols)
+    model.save(f'{prefix}.h5')
+    np.savez(f'{prefix}.npz', classes=classes, feature_cols=feature_cols)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Train the crop recommendation MLP.")
+    parser.add_argument('--data', default='apcrop_dataset_realistic.csv')
+    parser.add_argument('--epochs', type=int, default=100, help="upper bound; early stopping usually ends sooner")
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--patience', type=int, default=8)
+    parser.add_argument('--val-size', type=float, default=0.1)
+    parser.add_argument('--test-size', type=float, default=HOLDOUT_TEST_SIZE,
+                        help="held-out share for the final metrics (evaluation.py --split test reproduces it)")
+    parser.add_argument('--report', help="write the test-set evaluation report as JSON")
+    parser.add_argument('--checkpoint-dir', default='checkpoints', help="resume directory; pass '' to disable")
+    parser.add_argument('--stream', action='store_true', help="train out-of-core from CSV chunks")
+    parser.add_argument('--chunksize', type=int, default=50_000, help="rows per CSV chunk in --stream mode")
+    parser.add_argument('--intra-op-threads', type=int, default=0)
+    parser.add_argument('--inter-op-threads', type=int, default=0)
+    return parser.parse_args()
 
 if __name__ == '__main__':
-    X_initial, y_initial = load_and_preprocess_data('apcrop_dataset_realistic.csv')
-    X_filtered, y_encoded, classes, feature_cols = filter_and_label_data(X_initial, y_initial)
-    model = train_model(X_filtered, y_encoded, len(classes), feature_cols)
-    evaluate_model(model, X_filtered, y_encoded, classes)
-    save_model(model, classes, feature_cols)
+    args = parse_args()
+    configure_threads(args.intra_op_threads, args.inter_op_threads)
+    run_started = time.perf_counter()
+
+    if args.stream:
+        model, schema, report = train_streaming(args.data, chunksize=args.chunksize, epochs=args.epochs,
+                                        batch_size=args.batch_size, patience=args.patience,
+                                        val_size=args.val_size, checkpoint_dir=args.checkpoint_dir or None)
+        save_model(model, schema['classes'], schema['feature_cols'])
+    else:
+        X_initial, y_initial = load_and_preprocess_data(args.data)
+        X_filtered, y_encoded, classes, feature_cols = filter_and_label_data(X_initial, y_initial)
+        fit_idx, test_idx = holdout_split(y_encoded, args.test_size)
+        X_train, X_val, y_train, y_val = split_train_validation(
+            X_filtered.iloc[fit_idx], y_encoded[fit_idx], args.val_size)
+        model = train_model(X_train, y_train, len(classes), feature_cols, X_val=X_val, y_val=y_val,
+                            epochs=args.epochs, batch_size=args.batch_size, patience=args.patience,
+                            checkpoint_dir=args.checkpoint_dir or None)
+        report = evaluate_model(model, X_filtered.iloc[test_idx], y_encoded[test_idx], classes)
+        save_model(model, classes, feature_cols)
+    if args.report:
+        with open(args.report, 'w') as handle:
+            json.dump(report, handle, indent=2)
+    logging.info(f"Total wall-clock time: {time.perf_counter() - run_started:.1f}s")
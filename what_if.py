@@ -0,0 +1,114 @@
+# What-if sensitivity grids for soil nutrients
+# This file will be imported by app.py
+
+from __future__ import annotations
+
+import math
+import os
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+# Request keys (dashboard names or dataset columns) -> dataset column
+WHAT_IF_FEATURES = {
+    "soil_n": "Soil_N_kg_ha",
+    "soil_p": "Soil_P_kg_ha",
+    "soil_k": "Soil_K_kg_ha",
+    "soil_ph": "Soil_pH",
+    "organic_carbon": "Organic_Carbon_pct",
+}
+WHAT_IF_FEATURES.update({column: column for column in list(WHAT_IF_FEATURES.values())})
+
+WHAT_IF_MAX_POINTS = int(os.environ.get("WHAT_IF_MAX_POINTS", "20000"))
+
+
+def parse_axis(spec: Any, base_value: float, max_points: int = WHAT_IF_MAX_POINTS) -> np.ndarray:
+    """Values for one grid axis.
+
+    ``spec`` is a list of values, ``{"start", "stop", "step"}`` (stop
+    inclusive) or ``{"start", "stop", "num"}``. With ``"relative": true`` the
+    values are offsets from the district default, e.g. ``{"start": 0,
+    "stop": 40, "step": 10, "relative": true}`` for "add up to 40 kg/ha".
+    The axis length is checked against ``max_points`` before any array is built.
+    """
+    relative = False
+    if isinstance(spec, dict):
+        relative = bool(spec.get("relative"))
+        try:
+            start, stop = float(spec["start"]), float(spec["stop"])
+            if not (math.isfinite(start) and math.isfinite(stop)):
+                raise ValueError("start and stop must be finite")
+            if "num" in spec:
+                length = int(spec["num"])
+            else:
+                step = float(spec["step"])
+                if not step > 0 or not math.isfinite(step):
+                    raise ValueError("step must be positive")
+                # Same count as np.arange(start, stop + step / 2, step), without building it.
+                length = max(0, math.ceil((stop + step / 2 - start) / step))
+        except KeyError as exc:
+            raise ValueError(f"range is missing {exc.args[0]!r}")
+        except (TypeError, OverflowError):
+            raise ValueError("start, stop, step and num must be numbers")
+        _check_length(length, max_points)
+        if "num" in spec:
+            values = np.linspace(start, stop, length)
+        else:
+            values = np.arange(start, stop + step / 2, step)
+    elif isinstance(spec, list):
+        _check_length(len(spec), max_points)
+        values = np.asarray(spec, dtype=np.float64)
+    else:
+        raise ValueError("each axis must be a list of values or a start/stop/step object")
+    if values.size == 0 or values.ndim != 1 or not np.isfinite(values).all():
+        raise ValueError("each axis needs at least one finite value")
+    if relative:
+        values = values + base_value
+    return np.clip(values, 0, None)
+
+
+def _check_length(length: int, max_points: int) -> None:
+    if length > max_points:
+        raise ValueError(f"an axis has {length} values; the limit is {max_points} grid points")
+
+
+def parse_grid(
+    grid: Dict[str, Any], base: Dict[str, Any], max_points: int = WHAT_IF_MAX_POINTS
+) -> Dict[str, np.ndarray]:
+    """Validated axis values per dataset column, in request order."""
+    if not isinstance(grid, dict) or not grid:
+        raise ValueError("grid must map at least one soil feature to a range")
+    axes: Dict[str, np.ndarray] = {}
+    for key, spec in grid.items():
+        column = WHAT_IF_FEATURES.get(key)
+        if column is None:
+            raise ValueError(f"'{key}' cannot be varied; use one of {', '.join(sorted(set(WHAT_IF_FEATURES)))}")
+        if column in axes:
+            raise ValueError(f"'{column}' is given twice")
+        base_value = base.get(column)
+        axes[column] = parse_axis(spec, float(base_value) if base_value is not None else 0.0, max_points)
+        # Python ints, so the product cannot wrap around the way an int64 np.prod does.
+        points = math.prod(len(values) for values in axes.values())
+        if points > max_points:
+            raise ValueError(f"grid has {points} points; the limit is {max_points}")
+    return axes
+
+
+def build_grid(
+    grid: Dict[str, Any], base: Dict[str, Any], max_points: int = WHAT_IF_MAX_POINTS
+) -> Tuple[List[str], Dict[str, np.ndarray], np.ndarray]:
+    """Axis order, axis values and the (points x axes) value matrix in C order of the axes."""
+    axes = parse_grid(grid, base, max_points)
+    order = list(axes)
+    mesh = np.meshgrid(*axes.values(), indexing="ij")
+    values = np.stack([axis.reshape(-1) for axis in mesh], axis=1)
+    return order, axes, values
+
+
+def top_k_classes(probabilities: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Class indices and scores of the ``k`` best classes per row, best first."""
+    k = min(k, probabilities.shape[1])
+    candidates = np.argpartition(probabilities, -k, axis=1)[:, -k:]
+    scores = np.take_along_axis(probabilities, candidates, axis=1)
+    order = np.argsort(-scores, axis=1)
+    return np.take_along_axis(candidates, order, axis=1), np.take_along_axis(scores, order, axis=1)